@@ -0,0 +1,187 @@
+"""
+Usage: python benchmarks/export_csv_memory.py [ROWS ...]
+
+Compares peak memory use of the transaction CSV export when the whole file
+is built in an HttpResponse from model instances, as the export used to do,
+with the streaming pipeline used now, which reads the rows of export_rows()
+through a server-side cursor. A test database is created from the configured
+settings and seeded with a group of the given number of entries for each
+run, so the database fetch is part of what is measured. Run it against the
+production database engine to cover its cursor behaviour. By default
+10 000, 100 000 and 1 000 000 entries are exported.
+"""
+
+import csv
+import datetime
+import itertools
+import os
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "itkufs.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection, transaction as db_transaction  # noqa: E402
+from django.db.models import Max  # noqa: E402
+from django.http import HttpResponse, StreamingHttpResponse  # noqa: E402
+
+from itkufs.accounting.models import (  # noqa: E402
+    Account,
+    Group,
+    Transaction,
+    TransactionEntry,
+)
+from itkufs.common.export import (  # noqa: E402
+    EXPORT_TRANSACTIONS_HEADER,
+    export_rows,
+)
+from itkufs.common.utils import csv_stream  # noqa: E402
+
+ACCOUNTS = 500
+BATCH_SIZE = 10000
+FROM_DATE = datetime.date(2020, 1, 1)
+
+
+def seed(count):
+    """Creates a group with count committed entries, two per transaction,
+    and returns it with the last date used."""
+
+    group = Group.objects.create(
+        name="Export %d" % count, slug="export%d" % count
+    )
+    Account.objects.bulk_create(
+        Account(
+            group=group,
+            name="Account %d" % i,
+            short_name="A%d" % i,
+            slug="account%d" % i,
+            group_account=i == 0,
+        )
+        for i in range(ACCOUNTS)
+    )
+    accounts = list(group.account_set.values_list("id", flat=True))
+
+    # Primary keys are set explicitly, as bulk_create does not return them
+    # on every backend.
+    first = (Transaction.objects.aggregate(Max("id"))["id__max"] or 0) + 1
+    transactions = count // 2
+    to_date = FROM_DATE
+    for start in range(0, transactions, BATCH_SIZE):
+        ids = range(
+            first + start, first + min(start + BATCH_SIZE, transactions)
+        )
+        with db_transaction.atomic():
+            Transaction.objects.bulk_create(
+                Transaction(
+                    id=i,
+                    group=group,
+                    date=FROM_DATE
+                    + datetime.timedelta(days=(i - first) // 2500),
+                    state=Transaction.COMMITTED_STATE,
+                )
+                for i in ids
+            )
+            entries = []
+            for i in ids:
+                amount = Decimal("%d.50" % (i % 1000))
+                entries.append(
+                    TransactionEntry(
+                        transaction_id=i,
+                        account_id=accounts[i % ACCOUNTS],
+                        debit=amount,
+                    )
+                )
+                entries.append(
+                    TransactionEntry(
+                        transaction_id=i,
+                        account_id=accounts[(i + 1) % ACCOUNTS],
+                        credit=amount,
+                    )
+                )
+            TransactionEntry.objects.bulk_create(entries)
+        to_date = FROM_DATE + datetime.timedelta(days=(ids[-1] - first) // 2500)
+    return group, to_date
+
+
+def in_memory(group, to_date):
+    response = HttpResponse(content_type="text/csv")
+    writer = csv.writer(response)
+    writer.writerow(EXPORT_TRANSACTIONS_HEADER)
+    entries = (
+        TransactionEntry.objects.filter(transaction__group__id=group.id)
+        .select_related()
+        .filter(
+            transaction__date__gte=FROM_DATE,
+            transaction__date__lte=to_date,
+            transaction__state=Transaction.COMMITTED_STATE,
+        )
+        .order_by("transaction__date")
+    )
+    for e in entries:
+        writer.writerow(
+            [
+                e.id,
+                e.account.id,
+                e.transaction.id,
+                e.transaction.date,
+                e.debit,
+                e.credit,
+                e.account.name,
+                e.account.short_name,
+                e.account.slug,
+                e.account.group_account,
+            ]
+        )
+    return len(response.content)
+
+
+def streaming(group, to_date, compress=False):
+    rows = itertools.chain(
+        [EXPORT_TRANSACTIONS_HEADER], export_rows(group, FROM_DATE, to_date)
+    )
+    response = StreamingHttpResponse(csv_stream(rows, compress=compress))
+    return sum(len(block) for block in response.streaming_content)
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = function(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, peak, elapsed
+
+
+def main(counts):
+    print(
+        "%10s %-12s %12s %12s %8s"
+        % ("rows", "method", "bytes", "peak memory", "seconds")
+    )
+    for count in counts:
+        group, to_date = seed(count)
+        for name, function, args in (
+            ("in memory", in_memory, (group, to_date)),
+            ("streaming", streaming, (group, to_date)),
+            ("gzip", streaming, (group, to_date, True)),
+        ):
+            size, peak, elapsed = measure(function, *args)
+            print(
+                "%10d %-12s %12d %10.1f MB %8.2f"
+                % (count, name, size, peak / 2**20, elapsed)
+            )
+
+
+if __name__ == "__main__":
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        main([int(n) for n in sys.argv[1:]] or [10000, 100000, 1000000])
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
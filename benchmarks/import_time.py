@@ -0,0 +1,85 @@
+"""
+Usage: python benchmarks/import_time.py [-n RUNS] [--max-ms MS]
+
+Measures how long a worker takes to set up Django and load the URLconf,
+using python -X importtime, and lists the slowest top level packages.
+The PDF renderers must not be imported at startup, so the benchmark fails
+if ReportLab shows up, or if the median import time of itkufs.urls exceeds
+MS milliseconds.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+STARTUP = "import django; django.setup(); import itkufs.urls"
+
+FORBIDDEN = ("reportlab", "itkufs.reports.pdf", "itkufs.billing.pdf")
+
+
+def run():
+    """Returns the self and cumulative import times in microseconds of every
+    module imported at startup"""
+
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "itkufs.settings")
+    env["PYTHONPATH"] = ROOT
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP],
+        env=env,
+        cwd=ROOT,
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    runs = [run() for _ in range(args.runs)]
+    urls_ms = statistics.median(r["itkufs.urls"][1] / 1000 for r in runs)
+
+    packages = defaultdict(int)
+    for name, (self_us, _) in runs[-1].items():
+        packages[name.split(".")[0]] += self_us
+
+    print("%-24s %10s" % ("package", "self ms"))
+    for name, self_us in sorted(packages.items(), key=lambda p: -p[1])[:10]:
+        print("%-24s %10.1f" % (name, self_us / 1000))
+    print()
+    print("itkufs.urls: %.1f ms median of %d runs" % (urls_ms, args.runs))
+
+    failed = False
+    imported = [
+        f
+        for f in FORBIDDEN
+        if any(name == f or name.startswith(f + ".") for name in runs[-1])
+    ]
+    if imported:
+        print("FAIL: imported at startup: %s" % ", ".join(imported))
+        failed = True
+    if args.max_ms is not None and urls_ms > args.max_ms:
+        print("FAIL: itkufs.urls took more than %.1f ms" % args.max_ms)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
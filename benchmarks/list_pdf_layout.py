@@ -0,0 +1,131 @@
+"""
+Usage: python benchmarks/list_pdf_layout.py [ACCOUNTS ...]
+
+Times rendering a list PDF, with its peak memory use, and the font size
+fitting within it, for lists with the given number of accounts. The
+fitting used to measure every cell with a shrinking font size in a loop
+per row, which is timed as "per row" next to the layout stage used now,
+with and without the widths already cached. The list, group and accounts
+are built in memory, so the database is not needed. By default a list of
+1 000 accounts is rendered.
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "itkufs.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from reportlab.pdfgen import canvas  # noqa: E402
+
+from itkufs.accounting.models import Account, Group  # noqa: E402
+from itkufs.reports.models import List, ListColumn  # noqa: E402
+from itkufs.reports.pdf import fit_font_size, pdf, string_width  # noqa: E402
+
+FONT_NAME = "Times-Roman"
+WIDTHS = (180.0, 60.0, 50.0)
+
+
+def make_list(count):
+    group = Group(id=1, name="Group", slug="group", block_limit=-100)
+    list = List(
+        id=1,
+        name="List",
+        slug="list",
+        group=group,
+        account_width=6,
+        short_name_width=2,
+        balance_width=2,
+    )
+    columns = [ListColumn(id=i, name=str(i * 10), width=2) for i in range(5)]
+    list._prefetched_objects_cache = {"column_set": columns}
+    list.listcolumn_width = sum(c.width for c in columns)
+
+    rng = random.Random(0)
+    accounts = []
+    for i in range(count):
+        account = Account(
+            id=i,
+            name="Account %s %d" % ("x" * rng.randint(0, 30), i),
+            short_name="LA%dABC" % i if i % 3 else "",
+            group=group,
+        )
+        account.confirmed_balance_sql = Decimal(rng.randint(-500, 5000))
+        accounts.append(account)
+    return group, list, accounts
+
+
+def cells(accounts):
+    return [
+        (a.name, a.short_name or a.name, "%d" % a.normal_balance())
+        for a in accounts
+    ]
+
+
+def per_row(rows):
+    p = canvas.Canvas(None)
+    sizes = [10, 10, 10]
+    for row in rows:
+        for x, text in enumerate(row):
+            while p.stringWidth(text, FONT_NAME, sizes[x]) + 12 > WIDTHS[x]:
+                if sizes[x] <= 8:
+                    break
+                sizes[x] -= 1
+    return sizes
+
+
+def layout(rows):
+    return [
+        fit_font_size([row[x] for row in rows], WIDTHS[x], FONT_NAME, 10, 8)
+        for x in range(3)
+    ]
+
+
+def measure(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main(counts):
+    print(
+        "%10s %12s %12s %12s %12s %12s"
+        % ("accounts", "per row", "layout", "layout warm", "pdf()", "peak")
+    )
+    for count in counts:
+        group, list, accounts = make_list(count)
+        rows = cells(accounts)
+
+        old_sizes, old = measure(per_row, rows)
+        string_width.cache_clear()
+        new_sizes, new = measure(layout, rows)
+        assert old_sizes == new_sizes, (old_sizes, new_sizes)
+
+        # Printing the list again, or another list of the same group,
+        # finds the widths in the cache
+        _, warm = measure(layout, rows)
+
+        tracemalloc.start()
+        content, total = measure(
+            pdf, group, "bench", list, True, True, accounts
+        )
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert content.getvalue().startswith(b"%PDF")
+
+        print(
+            "%10d %10.2f ms %10.2f ms %10.2f ms %10.2f s %9.1f MB"
+            % (count, old * 1000, new * 1000, warm * 1000, total, peak / 2**20)
+        )
+
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [1000])
@@ -53,6 +53,36 @@ class ChangeTransactionForm(forms.Form):
         self.fields["change_to"].widget = forms.Select(choices=choices)
 
 
+class TransactionFilterForm(forms.Form):
+    account = forms.ChoiceField(label=_("Account"), required=False)
+    date_from = forms.DateField(label=_("From date"), required=False)
+    date_to = forms.DateField(label=_("To date"), required=False)
+
+    def __init__(self, *args, **kwargs):
+        group = kwargs.pop("group")
+        super().__init__(*args, **kwargs)
+        self.fields["account"].choices = [("", "")] + [
+            (a.id, a.name) for a in group.account_set.all()
+        ]
+
+    def filter(self, transactions):
+        """Limits the given transactions to those matching the form"""
+
+        if self.cleaned_data["account"]:
+            transactions = transactions.filter(
+                entry_set__account=self.cleaned_data["account"]
+            )
+        if self.cleaned_data["date_from"]:
+            transactions = transactions.filter(
+                date__gte=self.cleaned_data["date_from"]
+            )
+        if self.cleaned_data["date_to"]:
+            transactions = transactions.filter(
+                date__lte=self.cleaned_data["date_to"]
+            )
+        return transactions
+
+
 class EntryForm(Form):
     # FIXME add clean_debit/credit so that we can ignore whitespaces :)
     debit = forms.DecimalField(
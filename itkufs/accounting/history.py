@@ -0,0 +1,89 @@
+"""
+Balance history of accounts for charts.
+
+The database sums the running balance per day, see
+Account.get_balance_history_set(). The days are grouped here into weeks or
+months, and long histories can be downsampled to a number of points with
+the largest triangle three buckets algorithm, which keeps the peaks and
+dips that matter in a line chart.
+"""
+
+import datetime
+
+# This is needed for type hints in Python versions older than 3.9
+from typing import List, Tuple
+
+BUCKETS = ("day", "week", "month")
+
+# The most points a chart is given
+MAX_POINTS = 2000
+
+Point = Tuple[datetime.date, float]
+
+
+def bucket_start(date: datetime.date, bucket: str) -> datetime.date:
+    """Returns the first day of the day, week or month the date is in"""
+
+    if bucket == "day":
+        return date
+    elif bucket == "week":
+        return date - datetime.timedelta(days=date.weekday())
+    elif bucket == "month":
+        return date.replace(day=1)
+    raise ValueError(f'Unknown bucket "{bucket}"')
+
+
+def bucket_history(history, bucket: str = "day") -> List[Point]:
+    """Returns (first day, balance) for every bucket of the daily
+    (date, change, balance) history, with the balance at its end"""
+
+    points = []
+    for date, change, balance in history:
+        start = bucket_start(date, bucket)
+        if points and points[-1][0] == start:
+            points[-1] = (start, float(balance))
+        else:
+            points.append((start, float(balance)))
+    return points
+
+
+def lttb(points: List[Point], threshold: int) -> List[Point]:
+    """Downsamples the points to threshold points with the largest triangle
+    three buckets algorithm. The first and last points are always kept."""
+
+    if threshold < 3:
+        raise ValueError("At least three points are needed")
+    if len(points) <= threshold:
+        return list(points)
+
+    xs = [date.toordinal() for date, balance in points]
+    ys = [balance for date, balance in points]
+
+    # The points between the first and last are split into equal buckets,
+    # and from each the point making the largest triangle with the point
+    # chosen from the previous bucket and the average of the next is kept
+    every = (len(points) - 2) / (threshold - 2)
+    sampled = [points[0]]
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(points))
+
+        next_count = next_end - end
+        avg_x = sum(xs[end:next_end]) / next_count
+        avg_y = sum(ys[end:next_end]) / next_count
+
+        chosen, max_area = start, -1.0
+        for j in range(start, end):
+            area = abs(
+                (xs[a] - avg_x) * (ys[j] - ys[a])
+                - (xs[a] - xs[j]) * (avg_y - ys[a])
+            )
+            if area > max_area:
+                chosen, max_area = j, area
+        sampled.append(points[chosen])
+        a = chosen
+
+    sampled.append(points[-1])
+    return sampled
@@ -0,0 +1,80 @@
+"""
+Usage: ./manage.py createcheckpoints [-g GROUP] [-d YYYY-MM-DD]
+
+Stores the balance of every account at the end of the given date, which
+defaults to the last day of the previous month. Run it from cron at the start
+of every month to keep historical balance lookups fast.
+"""
+
+import datetime
+import logging
+import sys
+
+from django.core.management.base import BaseCommand
+
+from itkufs.accounting.models import BalanceCheckpoint, Group
+
+CONSOLE_LOG_FORMAT = "%(levelname)-8s %(message)s"
+
+
+class Command(BaseCommand):
+    help = "Create balance checkpoints for all accounts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-g",
+            "--group",
+            dest="group_slug",
+            help="Only create checkpoints for accounts in this group",
+        )
+        parser.add_argument(
+            "-d",
+            "--date",
+            dest="date",
+            help="Date of the checkpoints, defaults to end of last month",
+        )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.logger = self._setup_logging()
+
+    def _setup_logging(self):
+        logging.basicConfig(format=CONSOLE_LOG_FORMAT, level=logging.INFO)
+        return logging.getLogger("createcheckpoints")
+
+    def handle(self, *args, **options):
+        date = self._get_date(options["date"])
+
+        if options["group_slug"] is not None:
+            groups = [self._get_group(options["group_slug"])]
+        else:
+            groups = Group.objects.all()
+
+        for group in groups:
+            checkpoints = BalanceCheckpoint.objects.create_for_group(
+                group, date
+            )
+            self.logger.info(
+                'Created %d checkpoints at %s for "%s"',
+                len(checkpoints),
+                date,
+                group,
+            )
+
+    def _get_date(self, date: str):
+        if date is None:
+            first_of_month = datetime.date.today().replace(day=1)
+            return first_of_month - datetime.timedelta(days=1)
+
+        try:
+            return datetime.datetime.strptime(date, "%Y-%m-%d").date()
+        except ValueError:
+            self.logger.error('Invalid date "%s"', date)
+            sys.exit(1)
+
+    def _get_group(self, group_slug: str):
+        try:
+            return Group.objects.get(slug=group_slug)
+        except Group.DoesNotExist:
+            self.logger.error('Group "%s" does not exist', group_slug)
+            sys.exit(1)
@@ -0,0 +1,86 @@
+"""
+Usage: ./manage.py rebuildbalances [-g GROUP] [--check]
+
+Recalculates the stored account balances, balance checkpoints and daily
+account totals from the transaction entries. With --check, the stored
+balances are only verified and the command exits with a non-zero status if
+any of them are wrong.
+"""
+
+import logging
+import sys
+
+from django.core.management.base import BaseCommand
+
+from itkufs.accounting.models import (
+    AccountBalance,
+    AccountDailyTotal,
+    BalanceCheckpoint,
+    Group,
+    LedgerVersion,
+)
+
+CONSOLE_LOG_FORMAT = "%(levelname)-8s %(message)s"
+
+
+class Command(BaseCommand):
+    help = "Rebuild or verify the stored account balances"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-g",
+            "--group",
+            dest="group_slug",
+            help="Only rebuild balances for accounts in this group",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            dest="check",
+            default=False,
+            help="Verify the stored balances without changing them",
+        )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.logger = self._setup_logging()
+
+    def _setup_logging(self):
+        logging.basicConfig(format=CONSOLE_LOG_FORMAT, level=logging.INFO)
+        return logging.getLogger("rebuildbalances")
+
+    def handle(self, *args, **options):
+        account_ids = None
+        group_ids = Group.objects.values_list("id", flat=True)
+        if options["group_slug"] is not None:
+            group = self._get_group(options["group_slug"])
+            account_ids = list(group.account_set.values_list("id", flat=True))
+            group_ids = [group.id]
+
+        if options["check"]:
+            mismatches = AccountBalance.objects.mismatches(account_ids)
+            for account_id, stored, actual in mismatches:
+                self.logger.error(
+                    "Account %d has stored balance %s/%s, expected %s/%s",
+                    account_id,
+                    stored[0],
+                    stored[1],
+                    actual[0],
+                    actual[1],
+                )
+            if mismatches:
+                sys.exit(1)
+            self.logger.info("All stored balances are correct")
+        else:
+            AccountBalance.objects.refresh(account_ids)
+            BalanceCheckpoint.objects.refresh(account_ids)
+            AccountDailyTotal.objects.refresh(account_ids)
+            LedgerVersion.objects.bump(group_ids)
+            self.logger.info("Stored balances rebuilt")
+
+    def _get_group(self, group_slug: str):
+        try:
+            return Group.objects.get(slug=group_slug)
+        except Group.DoesNotExist:
+            self.logger.error('Group "%s" does not exist', group_slug)
+            sys.exit(1)
@@ -0,0 +1,119 @@
+"""
+Usage: ./manage.py sendqueuedmail [-b BATCH_SIZE] [--max-attempts N]
+
+Sends the mail queued in the outbox, in batches over a single connection to
+the mail server. Mail that fails is retried with exponential backoff on
+later runs until it has been attempted --max-attempts times. Run it
+regularly, e.g. from cron.
+"""
+
+import datetime
+import logging
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+
+from itkufs.accounting.models import OutgoingMail
+
+CONSOLE_LOG_FORMAT = "%(levelname)-8s %(message)s"
+
+# Claimed mail is skipped by other workers until the lease runs out
+CLAIM_LEASE = datetime.timedelta(minutes=10)
+
+
+class Command(BaseCommand):
+    help = "Send the mail queued in the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            dest="batch_size",
+            type=int,
+            default=50,
+            help="Number of mails to claim at a time",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            dest="max_attempts",
+            type=int,
+            default=OutgoingMail.MAX_ATTEMPTS,
+            help="Give up on mail that has failed this many times",
+        )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.logger = self._setup_logging()
+
+    def _setup_logging(self):
+        logging.basicConfig(format=CONSOLE_LOG_FORMAT, level=logging.INFO)
+        return logging.getLogger("sendqueuedmail")
+
+    def handle(self, *args, **options):
+        sent = failed = 0
+
+        connection = get_connection(fail_silently=False)
+        self._open(connection)
+        try:
+            while True:
+                batch = self._claim_batch(
+                    options["batch_size"], options["max_attempts"]
+                )
+                if not batch:
+                    break
+                for mail in batch:
+                    if self._send(connection, mail):
+                        sent += 1
+                    else:
+                        failed += 1
+        finally:
+            connection.close()
+
+        self.logger.info("Sent %d mails, %d failed", sent, failed)
+
+    def _claim_batch(self, batch_size: int, max_attempts: int):
+        now = datetime.datetime.now()
+        with db_transaction.atomic():
+            ids = list(
+                OutgoingMail.objects.due(now, max_attempts)
+                .select_for_update(skip_locked=True)
+                .values_list("id", flat=True)[:batch_size]
+            )
+            OutgoingMail.objects.filter(id__in=ids).update(
+                next_attempt=now + CLAIM_LEASE
+            )
+        return list(OutgoingMail.objects.filter(id__in=ids).order_by("id"))
+
+    def _open(self, connection):
+        # Without an open connection, send_messages() connects and
+        # disconnects for every mail
+        try:
+            connection.open()
+        except Exception as e:
+            self.logger.warning("Could not connect to the mail server: %s", e)
+
+    def _send(self, connection, mail: OutgoingMail):
+        mail.attempts += 1
+        try:
+            connection.send_messages([mail.as_message()])
+        except Exception as e:
+            # Start over with a fresh connection for the next mail
+            connection.close()
+            self._open(connection)
+            mail.last_error = str(e)
+            mail.next_attempt = datetime.datetime.now() + mail.retry_delay()
+            self.logger.warning(
+                "Could not send mail %d (attempt %d): %s",
+                mail.id,
+                mail.attempts,
+                e,
+            )
+        else:
+            mail.sent = datetime.datetime.now()
+            mail.last_error = ""
+
+        mail.save(
+            update_fields=["attempts", "last_error", "next_attempt", "sent"]
+        )
+        return mail.sent is not None
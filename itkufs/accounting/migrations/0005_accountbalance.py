@@ -0,0 +1,81 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_balances(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO accounting_accountbalance (account_id, confirmed, future)
+            SELECT id, 0, 0 FROM accounting_account
+            """
+        )
+        cursor.execute(
+            """
+            UPDATE accounting_accountbalance
+            SET confirmed = COALESCE((
+                    SELECT sum(debit) - sum(credit)
+                        FROM accounting_transactionentry AS te
+                        JOIN accounting_transaction AS t
+                            ON (te.transaction_id = t.id)
+                    WHERE te.account_id = accounting_accountbalance.account_id
+                        AND t.state = 'Com'
+                ), 0),
+                future = COALESCE((
+                    SELECT sum(debit) - sum(credit)
+                        FROM accounting_transactionentry AS te
+                        JOIN accounting_transaction AS t
+                            ON (te.transaction_id = t.id)
+                    WHERE te.account_id = accounting_accountbalance.account_id
+                        AND t.state != 'Rej'
+                ), 0)
+            """
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounting", "0004_auto_20221123_1607"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccountBalance",
+            fields=[
+                (
+                    "account",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stored_balance",
+                        serialize=False,
+                        to="accounting.Account",
+                        verbose_name="account",
+                    ),
+                ),
+                (
+                    "confirmed",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="confirmed balance",
+                    ),
+                ),
+                (
+                    "future",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="future balance",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "account balance",
+                "verbose_name_plural": "account balances",
+            },
+        ),
+        migrations.RunPython(populate_balances, migrations.RunPython.noop),
+    ]
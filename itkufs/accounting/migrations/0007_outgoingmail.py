@@ -0,0 +1,71 @@
+import datetime
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounting", "0006_balancecheckpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutgoingMail",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "subject",
+                    models.CharField(max_length=200, verbose_name="subject"),
+                ),
+                ("body", models.TextField(verbose_name="body")),
+                (
+                    "from_email",
+                    models.CharField(max_length=200, verbose_name="from"),
+                ),
+                ("to", models.TextField(verbose_name="to")),
+                (
+                    "created",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="created"
+                    ),
+                ),
+                (
+                    "next_attempt",
+                    models.DateTimeField(
+                        db_index=True,
+                        default=datetime.datetime.now,
+                        verbose_name="next attempt",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="attempts"
+                    ),
+                ),
+                (
+                    "last_error",
+                    models.TextField(blank=True, verbose_name="last error"),
+                ),
+                (
+                    "sent",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="sent"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "outgoing mail",
+                "verbose_name_plural": "outgoing mail",
+                "ordering": ("created",),
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounting", "0007_outgoingmail"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["group", "last_modified"],
+                name="transaction_group_modified_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,78 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_daily_totals(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO accounting_accountdailytotal
+                (account_id, date, debit, credit)
+            SELECT te.account_id, t.date, sum(te.debit), sum(te.credit)
+                FROM accounting_transactionentry AS te
+                JOIN accounting_transaction AS t ON (te.transaction_id = t.id)
+            WHERE t.state = 'Com'
+            GROUP BY te.account_id, t.date
+            """
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounting", "0008_transaction_group_modified_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccountDailyTotal",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="date")),
+                (
+                    "debit",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="debit",
+                    ),
+                ),
+                (
+                    "credit",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="credit",
+                    ),
+                ),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_total_set",
+                        to="accounting.Account",
+                        verbose_name="account",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "daily account total",
+                "verbose_name_plural": "daily account totals",
+                "ordering": ("-date",),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name="accountdailytotal",
+            unique_together=set([("account", "date")]),
+        ),
+        migrations.RunPython(populate_daily_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_ledger_versions(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO accounting_ledgerversion
+                (group_id, version, last_modified)
+            SELECT g.id, 1, COALESCE(max(t.last_modified), CURRENT_TIMESTAMP)
+                FROM accounting_group AS g
+                LEFT JOIN accounting_transaction AS t ON (t.group_id = g.id)
+            GROUP BY g.id
+            """
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounting", "0009_accountdailytotal"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LedgerVersion",
+            fields=[
+                (
+                    "group",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="ledger_version_marker",
+                        serialize=False,
+                        to="accounting.Group",
+                        verbose_name="group",
+                    ),
+                ),
+                (
+                    "version",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="version"
+                    ),
+                ),
+                (
+                    "last_modified",
+                    models.DateTimeField(verbose_name="last modified"),
+                ),
+            ],
+            options={
+                "verbose_name": "ledger version",
+                "verbose_name_plural": "ledger versions",
+            },
+        ),
+        migrations.RunPython(
+            populate_ledger_versions, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+def number_existing_commits(apps, schema_editor):
+    # Resume tokens handed out so far hold log ids, so existing commits
+    # keep their id as their sequence
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE accounting_transactionlog
+            SET export_sequence = id
+            WHERE type = 'Com'
+            """
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounting", "0010_ledgerversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transactionlog",
+            name="export_sequence",
+            field=models.PositiveIntegerField(
+                db_index=True,
+                editable=False,
+                null=True,
+                verbose_name="export sequence",
+            ),
+        ),
+        migrations.RunPython(
+            number_existing_commits, migrations.RunPython.noop
+        ),
+    ]
@@ -1,7 +1,8 @@
+from decimal import Decimal
 import datetime
 
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage
 from django.db import connection, models, transaction as db_transaction
 from django.db.models import (
     Q,
@@ -10,9 +11,13 @@ from django.db.models import (
     Case,
     Value,
     F,
+    Exists,
     ExpressionWrapper,
     IntegerField,
+    OuterRef,
+    Subquery,
 )
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils.encoding import smart_text
@@ -21,7 +26,49 @@ from django.utils.translation import ugettext_lazy as _, ugettext
 from typing import List as ListType
 
 
-class Group(models.Model):
+class TransactionSetMixin:
+    """Transaction set properties of groups and accounts, which return
+    their transactions by the state they are in. Models using it implement
+    get_transactions()."""
+
+    def get_transaction_set_with_rejected(self) -> "TransactionQuerySet":
+        """Returns all transactions, including rejected"""
+        return self.get_transactions().with_rejected()
+
+    transaction_set_with_rejected = property(
+        get_transaction_set_with_rejected, None, None
+    )
+
+    def get_transaction_set(self) -> "TransactionQuerySet":
+        """Returns all transactions, excluding rejected"""
+        return self.get_transactions().without_rejected()
+
+    transaction_set = property(get_transaction_set, None, None)
+
+    def get_pending_transaction_set(self) -> "TransactionQuerySet":
+        """Returns all pending transactions"""
+        return self.get_transactions().pending()
+
+    pending_transaction_set = property(get_pending_transaction_set, None, None)
+
+    def get_committed_transaction_set(self) -> "TransactionQuerySet":
+        """Returns all committed transactions"""
+        return self.get_transactions().committed()
+
+    committed_transaction_set = property(
+        get_committed_transaction_set, None, None
+    )
+
+    def get_rejected_transaction_set(self) -> "TransactionQuerySet":
+        """Returns all rejected transactions"""
+        return self.get_transactions().rejected()
+
+    rejected_transaction_set = property(
+        get_rejected_transaction_set, None, None
+    )
+
+
+class Group(TransactionSetMixin, models.Model):
     name = models.CharField(_("name"), max_length=100)
     slug = models.SlugField(
         _("slug"), unique=True, help_text=_("A shortname used in URLs.")
@@ -75,6 +122,7 @@ class Group(models.Model):
         if not len(self.slug):
             raise ValueError("Slug cannot be empty.")
         super().save(*args, **kwargs)
+        LedgerVersion.objects.bump([self.id])
 
         # Create default accounts
         if not self.account_set.count():
@@ -117,50 +165,20 @@ class Group(models.Model):
 
     group_account_set = property(get_group_account_set, None, None)
 
-    # --- Transaction set methods
-    # Please keep in sync with Account's set methods
-
-    def get_transaction_set_with_rejected(self) -> ListType["Transaction"]:
-        """Returns all transactions connected to group, including rejected"""
-        return self.real_transaction_set.exclude(
-            state=Transaction.UNDEFINED_STATE
-        ).distinct()
-
-    transaction_set_with_rejected = property(
-        get_transaction_set_with_rejected, None, None
-    )
-
-    def get_transaction_set(self) -> ListType["Transaction"]:
-        """Returns all transactions connected to group, excluding rejected"""
-        return self.transaction_set_with_rejected.exclude(
-            state=Transaction.REJECTED_STATE
-        )
-
-    transaction_set = property(get_transaction_set, None, None)
-
-    def get_pending_transaction_set(self) -> ListType["Transaction"]:
-        """Returns all pending transactions connected to group"""
-        return self.transaction_set.filter(state=Transaction.PENDING_STATE)
-
-    pending_transaction_set = property(get_pending_transaction_set, None, None)
-
-    def get_committed_transaction_set(self) -> ListType["Transaction"]:
-        """Returns all committed transactions connected to group"""
-        return self.transaction_set.filter(state=Transaction.COMMITTED_STATE)
-
-    committed_transaction_set = property(
-        get_committed_transaction_set, None, None
-    )
+    def ledger_version(self):
+        """Returns the time of the latest change to the group's ledger and
+        a version number, see LedgerVersion."""
 
-    def get_rejected_transaction_set(self) -> ListType["Transaction"]:
-        """Returns all rejected transactions connected to group"""
-        return self.transaction_set_with_rejected.filter(
-            state=Transaction.REJECTED_STATE
+        version = (
+            LedgerVersion.objects.filter(group=self)
+            .values_list("last_modified", "version")
+            .first()
         )
+        return version or (None, 0)
 
-    rejected_transaction_set = property(
-        get_rejected_transaction_set, None, None
-    )
+    def get_transactions(self) -> "TransactionQuerySet":
+        """Returns all transactions of the group, in any state"""
+        return Transaction.objects.for_group(self)
 
     def get_balance_history_set(self):
         """Returns historical balance data for this group"""
@@ -183,36 +201,308 @@ SELECT sum(debit) - sum(credit)
 WHERE account_id = %s AND t.state != 'Rej'
 """
 
+STORED_CONFIRMED_BALANCE_SQL = """
+SELECT confirmed
+    FROM accounting_accountbalance
+WHERE account_id = %s
+"""
+
+STORED_FUTURE_BALANCE_SQL = """
+SELECT future
+    FROM accounting_accountbalance
+WHERE account_id = %s
+"""
+
+REFRESH_BALANCE_SQL = """
+UPDATE accounting_accountbalance
+SET confirmed = COALESCE((%(confirmed)s), 0),
+    future = COALESCE((%(future)s), 0)
+""" % {
+    "confirmed": CONFIRMED_BALANCE_SQL % "accounting_accountbalance.account_id",
+    "future": FUTURE_BALANCE_SQL % "accounting_accountbalance.account_id",
+}
+
+APPLY_TRANSACTIONS_SQL = """
+UPDATE accounting_accountbalance
+SET confirmed = confirmed + %s * (
+        SELECT sum(debit) - sum(credit)
+            FROM accounting_transactionentry AS te
+        WHERE te.account_id = accounting_accountbalance.account_id
+            AND te.transaction_id IN ({ids})
+    ),
+    future = future + %s * (
+        SELECT sum(debit) - sum(credit)
+            FROM accounting_transactionentry AS te
+        WHERE te.account_id = accounting_accountbalance.account_id
+            AND te.transaction_id IN ({ids})
+    )
+WHERE account_id IN (
+    SELECT account_id
+        FROM accounting_transactionentry
+    WHERE transaction_id IN ({ids})
+)
+"""
+
+MISSING_BALANCE_SQL = """
+INSERT INTO accounting_accountbalance (account_id, confirmed, future)
+SELECT id, 0, 0
+    FROM accounting_account
+WHERE id NOT IN (SELECT account_id FROM accounting_accountbalance)
+"""
+
+REFRESH_CHECKPOINTS_SQL = """
+UPDATE accounting_balancecheckpoint
+SET balance = COALESCE((
+        SELECT sum(debit) - sum(credit)
+            FROM accounting_transactionentry AS te
+            JOIN accounting_transaction AS t ON (te.transaction_id = t.id)
+        WHERE te.account_id = accounting_balancecheckpoint.account_id
+            AND t.state = 'Com'
+            AND t.date <= accounting_balancecheckpoint.date
+    ), 0)
+"""
+
+APPLY_TRANSACTIONS_TO_CHECKPOINTS_SQL = """
+UPDATE accounting_balancecheckpoint
+SET balance = balance + COALESCE((
+        SELECT sum(debit) - sum(credit)
+            FROM accounting_transactionentry AS te
+            JOIN accounting_transaction AS t ON (te.transaction_id = t.id)
+        WHERE te.account_id = accounting_balancecheckpoint.account_id
+            AND t.date <= accounting_balancecheckpoint.date
+            AND t.id IN ({ids})
+    ), 0)
+WHERE account_id IN (
+    SELECT account_id
+        FROM accounting_transactionentry
+    WHERE transaction_id IN ({ids})
+) AND date >= (
+    SELECT min(date)
+        FROM accounting_transaction
+    WHERE id IN ({ids})
+)
+"""
+
+REFRESH_DAILY_TOTALS_SQL = """
+INSERT INTO accounting_accountdailytotal (account_id, date, debit, credit)
+SELECT te.account_id, t.date, sum(te.debit), sum(te.credit)
+    FROM accounting_transactionentry AS te
+    JOIN accounting_transaction AS t ON (te.transaction_id = t.id)
+WHERE t.state = 'Com'
+"""
+
+# The days that are new get a row first, so that the update below can add
+# to every day. ON CONFLICT needs PostgreSQL 9.5 or SQLite 3.24.
+MISSING_DAILY_TOTALS_SQL = """
+INSERT INTO accounting_accountdailytotal (account_id, date, debit, credit)
+SELECT DISTINCT te.account_id, t.date, 0, 0
+    FROM accounting_transactionentry AS te
+    JOIN accounting_transaction AS t ON (te.transaction_id = t.id)
+WHERE t.id IN ({ids})
+ON CONFLICT (account_id, date) DO NOTHING
+"""
+
+APPLY_TRANSACTIONS_TO_DAILY_TOTALS_SQL = """
+UPDATE accounting_accountdailytotal
+SET debit = debit + COALESCE((
+        SELECT sum(te.debit)
+            FROM accounting_transactionentry AS te
+            JOIN accounting_transaction AS t ON (te.transaction_id = t.id)
+        WHERE te.account_id = accounting_accountdailytotal.account_id
+            AND t.date = accounting_accountdailytotal.date
+            AND t.id IN ({ids})
+    ), 0),
+    credit = credit + COALESCE((
+        SELECT sum(te.credit)
+            FROM accounting_transactionentry AS te
+            JOIN accounting_transaction AS t ON (te.transaction_id = t.id)
+        WHERE te.account_id = accounting_accountdailytotal.account_id
+            AND t.date = accounting_accountdailytotal.date
+            AND t.id IN ({ids})
+    ), 0)
+WHERE EXISTS (
+    SELECT 1
+        FROM accounting_transactionentry AS te
+        JOIN accounting_transaction AS t ON (te.transaction_id = t.id)
+    WHERE te.account_id = accounting_accountdailytotal.account_id
+        AND t.date = accounting_accountdailytotal.date
+        AND t.id IN ({ids})
+)
+"""
+
 GROUP_BLOCK_LIMIT_SQL = """
 SELECT accounting_group.block_limit
     FROM accounting_group
 WHERE accounting_group.id = accounting_account.group_id
 """
 
-# FIXME This query does not work on Sqlite
+# The running balance is summed by a window function over the daily
+# totals, which PostgreSQL and SQLite 3.25 or newer support
 ACCOUNT_BALANCE_HISTORY_SQL = """
 SELECT
-    account.id,
-    short_name AS user,
-    extract(epoch from last_modified)*1000 as date,
-    sum(credit)-sum(debit) AS saldo
-FROM accounting_account account
-    JOIN accounting_transactionentry AS entry ON account.id = entry.account_id
-    JOIN accounting_transaction trans ON entry.transaction_id = trans.id
-WHERE account.id = %s AND state='Com'
-GROUP BY account.id, short_name, last_modified
+    date,
+    debit - credit,
+    sum(debit - credit) OVER (ORDER BY date)
+FROM accounting_accountdailytotal
+WHERE account_id = %s
 ORDER BY date
 """
 
-ACCOUNT_TOTAL_USED = """
-SELECT sum(debit)
-FROM accounting_transactionentry AS te
-JOIN accounting_transaction AS t ON (te.transaction_id = t.id)
-WHERE account_id = %s AND t.state = 'Com'
+
+# The balance of every asset, liability and equity account starts at its
+# latest balance checkpoint and adds the daily totals after it, and the
+# member accounts are then summed together by sign, so the whole balance
+# sheet is one scan of the days since the checkpoints
+BALANCE_STATEMENT_SQL = """
+SELECT
+    g.id,
+    g.name,
+    g.slug,
+    g.type,
+    g.active,
+    s.balance,
+    s.positive,
+    s.negative
+FROM (
+    SELECT
+        CASE WHEN b.group_account THEN b.id END AS id,
+        sum(CASE WHEN b.group_account THEN b.balance END) AS balance,
+        sum(
+            CASE WHEN NOT b.group_account AND b.balance > 0
+                THEN b.balance ELSE 0 END
+        ) AS positive,
+        sum(
+            CASE WHEN NOT b.group_account AND b.balance < 0
+                THEN b.balance ELSE 0 END
+        ) AS negative
+    FROM (
+        SELECT
+            a.id,
+            a.group_account,
+            CASE WHEN a.type IN ('As', 'Ex') THEN 1 ELSE -1 END * (
+                COALESCE(c.balance, 0)
+                + COALESCE(sum(d.debit) - sum(d.credit), 0)
+            ) AS balance
+        FROM accounting_account AS a
+            LEFT JOIN accounting_balancecheckpoint AS c ON (
+                c.account_id = a.id
+                AND c.date = (
+                    SELECT max(date)
+                        FROM accounting_balancecheckpoint
+                    WHERE account_id = a.id AND date <= %s
+                )
+            )
+            LEFT JOIN accounting_accountdailytotal AS d ON (
+                d.account_id = a.id
+                AND d.date <= %s
+                AND (c.date IS NULL OR d.date > c.date)
+            )
+        WHERE a.group_id = %s AND a.type NOT IN ('In', 'Ex')
+        GROUP BY a.id, a.group_account, a.type, c.balance
+    ) AS b
+    GROUP BY CASE WHEN b.group_account THEN b.id END
+) AS s
+    LEFT JOIN accounting_account AS g ON (g.id = s.id)
+ORDER BY g.name
 """
 
 
-class AccountManager(models.Manager):
+def _as_date(value) -> datetime.date:
+    # SQLite returns the dates of raw queries as strings
+    if isinstance(value, str):
+        return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+    return value
+
+
+def _as_decimal(value) -> Decimal:
+    # SQLite returns the sums of raw queries as floats
+    if isinstance(value, float):
+        return round(Decimal(value), 2)
+    return Decimal(value)
+
+
+class AccountQuerySet(models.QuerySet):
+    def with_normal_balance(self):
+        """Annotates accounts with stored_normal_balance, which matches
+        Account.normal_balance() but is read from the stored balances."""
+
+        confirmed = Coalesce(
+            F("stored_balance__confirmed"),
+            Value(0),
+            output_field=models.DecimalField(),
+        )
+        return self.annotate(
+            stored_normal_balance=Case(
+                When(
+                    type__in=[Account.ASSET_ACCOUNT, Account.EXPENSE_ACCOUNT],
+                    then=confirmed,
+                ),
+                default=confirmed * -1,
+                output_field=models.DecimalField(),
+            )
+        )
+
+    def with_blocked(self):
+        """Annotates accounts with is_blocked_sql, which matches
+        Account.is_blocked() but is calculated by the database."""
+
+        return self.with_normal_balance().annotate(
+            is_blocked_sql=Case(
+                When(blocked=True, then=Value(True)),
+                When(
+                    group_account=False,
+                    ignore_block_limit=False,
+                    group__block_limit__isnull=False,
+                    stored_normal_balance__lt=F("group__block_limit"),
+                    then=Value(True),
+                ),
+                default=Value(False),
+                output_field=models.BooleanField(),
+            ),
+        )
+
+    def with_total_used(self):
+        """Annotates accounts with total_used_sql, see Account.total_used()"""
+
+        used = (
+            AccountDailyTotal.objects.filter(account=OuterRef("pk"))
+            .order_by()
+            .values("account")
+            .annotate(used=Sum("debit"))
+            .values("used")
+        )
+        return self.annotate(
+            total_used_sql=Coalesce(
+                Subquery(used, output_field=models.DecimalField()),
+                Value(0),
+                output_field=models.DecimalField(),
+            )
+        )
+
+    def with_last_30_days_usage(self):
+        """Annotates accounts with last_30_days_usage_sql, see
+        Account.last_30_days_usage()"""
+
+        from_date = datetime.date.today() - datetime.timedelta(days=30)
+        usage = (
+            AccountDailyTotal.objects.filter(
+                account=OuterRef("pk"), date__gte=from_date
+            )
+            .order_by()
+            .values("account")
+            .annotate(usage=Sum("debit"))
+            .values("usage")
+        )
+        return self.annotate(
+            last_30_days_usage_sql=Coalesce(
+                Subquery(usage, output_field=models.DecimalField()),
+                Value(0),
+                output_field=models.DecimalField(),
+            )
+        )
+
+
+class AccountManager(models.Manager.from_queryset(AccountQuerySet)):
     def get_queryset(self):
         return (
             super()
@@ -220,9 +510,9 @@ class AccountManager(models.Manager):
             .extra(
                 select={
                     "confirmed_balance_sql": (
-                        CONFIRMED_BALANCE_SQL % "accounting_account.id"
+                        STORED_CONFIRMED_BALANCE_SQL % "accounting_account.id"
                     ),
-                    "future_balance_sql": FUTURE_BALANCE_SQL
+                    "future_balance_sql": STORED_FUTURE_BALANCE_SQL
                     % "accounting_account.id",
                     "group_block_limit_sql": GROUP_BLOCK_LIMIT_SQL,
                 }
@@ -240,17 +530,15 @@ class HistoricalAccountManager(models.Manager):
         will have a positive balance if their credit amount is greater than
         their debit amount, and vice versa for expense and asset accounts.
         """
-        # Find entries from committed transactions in the period
-        filters = (
-            Q(transactionentry__transaction__state=Transaction.COMMITTED_STATE)
-            & Q(transactionentry__transaction__date__gte=from_date)
-            & Q(transactionentry__transaction__date__lte=to_date)
+        # Find the daily totals of committed transactions in the period
+        filters = Q(daily_total_set__date__gte=from_date) & Q(
+            daily_total_set__date__lte=to_date
         )
 
         # Get changes in balance for accounts with transactions in the period
         return self.filter(filters).annotate(
-            sum_debit=Sum("transactionentry__debit"),
-            sum_credit=Sum("transactionentry__credit"),
+            sum_debit=Sum("daily_total_set__debit"),
+            sum_credit=Sum("daily_total_set__credit"),
             difference=ExpressionWrapper(
                 F("sum_debit") - F("sum_credit"),
                 output_field=models.DecimalField(),
@@ -269,8 +557,144 @@ class HistoricalAccountManager(models.Manager):
             ),
         )
 
+    def balance_changes_by_period(self, accounts, periods):
+        """
+        Returns {account id: [normalized balance change in each period]} for
+        the given accounts, where periods is a list of (first day, last day,
+        ...) tuples that do not overlap.
+
+        All the periods are summed in one query over the daily totals,
+        grouped by account and the period each day falls in.
+        """
+        period = Case(
+            *[
+                When(date__gte=start, date__lte=end, then=Value(i))
+                for i, (start, end, *rest) in enumerate(periods)
+            ],
+            output_field=IntegerField(),
+        )
+        rows = (
+            AccountDailyTotal.objects.filter(
+                account__in=accounts.values("id"),
+                date__gte=min(p[0] for p in periods),
+                date__lte=max(p[1] for p in periods),
+            )
+            .annotate(period=period)
+            .filter(period__isnull=False)
+            .values("account_id", "account__type", "period")
+            .annotate(
+                change=Sum(
+                    F("debit") - F("credit"),
+                    output_field=models.DecimalField(),
+                )
+            )
+            .order_by()
+        )
+
+        changes = {}
+        for row in rows:
+            change = row["change"]
+            if row["account__type"] not in (
+                Account.ASSET_ACCOUNT,
+                Account.EXPENSE_ACCOUNT,
+            ):
+                change = -change
+            if row["account_id"] not in changes:
+                changes[row["account_id"]] = [Decimal(0)] * len(periods)
+            changes[row["account_id"]][row["period"]] = change
+        return changes
+
+    def balance_statement(self, group: Group, date: datetime.date):
+        """
+        Returns the balance sheet of the group at the end of the given date.
+
+        The result is a list of (account, normal balance) for the group's
+        asset, liability and equity group accounts, and the sums of the
+        positive and of the negative member account balances.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(BALANCE_STATEMENT_SQL, [date, date, group.id])
+            rows = cursor.fetchall()
+
+        accounts = []
+        positive = negative = Decimal(0)
+        for id, name, slug, type, active, balance, pos, neg in rows:
+            if id is None:
+                positive, negative = _as_decimal(pos), _as_decimal(neg)
+                continue
+            account = Account(
+                id=id,
+                name=name,
+                slug=slug,
+                type=type,
+                active=bool(active),
+                group=group,
+                group_account=True,
+            )
+            accounts.append((account, _as_decimal(balance)))
+        return accounts, positive, negative
+
+    def with_balance(self, date):
+        """
+        Returns a queryset of accounts with their balance and normalized
+        balance at the end of the given date.
+
+        The balance is found by starting at the account's nearest balance
+        checkpoint before the date, and adding the committed entries between
+        the checkpoint and the date.
+        """
+        checkpoints = BalanceCheckpoint.objects.filter(
+            account=OuterRef("pk"), date__lte=date
+        ).order_by("-date")
 
-class Account(models.Model):
+        entries = (
+            TransactionEntry.objects.filter(
+                account=OuterRef("pk"),
+                transaction__state=Transaction.COMMITTED_STATE,
+                transaction__date__gt=OuterRef("checkpoint_date"),
+                transaction__date__lte=date,
+            )
+            .order_by()
+            .values("account")
+            .annotate(change=Sum(F("debit") - F("credit")))
+            .values("change")
+        )
+
+        return self.annotate(
+            checkpoint_date=Coalesce(
+                Subquery(checkpoints.values("date")[:1]),
+                Value(datetime.date.min),
+                output_field=models.DateField(),
+            ),
+            checkpoint_balance=Coalesce(
+                Subquery(checkpoints.values("balance")[:1]),
+                Value(0),
+                output_field=models.DecimalField(),
+            ),
+            balance_change=Coalesce(
+                Subquery(entries, output_field=models.DecimalField()),
+                Value(0),
+                output_field=models.DecimalField(),
+            ),
+            balance=ExpressionWrapper(
+                F("checkpoint_balance") + F("balance_change"),
+                output_field=models.DecimalField(),
+            ),
+            normal_balance=Case(
+                When(
+                    type__in=[
+                        Account.ASSET_ACCOUNT,
+                        Account.EXPENSE_ACCOUNT,
+                    ],
+                    then="balance",
+                ),
+                default=F("balance") * -1,
+                output_field=models.DecimalField(),
+            ),
+        )
+
+
+class Account(TransactionSetMixin, models.Model):
     ASSET_ACCOUNT = "As"  # Eiendeler/aktiva
     LIABILITY_ACCOUNT = "Li"  # Gjeld/passiva
     EQUITY_ACCOUNT = "Eq"  # Egenkapital
@@ -338,41 +762,60 @@ class Account(models.Model):
     def save(self, *args, **kwargs):
         if not len(self.slug):
             raise ValueError("Slug cannot be empty.")
+        created = self.id is None
         super().save(*args, **kwargs)
+        LedgerVersion.objects.bump([self.group_id])
+
+        # Every account has a row in the balance table
+        if created:
+            AccountBalance.objects.get_or_create(account=self)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        LedgerVersion.objects.bump([self.group_id])
+        return result
 
     def total_used(self):
-        with connection.cursor() as cursor:
-            cursor.execute(ACCOUNT_TOTAL_USED, [self.id])
-            total_usage = cursor.fetchone()[0]
-            if total_usage is None:
-                return 0
-            else:
-                return total_usage
+        total_usage = self.daily_total_set.aggregate(
+            usage=models.Sum("debit")
+        ).get("usage")
+        return total_usage if total_usage is not None else 0
 
     def last_30_days_usage(self) -> float:
-        from_date = datetime.datetime.now() - datetime.timedelta(days=30)
+        from_date = datetime.date.today() - datetime.timedelta(days=30)
         usage = (
-            TransactionEntry.objects.filter(
-                account_id=self.id, transaction__date__gte=from_date
-            )
+            self.daily_total_set.filter(date__gte=from_date)
             .aggregate(usage=models.Sum("debit"))
             .get("usage")
         )
         return usage if usage is not None else 0
 
-    def balance(self) -> float:
-        if hasattr(self, "confirmed_balance_sql"):
+    def balance(self, as_of: datetime.date = None) -> float:
+        """Returns the confirmed balance, either now or at the end of the
+        given date."""
+
+        if as_of is not None:
+            return (
+                Account.historical_objects.with_balance(as_of)
+                .filter(id=self.id)
+                .values_list("balance", flat=True)
+                .get()
+            )
+        elif hasattr(self, "confirmed_balance_sql"):
             return self.confirmed_balance_sql or 0
         else:
-            with connection.cursor() as cursor:
-                cursor.execute(CONFIRMED_BALANCE_SQL, [self.id])
-                return cursor.fetchone()[0]
+            balance = (
+                AccountBalance.objects.filter(account_id=self.id)
+                .values_list("confirmed", flat=True)
+                .first()
+            )
+            return balance or 0
 
-    def normal_balance(self) -> float:
+    def normal_balance(self, as_of: datetime.date = None) -> float:
         """Returns account balance, but multiplies by -1 if the account is
         of type liability, equity or expense."""
 
-        balance = self.balance()
+        balance = self.balance(as_of)
         if balance is None:
             return 0
         elif balance == 0 or self.type in ("As", "Ex"):
@@ -398,6 +841,31 @@ class Account(models.Model):
             return False
         return self.normal_balance() < self.group.block_limit
 
+    def check_if_blacklisted(self, change):
+        """Notifies the owner if the given change to the normal balance
+        takes the account below the group block limit."""
+
+        old_balance = self.normal_balance()
+        new_balance = old_balance + change
+
+        if (
+            self.is_user_account()
+            and self.ignore_block_limit is False
+            and self.group.block_limit is not None
+            and old_balance > self.group.block_limit
+            and new_balance < self.group.block_limit
+        ):
+            subject = "Svartelistet i µFS"
+            msg = (
+                f"Dette er en automatisk melding om at du har blitt "
+                f"svartelistet i {self.group.name} sin µFS. "
+                f"Din saldo er nå {new_balance}."
+            )
+            to_address = ["%s@samfundet.no" % self.owner]
+            OutgoingMail.objects.enqueue(
+                subject, msg, "ufs@samfundet.no", to_address
+            )
+
     def needs_warning(self):
         """Returns true if user account balance is below group warn limit"""
 
@@ -409,58 +877,357 @@ class Account(models.Model):
             return False
         return self.normal_balance() < self.group.warn_limit
 
-    # --- Transaction set methods
-    # Please keep in sync with Group's set methods
+    def get_transactions(self) -> "TransactionQuerySet":
+        """Returns all transactions with entries on the account, in any
+        state"""
+        return Transaction.objects.for_account(self)
 
-    def get_transaction_set_with_rejected(self) -> ListType["Transaction"]:
-        """Returns all transactions connected to account, including rejected"""
-        return (
-            Transaction.objects.filter(entry_set__account=self)
-            .exclude(state=Transaction.UNDEFINED_STATE)
-            .distinct()
+    def get_balance_history_set(self):
+        """Returns (date, change, balance) for every day with committed
+        transactions, with the normal balance at the end of the day."""
+
+        sign = 1 if self.type in ("As", "Ex") else -1
+        with connection.cursor() as cursor:
+            cursor.execute(ACCOUNT_BALANCE_HISTORY_SQL, [self.id])
+            rows = cursor.fetchall()
+        return [
+            (_as_date(date), sign * _as_decimal(c), sign * _as_decimal(b))
+            for date, c, b in rows
+        ]
+
+    balance_history_set = property(get_balance_history_set, None, None)
+
+
+class AccountBalanceManager(models.Manager):
+    def refresh(self, account_ids: ListType[int] = None):
+        """Recalculate stored balances from the transaction entries.
+
+        Only the given accounts are refreshed, or all accounts if no ids are
+        given. Missing balance rows are created first.
+        """
+        with db_transaction.atomic(), connection.cursor() as cursor:
+            if account_ids is None:
+                cursor.execute(MISSING_BALANCE_SQL)
+                cursor.execute(REFRESH_BALANCE_SQL)
+            elif account_ids:
+                account_ids = list(set(account_ids))
+                existing = set(
+                    self.filter(account_id__in=account_ids).values_list(
+                        "account_id", flat=True
+                    )
+                )
+                self.bulk_create(
+                    [
+                        AccountBalance(account_id=account_id)
+                        for account_id in account_ids
+                        if account_id not in existing
+                    ]
+                )
+                cursor.execute(
+                    REFRESH_BALANCE_SQL
+                    + "WHERE account_id IN (%s)"
+                    % ", ".join(["%s"] * len(account_ids)),
+                    account_ids,
+                )
+
+    def apply_transactions(
+        self, transaction_ids: ListType[int], confirmed=0, future=0
+    ):
+        """Add (or with -1, subtract) the entries of the given transactions
+        to the stored confirmed and future balances."""
+        transaction_ids = list(transaction_ids)
+        if not transaction_ids:
+            return
+
+        placeholders = ", ".join(["%s"] * len(transaction_ids))
+        sql = APPLY_TRANSACTIONS_SQL.format(ids=placeholders)
+        params = [confirmed] + transaction_ids + [future] + transaction_ids
+        params += transaction_ids
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def mismatches(self, account_ids: ListType[int] = None):
+        """Returns (account id, stored, actual) for every stored balance
+        that does not match the transaction entries."""
+        accounts = Account.objects.all()
+        if account_ids is not None:
+            accounts = accounts.filter(id__in=account_ids)
+
+        accounts = accounts.extra(
+            select={
+                "actual_confirmed_sql": (
+                    CONFIRMED_BALANCE_SQL % "accounting_account.id"
+                ),
+                "actual_future_sql": FUTURE_BALANCE_SQL
+                % "accounting_account.id",
+            }
         )
 
-    transaction_set_with_rejected = property(
-        get_transaction_set_with_rejected, None, None
+        def rounded(value):
+            return round(Decimal(value or 0), 2)
+
+        result = []
+        for a in accounts:
+            stored = (
+                rounded(a.confirmed_balance_sql),
+                rounded(a.future_balance_sql),
+            )
+            actual = (
+                rounded(a.actual_confirmed_sql),
+                rounded(a.actual_future_sql),
+            )
+            if stored != actual:
+                result.append((a.id, stored, actual))
+        return result
+
+
+class AccountBalance(models.Model):
+    """Stored balances for an account, kept up to date by the state changes
+    of transactions so that reading a balance does not need to sum up the
+    account's entire history."""
+
+    objects = AccountBalanceManager()
+
+    account = models.OneToOneField(
+        Account,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stored_balance",
+        verbose_name=_("account"),
+    )
+    confirmed = models.DecimalField(
+        _("confirmed balance"), max_digits=14, decimal_places=2, default=0
+    )
+    future = models.DecimalField(
+        _("future balance"), max_digits=14, decimal_places=2, default=0
     )
 
-    def get_transaction_set(self) -> ListType["Transaction"]:
-        """Returns all transactions connected to account, excluding rejected"""
-        return self.transaction_set_with_rejected.exclude(
-            state=Transaction.REJECTED_STATE
-        )
+    class Meta:
+        verbose_name = _("account balance")
+        verbose_name_plural = _("account balances")
 
-    transaction_set = property(get_transaction_set, None, None)
+    def __str__(self):
+        return _("%(account)s: confirmed %(confirmed)s, future %(future)s") % {
+            "account": self.account,
+            "confirmed": self.confirmed,
+            "future": self.future,
+        }
 
-    def get_pending_transaction_set(self) -> ListType["Transaction"]:
-        """Returns all pending transactions connected to account"""
-        return self.transaction_set.filter(state=Transaction.PENDING_STATE)
 
-    pending_transaction_set = property(get_pending_transaction_set, None, None)
+class LedgerVersionManager(models.Manager):
+    def bump(self, group_ids: ListType[int]):
+        """Marks the ledgers of the given groups as changed. Call it in the
+        same database transaction as the change."""
 
-    def get_committed_transaction_set(self) -> ListType["Transaction"]:
-        """Returns all committed transactions connected to account"""
-        return self.transaction_set.filter(state=Transaction.COMMITTED_STATE)
+        group_ids = set(group_ids)
+        if not group_ids:
+            return
 
-    committed_transaction_set = property(
-        get_committed_transaction_set, None, None
+        now = datetime.datetime.now()
+        updated = self.filter(group_id__in=group_ids).update(
+            version=F("version") + 1, last_modified=now
+        )
+        if updated < len(group_ids):
+            existing = set(
+                self.filter(group_id__in=group_ids).values_list(
+                    "group_id", flat=True
+                )
+            )
+            self.bulk_create(
+                [
+                    LedgerVersion(group_id=id, version=1, last_modified=now)
+                    for id in group_ids - existing
+                ]
+            )
+
+
+class LedgerVersion(models.Model):
+    """A version of everything shown about a group's balances: its
+    transactions, its accounts and the group itself. It is bumped with every
+    change, so that views can tell clients that nothing has changed without
+    looking at the ledger."""
+
+    objects = LedgerVersionManager()
+
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="ledger_version_marker",
+        verbose_name=_("group"),
     )
+    version = models.PositiveIntegerField(_("version"), default=0)
+    last_modified = models.DateTimeField(_("last modified"))
 
-    def get_rejected_transaction_set(self) -> ListType["Transaction"]:
-        """Returns all rejected transactions connected to account"""
-        return self.transaction_set_with_rejected.filter(
-            state=Transaction.REJECTED_STATE
+    class Meta:
+        verbose_name = _("ledger version")
+        verbose_name_plural = _("ledger versions")
+
+    def __str__(self):
+        return _("%(group)s: version %(version)s") % {
+            "group": self.group,
+            "version": self.version,
+        }
+
+
+class BalanceCheckpointManager(models.Manager):
+    @db_transaction.atomic
+    def create_for_group(self, group: Group, date: datetime.date):
+        """Store the balance of all the group's accounts at the end of the
+        given date, replacing any existing checkpoints for that date."""
+
+        balances = (
+            Account.historical_objects.with_balance(date)
+            .filter(group=group)
+            .values_list("id", "balance")
         )
+        checkpoints = [
+            BalanceCheckpoint(account_id=account_id, date=date, balance=balance)
+            for account_id, balance in balances
+        ]
+
+        self.filter(account__group=group, date=date).delete()
+        return self.bulk_create(checkpoints)
+
+    def refresh(self, account_ids: ListType[int] = None):
+        """Recalculate checkpoints from the transaction entries, for the
+        given accounts or for all accounts if no ids are given."""
+
+        sql = REFRESH_CHECKPOINTS_SQL
+        if account_ids is not None:
+            account_ids = list(account_ids)
+            if not account_ids:
+                return
+            sql += "WHERE account_id IN (%s)" % ", ".join(
+                ["%s"] * len(account_ids)
+            )
 
-    rejected_transaction_set = property(
-        get_rejected_transaction_set, None, None
+        with connection.cursor() as cursor:
+            cursor.execute(sql, account_ids)
+
+    def apply_transactions(self, transaction_ids: ListType[int]):
+        """Add newly committed transactions to the checkpoints dated at or
+        after the transactions' date."""
+
+        transaction_ids = list(transaction_ids)
+        if not transaction_ids:
+            return
+
+        placeholders = ", ".join(["%s"] * len(transaction_ids))
+        sql = APPLY_TRANSACTIONS_TO_CHECKPOINTS_SQL.format(ids=placeholders)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, transaction_ids * 3)
+
+
+class BalanceCheckpoint(models.Model):
+    """The confirmed balance of an account at the end of a date, used as a
+    starting point when looking up historical balances."""
+
+    objects = BalanceCheckpointManager()
+
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        verbose_name=_("account"),
+        related_name="checkpoint_set",
+    )
+    date = models.DateField(_("date"))
+    balance = models.DecimalField(
+        _("balance"), max_digits=14, decimal_places=2, default=0
     )
 
-    def get_balance_history_set(self):
-        """Returns historical balance data for this user"""
-        return list(Account.objects.raw(ACCOUNT_BALANCE_HISTORY_SQL % self.id))
+    class Meta:
+        ordering = ("-date",)
+        unique_together = (("account", "date"),)
+        verbose_name = _("balance checkpoint")
+        verbose_name_plural = _("balance checkpoints")
 
-    balance_history_set = property(get_balance_history_set, None, None)
+    def __str__(self):
+        return _("%(account)s: %(balance)s at %(date)s") % {
+            "account": self.account,
+            "balance": self.balance,
+            "date": self.date,
+        }
+
+
+class AccountDailyTotalManager(models.Manager):
+    @db_transaction.atomic
+    def refresh(self, account_ids: ListType[int] = None):
+        """Recalculate the daily totals from the transaction entries, for
+        the given accounts or for all accounts if no ids are given."""
+
+        delete = self.all()
+        sql = REFRESH_DAILY_TOTALS_SQL
+        if account_ids is not None:
+            account_ids = list(account_ids)
+            if not account_ids:
+                return
+            delete = delete.filter(account_id__in=account_ids)
+            sql += "AND te.account_id IN (%s)" % ", ".join(
+                ["%s"] * len(account_ids)
+            )
+        sql += "GROUP BY te.account_id, t.date"
+
+        delete.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, account_ids)
+
+    def apply_transactions(self, transaction_ids: ListType[int]):
+        """Add newly committed transactions to the totals of their day."""
+
+        transaction_ids = list(transaction_ids)
+        if not transaction_ids:
+            return
+
+        placeholders = ", ".join(["%s"] * len(transaction_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                MISSING_DAILY_TOTALS_SQL.format(ids=placeholders),
+                transaction_ids,
+            )
+            cursor.execute(
+                APPLY_TRANSACTIONS_TO_DAILY_TOTALS_SQL.format(ids=placeholders),
+                transaction_ids * 3,
+            )
+
+
+class AccountDailyTotal(models.Model):
+    """The debit and credit of an account's committed transactions on a
+    date, used by reports instead of summing up every transaction entry."""
+
+    objects = AccountDailyTotalManager()
+
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        verbose_name=_("account"),
+        related_name="daily_total_set",
+    )
+    date = models.DateField(_("date"))
+    debit = models.DecimalField(
+        _("debit"), max_digits=14, decimal_places=2, default=0
+    )
+    credit = models.DecimalField(
+        _("credit"), max_digits=14, decimal_places=2, default=0
+    )
+
+    class Meta:
+        ordering = ("-date",)
+        unique_together = (("account", "date"),)
+        verbose_name = _("daily account total")
+        verbose_name_plural = _("daily account totals")
+
+    def __str__(self):
+        return _(
+            "%(account)s: debit %(debit)s, credit %(credit)s on %(date)s"
+        ) % {
+            "account": self.account,
+            "debit": self.debit,
+            "credit": self.credit,
+            "date": self.date,
+        }
 
 
 class RoleAccount(models.Model):
@@ -552,23 +1319,190 @@ class Settlement(models.Model):
     def is_editable(self):
         return self.closed is False
 
+    @db_transaction.atomic
+    def save(self, *args, **kwargs):
+        was_closed = (
+            self.id is not None
+            and Settlement.objects.filter(id=self.id, closed=True).exists()
+        )
+        super().save(*args, **kwargs)
 
-class TransactionManager(models.Manager):
-    def get_queryset(self):
-        return (
-            super()
-            .get_queryset()
-            .extra(
-                select={
-                    "entry_count_sql": """
-                    SELECT COUNT(*)
-                    FROM accounting_transactionentry
-                    WHERE accounting_transactionentry.transaction_id =
-                        accounting_transaction.id
-                    """
-                }
+        # Closing a settlement is a natural point for a balance checkpoint
+        if self.closed and not was_closed:
+            BalanceCheckpoint.objects.create_for_group(self.group, self.date)
+
+
+class TransactionQuerySet(models.QuerySet):
+    def for_group(self, group: Group):
+        """Returns the transactions of the group"""
+        return self.filter(group=group)
+
+    def for_account(self, account: Account):
+        """Returns the transactions with entries on the account.
+
+        The entries are looked up with an EXISTS subquery instead of a
+        join, so every transaction is returned once without DISTINCT.
+        """
+
+        entries = TransactionEntry.objects.filter(
+            transaction=OuterRef("pk"), account=account
+        ).order_by()
+        return self.annotate(on_account_sql=Exists(entries)).filter(
+            on_account_sql=True
+        )
+
+    def with_rejected(self):
+        """Returns the transactions that have been given a state, including
+        rejected"""
+        return self.exclude(state=Transaction.UNDEFINED_STATE)
+
+    def without_rejected(self):
+        """Returns the pending and committed transactions"""
+        return self.filter(
+            state__in=[Transaction.PENDING_STATE, Transaction.COMMITTED_STATE]
+        )
+
+    def pending(self):
+        return self.filter(state=Transaction.PENDING_STATE)
+
+    def committed(self):
+        return self.filter(state=Transaction.COMMITTED_STATE)
+
+    def rejected(self):
+        return self.filter(state=Transaction.REJECTED_STATE)
+
+
+class TransactionManager(models.Manager.from_queryset(TransactionQuerySet)):
+    @db_transaction.atomic
+    def create_with_entries(
+        self,
+        group: Group,
+        entries,
+        user: User,
+        state=None,
+        message="",
+        **kwargs,
+    ):
+        """Creates a pending or committed transaction from unsaved entries.
+
+        The entries are validated in memory and inserted with a single
+        bulk_create, and the log entry is written in the same database
+        transaction. Extra keyword arguments, like settlement or date, are
+        set on the transaction.
+        """
+
+        if state is None:
+            state = self.model.PENDING_STATE
+        if state not in (self.model.PENDING_STATE, self.model.COMMITTED_STATE):
+            raise InvalidTransaction(
+                "Transactions can only be created as pending or committed"
             )
+
+        entries = list(entries)
+        transaction = self.model(group=group, **kwargs)
+        transaction.state = self.model.PENDING_STATE
+
+        group_ids = dict(
+            Account.objects.filter(
+                id__in=[e.account_id for e in entries]
+            ).values_list("id", "group_id")
+        )
+        for entry in entries:
+            entry.transaction = transaction
+            entry.validate()
+        transaction.validate(
+            [
+                (e.account_id, group_ids.get(e.account_id), e.debit, e.credit)
+                for e in entries
+            ]
+        )
+
+        transaction.save()
+        for entry in entries:
+            entry.transaction = transaction
+        TransactionEntry.objects.bulk_create(entries)
+        transaction._log(self.model.PENDING_STATE, user, message)
+
+        # The transaction is new, so its entries can simply be added
+        AccountBalance.objects.apply_transactions([transaction.id], future=1)
+
+        if state == self.model.COMMITTED_STATE:
+            transaction.set_committed(user)
+
+        return transaction
+
+    def _set_pending_state(self, transaction_ids, state, user, message):
+        rows = list(
+            self.filter(id__in=transaction_ids, state=self.model.PENDING_STATE)
+            .select_for_update()
+            .order_by("id")
+            .values_list("id", "group_id")
+        )
+        if not rows:
+            return []
+
+        ids = [id for id, group_id in rows]
+        self.filter(id__in=ids, state=self.model.PENDING_STATE).update(
+            state=state, last_modified=datetime.datetime.now()
+        )
+        LedgerVersion.objects.bump(group_id for id, group_id in rows)
+        if message is None or message.strip() == "":
+            message = ""
+        TransactionLog.objects.bulk_create(
+            [
+                TransactionLog(
+                    transaction_id=id, type=state, user=user, message=message
+                )
+                for id in ids
+            ]
+        )
+        return ids
+
+    @db_transaction.atomic
+    def commit_pending(self, transaction_ids, user: User, message=""):
+        """Commits the given transactions that are still pending.
+
+        The state change is a single UPDATE, the log entries are bulk
+        created and the blacklist check is done once per affected account.
+        Returns the ids of the transactions that were committed.
+        """
+
+        ids = self._set_pending_state(
+            transaction_ids, self.model.COMMITTED_STATE, user, message
+        )
+        if not ids:
+            return ids
+
+        changes = dict(
+            TransactionEntry.objects.filter(transaction_id__in=ids)
+            .order_by()
+            .values("account_id")
+            .annotate(change=Sum(F("credit") - F("debit")))
+            .values_list("account_id", "change")
         )
+        for account in Account.objects.filter(
+            id__in=changes.keys()
+        ).select_related("group", "owner"):
+            account.check_if_blacklisted(changes[account.id])
+
+        AccountBalance.objects.apply_transactions(ids, confirmed=1)
+        BalanceCheckpoint.objects.apply_transactions(ids)
+        AccountDailyTotal.objects.apply_transactions(ids)
+        return ids
+
+    @db_transaction.atomic
+    def reject_pending(self, transaction_ids, user: User, message=""):
+        """Rejects the given transactions that are still pending.
+
+        Returns the ids of the transactions that were rejected.
+        """
+
+        ids = self._set_pending_state(
+            transaction_ids, self.model.REJECTED_STATE, user, message
+        )
+        if ids:
+            AccountBalance.objects.apply_transactions(ids, future=-1)
+        return ids
 
 
 class Transaction(models.Model):
@@ -609,18 +1543,24 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ("-last_modified",)
+        indexes = [
+            models.Index(
+                fields=["group", "last_modified"],
+                name="transaction_group_modified_idx",
+            )
+        ]
         verbose_name = _("transaction")
         verbose_name_plural = _("transactions")
 
     def __str__(self):
-        if self.entry_set.all().count():
-            entries = []
-            for entry in self.entry_set.all():
-                if entry.debit:
-                    entries.append(f"{entry.account} debit {entry.debit:.2f}")
-                else:
-                    entries.append(f"{entry.account} credit {entry.credit:.2f}")
+        entries = []
+        for entry in self.entry_set.select_related("account__group"):
+            if entry.debit:
+                entries.append(f"{entry.account} debit {entry.debit:.2f}")
+            else:
+                entries.append(f"{entry.account} credit {entry.credit:.2f}")
 
+        if entries:
             return ", ".join(entries)
         else:
             return "Empty transaction"
@@ -631,36 +1571,53 @@ class Transaction(models.Model):
             kwargs={"group": self.group.slug, "transaction": self.id},
         )
 
-    @db_transaction.atomic
-    def save(self, *args, **kwargs):
+    def get_entry_values(self):
+        """Returns (account id, account group id, debit, credit) for all
+        entries of the transaction, fetched in a single query."""
+
+        if self.id is None:
+            return []
+        return self.entry_set.order_by().values_list(
+            "account_id", "account__group_id", "debit", "credit"
+        )
+
+    def validate(self, entries=None):
+        """Checks that the entries balance and belong to the transaction's
+        group, in a single pass.
+
+        The entries are given as (account id, account group id, debit,
+        credit) tuples, which allows validating unsaved entries. If not
+        given, the entries are fetched from the database.
+        """
+
+        if entries is None:
+            entries = self.get_entry_values()
+
         debit_sum = 0
         credit_sum = 0
-        debit_accounts = []
-        credit_accounts = []
-
-        for entry in self.entry_set.all():
-            if entry.debit > 0:
-                debit_sum += entry.debit
-                debit_accounts.append(entry.account)
-            elif entry.credit > 0:
-                credit_sum += entry.credit
-                credit_accounts.append(entry.account)
-
-        for account in debit_accounts + credit_accounts:
-            if account.group != self.group:
+        debit_accounts = set()
+        credit_accounts = set()
+
+        for account_id, group_id, debit, credit in entries:
+            if group_id != self.group_id:
                 raise InvalidTransaction(
                     "Group of transaction entry account "
                     "does not match group of transaction."
                 )
 
-        account_intersection = set(debit_accounts).intersection(
-            set(credit_accounts)
-        )
+            if debit > 0:
+                debit_sum += debit
+                debit_accounts.add(account_id)
+            elif credit > 0:
+                credit_sum += credit
+                credit_accounts.add(account_id)
+
+        account_intersection = debit_accounts.intersection(credit_accounts)
         if len(account_intersection):
             raise InvalidTransaction(
                 "The following accounts is both a debit "
                 "and a credit account for this transaction: %s"
-                % list(account_intersection)
+                % sorted(account_intersection)
             )
 
         if debit_sum != credit_sum:
@@ -669,58 +1626,82 @@ class Transaction(models.Model):
                 "credit: %d, debit: %d." % (credit_sum, debit_sum)
             )
 
+    @db_transaction.atomic
+    def save(self, *args, **kwargs):
+        self.validate()
+
         if self.date is None:
             self.date = datetime.date.today()
 
         self.last_modified = datetime.datetime.now()
         super().save(*args, **kwargs)
+        LedgerVersion.objects.bump([self.group_id])
 
-    def set_pending(self, user: User, message=""):
-        if self.id is None:
-            self.save()
+    @db_transaction.atomic
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        LedgerVersion.objects.bump([self.group_id])
+        return result
 
+    def _log(self, type: str, user: User, message=""):
+        log = TransactionLog(type=type, transaction=self, user=user)
+        if message is not None and message.strip() != "":
+            log.message = message
+        log.save()
+
+    @db_transaction.atomic
+    def set_pending(self, user: User, message=""):
         if not self.is_committed() and not self.is_rejected():
-            log = TransactionLog(type=self.PENDING_STATE, transaction=self)
-            log.user = user
-            if message is not None and message.strip() != "":
-                log.message = message
-            log.save()
             self.state = self.PENDING_STATE
-            self.last_modified = datetime.datetime.now()
             self.save()
+            self._log(self.PENDING_STATE, user, message)
+
+            # Entries may have changed while pending, so recalculate
+            AccountBalance.objects.refresh(
+                self.entry_set.values_list("account_id", flat=True)
+            )
         else:
             raise InvalidTransaction("Could not set transaction as pending")
 
+    def _lock_state(self):
+        # Lock the row and check the stored state rather than ours, so that
+        # a transaction committed or rejected by someone else meanwhile is
+        # never applied to the stored totals twice
+        if self.pk is not None:
+            self.state = (
+                Transaction.objects.select_for_update()
+                .values_list("state", flat=True)
+                .get(pk=self.pk)
+            )
+
+    @db_transaction.atomic
     def set_committed(self, user: User, message=""):
+        self._lock_state()
         if self.is_pending() and not self.is_committed():
-            log = TransactionLog(type=self.COMMITTED_STATE, transaction=self)
-            log.user = user
-            if message.strip() != "":
-                log.message = message
-            log.save()
+            self.state = self.COMMITTED_STATE
+            self.save()
+            self._log(self.COMMITTED_STATE, user, message)
 
             for transaction_entry in TransactionEntry.objects.filter(
                 transaction=self
-            ):
+            ).select_related("account__group", "account__owner"):
                 transaction_entry.check_if_blacklisted()
 
-            self.state = self.COMMITTED_STATE
-            self.last_modified = datetime.datetime.now()
-            self.save()
+            AccountBalance.objects.apply_transactions([self.id], confirmed=1)
+            BalanceCheckpoint.objects.apply_transactions([self.id])
+            AccountDailyTotal.objects.apply_transactions([self.id])
         else:
             raise InvalidTransaction("Could not set transaction as committed")
 
+    @db_transaction.atomic
     def set_rejected(self, user: User, message=""):
+        self._lock_state()
         if self.is_pending() and not self.is_committed():
-            log = TransactionLog(type=self.REJECTED_STATE, transaction=self)
-            log.user = user
-            if message.strip() != "":
-                log.message = message
-            log.save()
-
             self.state = self.REJECTED_STATE
-            self.last_modified = datetime.datetime.now()
             self.save()
+            self._log(self.REJECTED_STATE, user, message)
+
+            AccountBalance.objects.apply_transactions([self.id], future=-1)
         else:
             raise InvalidTransaction("Could not set transaction as rejected")
 
@@ -804,6 +1785,11 @@ class TransactionLog(models.Model):
         User, on_delete=models.CASCADE, verbose_name=_("user")
     )
     message = models.CharField(_("message"), max_length=200, blank=True)
+    # Numbers commits in the order they became visible, see
+    # itkufs.common.export.number_commits()
+    export_sequence = models.PositiveIntegerField(
+        _("export sequence"), null=True, editable=False, db_index=True
+    )
 
     def save(self, *args, **kwargs):
         if self.id is not None:
@@ -865,32 +1851,9 @@ class TransactionEntry(models.Model):
     )
 
     def check_if_blacklisted(self):
-        old_balance = self.account.normal_balance()
-        new_balance = old_balance - self.debit + self.credit
+        self.account.check_if_blacklisted(self.credit - self.debit)
 
-        if (
-            self.account.is_user_account
-            and self.account.ignore_block_limit is False
-            and self.account.group.block_limit is not None
-            and old_balance > self.account.group.block_limit
-            and new_balance < self.account.group.block_limit
-        ):
-            subject = "Svartelistet i µFS"
-            msg = (
-                f"Dette er en automatisk melding om at du har blitt "
-                f"svartelistet i {self.account.group.name} sin µFS. "
-                f"Din saldo er nå {new_balance}."
-            )
-            to_address = ["%s@samfundet.no" % self.account.owner]
-            send_mail(
-                subject,
-                (msg),
-                "ufs@samfundet.no",
-                to_address,
-                fail_silently=True,
-            )
-
-    def save(self, *args, **kwargs):
+    def validate(self):
         if self.transaction.is_rejected():
             raise InvalidTransactionEntry(
                 "Can not add entries to rejected transactions"
@@ -908,8 +1871,16 @@ class TransactionEntry(models.Model):
         if self.debit == 0 and self.credit == 0:
             raise InvalidTransactionEntry("Create or debit must be positive")
 
+    def save(self, *args, **kwargs):
+        self.validate()
         super().save(*args, **kwargs)
 
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        if self.transaction.is_pending():
+            AccountBalance.objects.refresh([self.account_id])
+        return result
+
     class Meta:
         unique_together = (("transaction", "account"),)
         verbose_name = _("transaction entry")
@@ -929,3 +1900,77 @@ class TransactionEntry(models.Model):
             "debit": self.debit,
             "credit": self.credit,
         }
+
+
+class OutgoingMailManager(models.Manager):
+    def enqueue(self, subject: str, body: str, from_email: str, to):
+        """Queues a mail for the sendqueuedmail command.
+
+        The mail is written in the current database transaction, so it is
+        only sent if the surrounding changes are committed.
+        """
+
+        return self.create(
+            subject=subject, body=body, from_email=from_email, to=",".join(to)
+        )
+
+    def due(self, now: datetime.datetime = None, max_attempts: int = None):
+        """Returns unsent mail that should be attempted now"""
+
+        if now is None:
+            now = datetime.datetime.now()
+        if max_attempts is None:
+            max_attempts = self.model.MAX_ATTEMPTS
+        return self.filter(
+            sent__isnull=True,
+            attempts__lt=max_attempts,
+            next_attempt__lte=now,
+        ).order_by("next_attempt", "id")
+
+
+class OutgoingMail(models.Model):
+    """Mail waiting to be sent by the sendqueuedmail command, so that slow
+    mail delivery never holds up a database transaction."""
+
+    MAX_ATTEMPTS = 10
+    RETRY_DELAY = datetime.timedelta(minutes=1)
+    MAX_RETRY_DELAY = datetime.timedelta(days=1)
+
+    objects = OutgoingMailManager()
+
+    subject = models.CharField(_("subject"), max_length=200)
+    body = models.TextField(_("body"))
+    from_email = models.CharField(_("from"), max_length=200)
+    to = models.TextField(_("to"))
+    created = models.DateTimeField(_("created"), auto_now_add=True)
+    next_attempt = models.DateTimeField(
+        _("next attempt"), default=datetime.datetime.now, db_index=True
+    )
+    attempts = models.PositiveIntegerField(_("attempts"), default=0)
+    last_error = models.TextField(_("last error"), blank=True)
+    sent = models.DateTimeField(_("sent"), null=True, blank=True)
+
+    class Meta:
+        ordering = ("created",)
+        verbose_name = _("outgoing mail")
+        verbose_name_plural = _("outgoing mail")
+
+    def __str__(self):
+        return _("%(subject)s to %(to)s") % {
+            "subject": self.subject,
+            "to": self.to,
+        }
+
+    def as_message(self) -> EmailMessage:
+        return EmailMessage(
+            self.subject, self.body, self.from_email, self.to.split(",")
+        )
+
+    def retry_delay(self) -> datetime.timedelta:
+        """Returns the exponential backoff after the latest attempt"""
+
+        seconds = min(
+            self.RETRY_DELAY.total_seconds() * 2.0 ** max(self.attempts - 1, 0),
+            self.MAX_RETRY_DELAY.total_seconds(),
+        )
+        return datetime.timedelta(seconds=seconds)
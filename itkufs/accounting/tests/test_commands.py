@@ -0,0 +1,99 @@
+import unittest
+import datetime
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.test import override_settings
+
+from itkufs.accounting.models import OutgoingMail
+
+
+class CountingEmailBackend(locmem.EmailBackend):
+    """Connects for every send like the SMTP backend, unless a connection
+    is already open, and counts the connections"""
+
+    opened = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.is_open = False
+
+    def open(self):
+        if self.is_open:
+            return False
+        CountingEmailBackend.opened += 1
+        self.is_open = True
+        return True
+
+    def close(self):
+        self.is_open = False
+
+    def send_messages(self, messages):
+        new_connection = self.open()
+        try:
+            return super().send_messages(messages)
+        finally:
+            if new_connection:
+                self.close()
+
+
+class SendQueuedMailTestCase(unittest.TestCase):
+    def setUp(self):
+        mail.outbox = []
+        self.mails = [
+            OutgoingMail.objects.enqueue(
+                "Subject %d" % i, "Body", "ufs@samfundet.no", ["a@b.no"]
+            )
+            for i in range(3)
+        ]
+
+    def tearDown(self):
+        OutgoingMail.objects.all().delete()
+
+    def testSendQueuedMail(self):
+        """Checks that all due mail is sent in batches"""
+
+        call_command("sendqueuedmail", batch_size=2)
+
+        assert sorted(m.subject for m in mail.outbox) == [
+            "Subject 0",
+            "Subject 1",
+            "Subject 2",
+        ]
+        assert OutgoingMail.objects.filter(sent__isnull=True).count() == 0
+
+        # Sent mail is not sent again
+        call_command("sendqueuedmail")
+        assert len(mail.outbox) == 3
+
+    def testFailedMailIsRetriedLater(self):
+        """Checks that failed mail is postponed with backoff"""
+
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=OSError("Connection refused"),
+        ):
+            call_command("sendqueuedmail")
+
+        failed = OutgoingMail.objects.get(id=self.mails[0].id)
+        assert failed.sent is None
+        assert failed.attempts == 1
+        assert failed.last_error == "Connection refused"
+        assert failed.next_attempt > datetime.datetime.now()
+        assert OutgoingMail.objects.due().count() == 0
+
+    @override_settings(
+        EMAIL_BACKEND=(
+            "itkufs.accounting.tests.test_commands.CountingEmailBackend"
+        )
+    )
+    def testSingleConnection(self):
+        """Checks that all mail is sent over one connection"""
+
+        CountingEmailBackend.opened = 0
+        call_command("sendqueuedmail", batch_size=2)
+
+        assert len(mail.outbox) == 3
+        assert CountingEmailBackend.opened == 1
@@ -0,0 +1,68 @@
+import datetime
+import unittest
+from decimal import Decimal
+
+import pytest
+
+from itkufs.accounting.history import bucket_history, bucket_start, lttb
+
+
+class BucketTestCase(unittest.TestCase):
+    def testBucketStart(self):
+        date = datetime.date(2024, 5, 16)  # A Thursday
+        assert bucket_start(date, "day") == date
+        assert bucket_start(date, "week") == datetime.date(2024, 5, 13)
+        assert bucket_start(date, "month") == datetime.date(2024, 5, 1)
+        with pytest.raises(ValueError):
+            bucket_start(date, "year")
+
+    def testBucketHistory(self):
+        """Checks that every bucket gets the balance at its end"""
+
+        history = [
+            (datetime.date(2024, 5, 13), Decimal(10), Decimal(10)),
+            (datetime.date(2024, 5, 16), Decimal(5), Decimal(15)),
+            (datetime.date(2024, 6, 3), Decimal(-20), Decimal(-5)),
+        ]
+        assert bucket_history(history, "day") == [
+            (datetime.date(2024, 5, 13), 10.0),
+            (datetime.date(2024, 5, 16), 15.0),
+            (datetime.date(2024, 6, 3), -5.0),
+        ]
+        assert bucket_history(history, "week") == [
+            (datetime.date(2024, 5, 13), 15.0),
+            (datetime.date(2024, 6, 3), -5.0),
+        ]
+        assert bucket_history(history, "month") == [
+            (datetime.date(2024, 5, 1), 15.0),
+            (datetime.date(2024, 6, 1), -5.0),
+        ]
+        assert bucket_history([], "month") == []
+
+
+class LTTBTestCase(unittest.TestCase):
+    def setUp(self):
+        start = datetime.date(2024, 1, 1)
+        self.points = [
+            (start + datetime.timedelta(days=i), float(i % 7))
+            for i in range(100)
+        ]
+        # A single spike, which a chart must not lose
+        self.points[50] = (self.points[50][0], 1000.0)
+
+    def testDownsample(self):
+        sampled = lttb(self.points, 10)
+        assert len(sampled) == 10
+        assert sampled[0] == self.points[0]
+        assert sampled[-1] == self.points[-1]
+        assert self.points[50] in sampled
+        assert sampled == sorted(sampled)
+
+    def testFewPoints(self):
+        assert lttb(self.points[:5], 10) == self.points[:5]
+        assert lttb([], 3) == []
+
+    def testThreshold(self):
+        assert len(lttb(self.points, 3)) == 3
+        with pytest.raises(ValueError):
+            lttb(self.points, 2)
@@ -2,12 +2,19 @@ import pytest
 import unittest
 import datetime
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 from itkufs.accounting.models import (
     Account,
+    AccountBalance,
+    AccountDailyTotal,
+    BalanceCheckpoint,
     Group,
     InvalidTransaction,
     InvalidTransactionEntry,
     InvalidTransactionLog,
+    OutgoingMail,
     RoleAccount,
     Transaction,
     TransactionEntry,
@@ -354,6 +361,65 @@ class AccountTestCase(unittest.TestCase):
         # User account after debit of 350
         assert int(account2.future_balance_sql) == 350
 
+    def testStoredBalance(self):
+        """Checks that the stored balances follow transaction state changes"""
+
+        account1 = self.accounts[0]
+        account2 = self.accounts[1]
+
+        balance1 = AccountBalance.objects.get(account=account1)
+        balance2 = AccountBalance.objects.get(account=account2)
+        assert int(balance1.confirmed) == -200
+        assert int(balance1.future) == -350
+        assert int(balance2.confirmed) == 200
+        assert int(balance2.future) == 350
+
+        self.transactions["Pen"].set_rejected(user=self.users[2])
+        assert int(account1.balance()) == -200
+        assert int(AccountBalance.objects.get(account=account1).future) == -200
+
+        assert AccountBalance.objects.mismatches() == []
+
+    def testRefreshStoredBalance(self):
+        """Checks that refreshing corrects a wrong stored balance"""
+
+        AccountBalance.objects.filter(account=self.account).update(
+            confirmed=0, future=0
+        )
+        assert len(AccountBalance.objects.mismatches()) == 1
+
+        AccountBalance.objects.refresh([self.account.id])
+        assert int(self.account.balance()) == -200
+        assert AccountBalance.objects.mismatches() == []
+
+    def testBalanceAsOf(self):
+        """Checks historical balances with and without checkpoints"""
+
+        today = datetime.date.today()
+        yesterday = today - datetime.timedelta(days=1)
+
+        assert int(self.account.balance(as_of=yesterday)) == 0
+        assert int(self.account.balance(as_of=today)) == -200
+
+        BalanceCheckpoint.objects.create_for_group(self.group, today)
+        assert self.account.checkpoint_set.get(date=today).balance == -200
+        assert int(self.account.balance(as_of=today)) == -200
+        assert int(self.account.normal_balance(as_of=today)) == 200
+
+        # Committing a transaction dated before the checkpoint updates it
+        transaction = Transaction(group=self.group, date=yesterday)
+        transaction.save()
+        transaction.entry_set.create(account=self.accounts[0], credit=50)
+        transaction.entry_set.create(account=self.accounts[1], debit=50)
+        transaction.set_pending(user=self.users[0])
+        transaction.set_committed(user=self.users[0])
+
+        assert self.account.checkpoint_set.get(date=today).balance == -250
+        assert int(self.account.balance(as_of=yesterday)) == -50
+        assert int(self.account.balance(as_of=today)) == -250
+
+        transaction.delete()
+
     # --- Transaction set tests
     # Please keep in sync with Group's set tests
 
@@ -407,6 +473,32 @@ class AccountTestCase(unittest.TestCase):
         assert self.transactions["Com"] not in set
         assert self.transactions["Rej"] in set
 
+    def testTransactionSetWithoutDistinct(self):
+        """Checks that the account's transactions are found with EXISTS,
+        without a join and DISTINCT"""
+
+        set = self.account.transaction_set_with_rejected
+        sql = str(set.query).upper()
+        assert "EXISTS" in sql
+        assert "DISTINCT" not in sql
+        assert "JOIN" not in sql
+        assert set.count() == 3
+        assert len(set) == 3
+
+    def testChainedTransactionQuerySet(self):
+        """Checks that the transaction queryset methods can be chained"""
+
+        set = (
+            Transaction.objects.for_group(self.group)
+            .for_account(self.accounts[1])
+            .committed()
+        )
+        assert list(set) == [self.transactions["Com"]]
+        assert not Transaction.objects.for_account(self.accounts[3]).exists()
+        assert list(
+            Transaction.objects.for_account(self.account).rejected()
+        ) == [self.transactions["Rej"]]
+
 
 class TransactionTestCase(unittest.TestCase):
     def setUp(self):
@@ -481,6 +573,104 @@ class TransactionTestCase(unittest.TestCase):
 
         transaction.delete()
 
+    def testAccountBothDebitAndCredit(self):
+        """Checks that an account can not be both debited and credited"""
+
+        with pytest.raises(InvalidTransaction):
+            self.transaction.validate(
+                [
+                    (self.accounts[0].id, self.group.id, 100, 0),
+                    (self.accounts[0].id, self.group.id, 0, 50),
+                    (self.accounts[1].id, self.group.id, 0, 50),
+                ]
+            )
+
+    def testAccountFromOtherGroup(self):
+        """Checks that entries must belong to the transaction's group"""
+
+        with pytest.raises(InvalidTransaction):
+            self.transaction.validate(
+                [
+                    (self.accounts[0].id, self.group.id, 100, 0),
+                    (self.accounts[1].id, self.group.id + 1, 0, 100),
+                ]
+            )
+
+    def testSaveQueryCount(self):
+        """Checks that saving does not run a query per entry"""
+
+        def count_queries(transaction):
+            with CaptureQueriesContext(connection) as context:
+                transaction.save()
+            return len(context.captured_queries)
+
+        small = self.transaction
+        small_count = count_queries(small)
+
+        large = Transaction(group=self.group)
+        large.save()
+        for account in self.accounts[1:]:
+            large.entry_set.create(account=account, credit=10)
+        large.entry_set.create(account=self.accounts[0], debit=20)
+
+        assert count_queries(large) == small_count
+
+        large.delete()
+
+    def testCreateWithEntries(self):
+        """Checks that a transaction can be created with all its entries"""
+
+        with CaptureQueriesContext(connection) as context:
+            transaction = Transaction.objects.create_with_entries(
+                group=self.group,
+                entries=[
+                    TransactionEntry(account=self.accounts[0], debit=30),
+                    TransactionEntry(account=self.accounts[1], credit=20),
+                    TransactionEntry(account=self.accounts[2], credit=10),
+                ],
+                user=self.user,
+                message="Created in bulk",
+            )
+        queries = len(context.captured_queries)
+
+        assert transaction.is_pending() is True
+        assert transaction.entry_set.count() == 3
+        assert transaction.log_set.get().message == "Created in bulk"
+        assert AccountBalance.objects.mismatches() == []
+
+        transaction.set_committed(user=self.user)
+        assert AccountBalance.objects.mismatches() == []
+
+        # The number of queries does not depend on the number of entries
+        with CaptureQueriesContext(connection) as context:
+            other = Transaction.objects.create_with_entries(
+                group=self.group,
+                entries=[
+                    TransactionEntry(account=self.accounts[0], debit=30),
+                    TransactionEntry(account=self.accounts[1], credit=30),
+                ],
+                user=self.user,
+            )
+        assert len(context.captured_queries) == queries
+
+        other.delete()
+        transaction.delete()
+
+    def testCreateWithUnbalancedEntries(self):
+        """Checks that unbalanced entries are not saved"""
+
+        count = Transaction.objects.count()
+        with pytest.raises(InvalidTransaction):
+            Transaction.objects.create_with_entries(
+                group=self.group,
+                entries=[
+                    TransactionEntry(account=self.accounts[0], debit=30),
+                    TransactionEntry(account=self.accounts[1], credit=20),
+                ],
+                user=self.user,
+            )
+        assert Transaction.objects.count() == count
+
     def testPendingLogEntry(self):
         """Checks that a pending log entry is created"""
 
@@ -546,6 +736,65 @@ class TransactionTestCase(unittest.TestCase):
         assert rejected > before
         assert rejected < after
 
+    def testCommitPending(self):
+        """Checks that pending transactions can be committed in bulk"""
+
+        other = Transaction.objects.create_with_entries(
+            group=self.group,
+            entries=[
+                TransactionEntry(account=self.accounts[1], debit=40),
+                TransactionEntry(account=self.accounts[2], credit=40),
+            ],
+            user=self.user,
+        )
+        rejected = Transaction.objects.create_with_entries(
+            group=self.group,
+            entries=[
+                TransactionEntry(account=self.accounts[0], debit=10),
+                TransactionEntry(account=self.accounts[2], credit=10),
+            ],
+            user=self.user,
+        )
+        rejected.set_rejected(user=self.user)
+
+        ids = Transaction.objects.commit_pending(
+            [self.transaction.id, other.id, rejected.id],
+            user=self.user,
+            message="Bulk",
+        )
+
+        assert ids == sorted([self.transaction.id, other.id])
+        assert Transaction.objects.get(id=other.id).is_committed() is True
+        assert Transaction.objects.get(id=rejected.id).is_rejected() is True
+        assert other.log_set.get(type=Transaction.COMMITTED_STATE).message == (
+            "Bulk"
+        )
+        assert self.accounts[1].balance() == -60
+        assert AccountBalance.objects.mismatches() == []
+
+        # Transactions that are no longer pending are left alone
+        assert Transaction.objects.commit_pending([other.id], self.user) == []
+        assert other.log_set.count() == 2
+
+        other.delete()
+        rejected.delete()
+
+    def testRejectPending(self):
+        """Checks that pending transactions can be rejected in bulk"""
+
+        ids = Transaction.objects.reject_pending(
+            [self.transaction.id], user=self.user, message="Reason"
+        )
+
+        transaction = Transaction.objects.get(id=self.transaction.id)
+        assert ids == [self.transaction.id]
+        assert transaction.is_rejected() is True
+        assert (
+            transaction.log_set.get(type=Transaction.REJECTED_STATE).message
+            == "Reason"
+        )
+        assert AccountBalance.objects.mismatches() == []
+
     def testRejectCommitedTransaction(self):
         """Tests that rejecting committed transaction fails"""
 
@@ -557,6 +806,41 @@ class TransactionTestCase(unittest.TestCase):
                 message="Reason for rejecting", user=self.user
             )
 
+    def testStaleStateChange(self):
+        """Checks that a transaction committed elsewhere is not committed
+        or rejected again from an outdated instance"""
+
+        stale = [
+            Transaction.objects.get(id=self.transaction.id) for i in range(2)
+        ]
+        Transaction.objects.commit_pending([self.transaction.id], self.user)
+
+        with pytest.raises(InvalidTransaction):
+            stale[0].set_rejected(user=self.user)
+        with pytest.raises(InvalidTransaction):
+            stale[1].set_committed(user=self.user)
+
+        assert self.accounts[0].balance() == 100
+        assert AccountBalance.objects.mismatches() == []
+        assert (
+            AccountDailyTotal.objects.filter(account=self.accounts[0])
+            .get()
+            .debit
+            == 100
+        )
+
+    def testLedgerVersion(self):
+        """Checks that the ledger version changes with transactions and
+        accounts"""
+
+        versions = [self.group.ledger_version()[1]]
+        Transaction.objects.commit_pending([self.transaction.id], self.user)
+        versions.append(self.group.ledger_version()[1])
+        self.accounts[0].short_name = "A"
+        self.accounts[0].save()
+        versions.append(self.group.ledger_version()[1])
+        assert versions == sorted(set(versions))
+
     def testDefaultDate(self):
         """Checks that the default date is the current date"""
 
@@ -682,3 +966,184 @@ class SettlementTestCase(unittest.TestCase):
 
     def breakDown(self):
         pass
+
+
+class OutgoingMailTestCase(unittest.TestCase):
+    def setUp(self):
+        self.user = User(username="alice")
+        self.user.save()
+
+        self.group = Group(name="Group 1", slug="group1", block_limit=0)
+        self.group.save()
+
+        self.account = Account(
+            name="Account 1", slug="account1", group=self.group, owner=self.user
+        )
+        self.account.save()
+        self.bank = self.group.account_set.get(slug="bank")
+
+    def tearDown(self):
+        OutgoingMail.objects.all().delete()
+        self.group.delete()
+        self.user.delete()
+
+    def testBlacklistMailIsQueued(self):
+        """Checks that passing the block limit queues a mail"""
+
+        transaction = Transaction.objects.create_with_entries(
+            group=self.group,
+            entries=[
+                TransactionEntry(account=self.account, credit=10),
+                TransactionEntry(account=self.bank, debit=10),
+            ],
+            user=self.user,
+            state=Transaction.COMMITTED_STATE,
+        )
+        assert OutgoingMail.objects.count() == 0
+
+        transaction = Transaction.objects.create_with_entries(
+            group=self.group,
+            entries=[
+                TransactionEntry(account=self.account, debit=30),
+                TransactionEntry(account=self.bank, credit=30),
+            ],
+            user=self.user,
+            state=Transaction.COMMITTED_STATE,
+        )
+
+        mail = OutgoingMail.objects.get()
+        assert mail.to == "alice@samfundet.no"
+        assert mail.sent is None
+        assert list(OutgoingMail.objects.due()) == [mail]
+
+        transaction.delete()
+
+    def testRetryDelay(self):
+        """Checks that the delay between attempts grows up to a limit"""
+
+        mail = OutgoingMail(attempts=1)
+        assert mail.retry_delay() == OutgoingMail.RETRY_DELAY
+        mail.attempts = 3
+        assert mail.retry_delay() == 4 * OutgoingMail.RETRY_DELAY
+        mail.attempts = 100
+        assert mail.retry_delay() == OutgoingMail.MAX_RETRY_DELAY
+
+    def testDue(self):
+        """Checks that sent, failed and postponed mail is not due"""
+
+        due = OutgoingMail.objects.enqueue("a", "b", "c@d", ["e@f"])
+        now = datetime.datetime.now()
+        OutgoingMail(
+            subject="a", body="b", from_email="c@d", to="e@f", sent=now
+        ).save()
+        OutgoingMail(
+            subject="a",
+            body="b",
+            from_email="c@d",
+            to="e@f",
+            next_attempt=now + datetime.timedelta(hours=1),
+        ).save()
+        OutgoingMail(
+            subject="a",
+            body="b",
+            from_email="c@d",
+            to="e@f",
+            attempts=OutgoingMail.MAX_ATTEMPTS,
+        ).save()
+
+        assert list(OutgoingMail.objects.due(now)) == [due]
+
+
+class AccountDailyTotalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.user = User(username="alice")
+        self.user.save()
+
+        self.group = Group(name="Group 1", slug="group1")
+        self.group.save()
+
+        self.account = Account(
+            name="Account 1", slug="account1", group=self.group, owner=self.user
+        )
+        self.account.save()
+        self.bank = self.group.account_set.get(slug="bank")
+
+        self.today = datetime.date.today()
+        self.long_ago = self.today - datetime.timedelta(days=60)
+
+    def tearDown(self):
+        self.group.delete()
+        self.user.delete()
+
+    def create(self, amount, date, state=Transaction.COMMITTED_STATE):
+        return Transaction.objects.create_with_entries(
+            group=self.group,
+            entries=[
+                TransactionEntry(account=self.account, debit=amount),
+                TransactionEntry(account=self.bank, credit=amount),
+            ],
+            user=self.user,
+            state=state,
+            date=date,
+        )
+
+    def totals(self):
+        return list(
+            AccountDailyTotal.objects.filter(account__group=self.group)
+            .order_by("date", "account__slug")
+            .values_list("account__slug", "date", "debit", "credit")
+        )
+
+    def testCommit(self):
+        """Checks that committed transactions are added to their day"""
+
+        self.create(10, self.today)
+        self.create(5, self.today)
+        self.create(20, self.long_ago)
+        pending = self.create(100, self.today, Transaction.PENDING_STATE)
+        rejected = self.create(200, self.today, Transaction.PENDING_STATE)
+        rejected.set_rejected(user=self.user)
+
+        expected = [
+            ("account1", self.long_ago, 20, 0),
+            ("bank", self.long_ago, 0, 20),
+            ("account1", self.today, 15, 0),
+            ("bank", self.today, 0, 15),
+        ]
+        assert self.totals() == expected
+
+        Transaction.objects.commit_pending([pending.id], self.user)
+        expected[2] = ("account1", self.today, 115, 0)
+        expected[3] = ("bank", self.today, 0, 115)
+        assert self.totals() == expected
+
+        # Rebuilding gives the same totals
+        AccountDailyTotal.objects.filter(account=self.account).update(debit=1)
+        AccountDailyTotal.objects.refresh([self.account.id, self.bank.id])
+        assert self.totals() == expected
+
+    def testUsage(self):
+        """Checks that usage is read from the daily totals"""
+
+        self.create(10, self.today)
+        self.create(20, self.long_ago)
+        self.create(100, self.today, Transaction.PENDING_STATE)
+
+        account = (
+            Account.objects.with_total_used()
+            .with_last_30_days_usage()
+            .get(id=self.account.id)
+        )
+        assert account.total_used() == 30
+        assert account.total_used_sql == 30
+        assert account.last_30_days_usage() == 10
+        assert account.last_30_days_usage_sql == 10
+
+        change = Account.historical_objects.with_balance_change(
+            self.long_ago, self.today - datetime.timedelta(days=1)
+        ).get(id=self.account.id)
+        assert change.normal_balance == -20
+
+        AccountDailyTotal.objects.filter(account=self.account).delete()
+        assert self.account.total_used() == 0
+        assert self.account.last_30_days_usage() == 0
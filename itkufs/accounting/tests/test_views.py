@@ -1,4 +1,19 @@
 import unittest
+from unittest import mock
+from decimal import Decimal
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from itkufs.accounting.models import (
+    Account,
+    Group,
+    Transaction,
+    TransactionEntry,
+    User,
+)
 
 
 class UserViewsTestCase(unittest.TestCase):
@@ -83,3 +98,296 @@ class AdminViewsTestCase(unittest.TestCase):
         """FIXME: Write docstring"""
         # FIXME: Implement test
         self.fail("Test not implemented")
+
+
+class APIViewsTestCase(unittest.TestCase):
+    """Tests the JSON account API"""
+
+    def setUp(self):
+        self.user = User(username="alice")
+        self.user.save()
+
+        self.group = Group(name="Group 1", slug="group1")
+        self.group.save()
+        self.group.admins.add(self.user)
+
+        self.accounts = [
+            Account(
+                name="Account %d" % i, slug="account%d" % i, group=self.group
+            )
+            for i in range(3)
+        ]
+        for account in self.accounts:
+            account.save()
+
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.url = reverse("account-list", args=[self.group.slug])
+
+    def tearDown(self):
+        self.group.delete()
+        self.user.delete()
+
+    def get(self, data=None, **headers):
+        return self.client.get(self.url, data, secure=True, **headers)
+
+    def testAccountList(self):
+        """Checks that accounts are listed with their balances"""
+
+        Transaction.objects.create_with_entries(
+            group=self.group,
+            entries=[
+                TransactionEntry(account=self.accounts[0], debit=25),
+                TransactionEntry(account=self.accounts[1], credit=25),
+            ],
+            user=self.user,
+            state=Transaction.COMMITTED_STATE,
+        )
+
+        data = self.get({"fields": "slug,balance"}).json()
+        assert data["count"] == 5
+        balances = {a["slug"]: a["balance"] for a in data["results"]}
+        assert Decimal(balances["account0"]) == -25
+        assert Decimal(balances["account1"]) == 25
+        assert set(data["results"][0]) == {"slug", "balance"}
+
+    def testPagination(self):
+        data = self.get({"fields": "id", "per_page": 2, "page": 3}).json()
+        assert data["pages"] == 3
+        assert len(data["results"]) == 1
+
+    def testInvalidParameters(self):
+        assert self.get({"fields": "password"}).status_code == 400
+        assert self.get({"page": 10}).status_code == 400
+
+    def testConditionalGet(self):
+        """Checks that polls get a 304 until a transaction changes"""
+
+        response = self.get()
+        etag = response["ETag"]
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+
+        Transaction.objects.create_with_entries(
+            group=self.group,
+            entries=[
+                TransactionEntry(account=self.accounts[0], debit=25),
+                TransactionEntry(account=self.accounts[1], credit=25),
+            ],
+            user=self.user,
+        )
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+
+    def testLastModified(self):
+        """Checks that polls with If-Modified-Since get a 304 until the
+        ledger changes"""
+
+        last_modified = self.get()["Last-Modified"]
+        response = self.get(HTTP_IF_MODIFIED_SINCE=last_modified)
+        assert response.status_code == 304
+
+    def testConditionalGetBlockLimit(self):
+        """Checks that a new block limit gives a new response"""
+
+        etag = self.get({"fields": "is_blocked"})["ETag"]
+        self.group.block_limit = 10
+        self.group.save()
+
+        response = self.get({"fields": "is_blocked"}, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response.json()["results"][0]["is_blocked"]
+
+
+class TransactionListTestCase(unittest.TestCase):
+    """Tests paging through the transaction list"""
+
+    def setUp(self):
+        self.user = User(username="alice")
+        self.user.save()
+
+        self.group = Group(name="Group 1", slug="group1")
+        self.group.save()
+        self.group.admins.add(self.user)
+
+        self.accounts = [
+            Account(
+                name="Account %d" % i, slug="account%d" % i, group=self.group
+            )
+            for i in range(2)
+        ]
+        for account in self.accounts:
+            account.save()
+
+        self.transactions = [
+            Transaction.objects.create_with_entries(
+                group=self.group,
+                entries=[
+                    TransactionEntry(account=self.accounts[0], debit=i + 1),
+                    TransactionEntry(account=self.accounts[1], credit=i + 1),
+                ],
+                user=self.user,
+                state=Transaction.COMMITTED_STATE,
+            )
+            for i in range(45)
+        ]
+
+        # Rows modified at the same time are ordered by id
+        Transaction.objects.filter(
+            id__in=[t.id for t in self.transactions[10:30]]
+        ).update(last_modified=self.transactions[10].last_modified)
+
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.url = reverse("transaction-list-group", args=[self.group.slug])
+
+    def tearDown(self):
+        self.group.delete()
+        self.user.delete()
+
+    def get(self, data=None):
+        return self.client.get(self.url, data, secure=True)
+
+    def ids(self, response):
+        return [t.id for t in response.context["transaction_list"]]
+
+    def testPaging(self):
+        """Checks that following the cursors visits every transaction once,
+        newest first"""
+
+        response = self.get()
+        ids = self.ids(response)
+        pages = [response.context["page_obj"]]
+        while pages[-1].has_next():
+            response = self.get({"after": pages[-1].next_cursor()})
+            ids.extend(self.ids(response))
+            pages.append(response.context["page_obj"])
+
+        expected = sorted(
+            Transaction.objects.filter(group=self.group).values_list(
+                "last_modified", "id"
+            ),
+            reverse=True,
+        )
+        assert ids == [id for _, id in expected]
+        assert [len(page) for page in pages] == [20, 20, 5]
+
+        # Going back gives the same pages
+        response = self.get({"before": pages[2].previous_cursor()})
+        assert self.ids(response) == ids[20:40]
+        response = self.get({"before": pages[1].previous_cursor()})
+        assert self.ids(response) == ids[:20]
+        assert not response.context["page_obj"].has_previous()
+
+    def testQueryCount(self):
+        """Checks that the number of queries does not depend on the number
+        of transactions on the page"""
+
+        self.get()
+        with CaptureQueriesContext(connection) as context:
+            response = self.get()
+        assert response.status_code == 200
+        first_page = len(context)
+
+        with CaptureQueriesContext(connection) as context:
+            self.get({"after": response.context["page_obj"].next_cursor()})
+        assert len(context) == first_page
+        assert first_page < 15
+
+    def testInvalidCursor(self):
+        assert self.get({"after": "invalid"}).status_code == 404
+
+    def testCursorPastLastRow(self):
+        """Checks that a cursor older than every row gives the first page"""
+
+        response = self.get({"after": "1-1"})
+        assert response.status_code == 200
+        assert len(self.ids(response)) == 20
+        assert not response.context["page_obj"].has_previous()
+
+    def testNumberedPageRedirects(self):
+        url = reverse("transaction-list-group-page", args=[self.group.slug, 2])
+        response = self.client.get(url, secure=True)
+        assert response.status_code == 301
+        assert response["Location"].endswith(self.url)
+
+
+class ApproveTransactionsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.user = User(username="alice")
+        self.user.save()
+
+        self.group = Group(name="Group 1", slug="group1")
+        self.group.save()
+        self.group.admins.add(self.user)
+
+        accounts = [
+            Account(
+                name="Account %d" % i, slug="account%d" % i, group=self.group
+            )
+            for i in range(2)
+        ]
+        for account in accounts:
+            account.save()
+        self.transactions = [
+            Transaction.objects.create_with_entries(
+                group=self.group,
+                entries=[
+                    TransactionEntry(account=accounts[0], debit=10 + i),
+                    TransactionEntry(account=accounts[1], credit=10 + i),
+                ],
+                user=self.user,
+                state=Transaction.PENDING_STATE,
+            )
+            for i in range(3)
+        ]
+
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.group.delete()
+        self.user.delete()
+
+    def testPageOutOfRange(self):
+        """Checks that page numbers out of range give the nearest page"""
+
+        for page in [0, 1, 5]:
+            url = reverse(
+                "approve-transactions-page", args=[self.group.slug, page]
+            )
+            response = self.client.get(url, secure=True)
+            assert response.status_code == 200
+            assert len(response.context["transaction_list"]) == 3
+
+    def testSubmittedTransactionsOffPage(self):
+        """Checks that the submitted transactions are changed, even if they
+        are no longer on the page, and that handled ones are left alone"""
+
+        # The newest transaction is now alone on the first page
+        handled, moved, newest = self.transactions
+        Transaction.objects.commit_pending([handled.id], self.user)
+
+        url = reverse("approve-transactions-page", args=[self.group.slug, 1])
+        with mock.patch(
+            "itkufs.accounting.views.edit.APPROVE_TRANSACTIONS_PER_PAGE", 1
+        ):
+            response = self.client.post(
+                url,
+                {
+                    "transaction%d-change_to" % handled.id: "Rej",
+                    "transaction%d-change_to" % moved.id: "Com",
+                },
+                secure=True,
+                follow=True,
+            )
+        assert response.status_code == 200
+        assert Transaction.objects.get(id=handled.id).is_committed()
+        assert Transaction.objects.get(id=moved.id).is_committed()
+        assert Transaction.objects.get(id=newest.id).is_pending()
+        assert [str(m) for m in response.context["messages"]] == [
+            "1 of the transactions are no longer pending and were left "
+            "unchanged."
+        ]
@@ -64,6 +64,11 @@ urlpatterns = [
         approve_transactions,
         name="approve-transactions",
     ),
+    url(
+        r"^(?P<group>[0-9a-z_-]+)/approve-transaction/p(?P<page>\d+)/$",
+        approve_transactions,
+        name="approve-transactions-page",
+    ),
     url(
         r"^(?P<group>[0-9a-z_-]+)/reject-transaction/$",
         reject_transactions,
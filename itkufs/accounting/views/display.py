@@ -1,17 +1,26 @@
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden, JsonResponse
-from django.views.generic.detail import SingleObjectMixin
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Prefetch
+from django.http import (
+    Http404,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    HttpResponsePermanentRedirect,
+    JsonResponse,
+)
+from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.utils.translation import ugettext as _
 from django.views.generic import DetailView, ListView, View
-from django.forms.models import model_to_dict
 
-from itkufs.common.decorators import limit_to_group
+from itkufs.common.decorators import ledger_condition, limit_to_group
+from itkufs.common.pagination import InvalidCursor, keyset_page
 from itkufs.accounting.models import (
     Account,
     Settlement,
     Transaction,
     TransactionEntry,
+    TransactionLog,
 )
 
 
@@ -78,29 +87,58 @@ class TransactionList(ListView):
                 _("Forbidden if not account owner or group admin.")
             )
 
+        # Numbered pages are replaced by cursors, see keyset_page()
+        if kwargs.get("page"):
+            if self.account:
+                url = reverse(
+                    "transaction-list-account",
+                    args=[self.group.slug, self.account.slug],
+                )
+            else:
+                url = reverse("transaction-list-group", args=[self.group.slug])
+            return HttpResponsePermanentRedirect(url)
+
         return super().dispatch(request, *args, **kwargs)
 
     def get_queryset(self):
         if self.account:
-            return self.account.transaction_set_with_rejected.filter(
-                entry_set__account=self.account
-            )
+            transactions = self.account.transaction_set_with_rejected
         else:
-            return self.group.transaction_set_with_rejected.all()
+            transactions = self.group.transaction_set_with_rejected
+
+        # Everything shown for the page is fetched in bulk
+        return transactions.select_related("group").prefetch_related(
+            Prefetch(
+                "entry_set",
+                queryset=TransactionEntry.objects.select_related(
+                    "account__owner"
+                ),
+            ),
+            Prefetch(
+                "log_set",
+                queryset=TransactionLog.objects.select_related("user"),
+            ),
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        try:
+            page = keyset_page(
+                queryset,
+                page_size,
+                after=self.request.GET.get("after"),
+                before=self.request.GET.get("before"),
+            )
+        except InvalidCursor:
+            raise Http404(_("Invalid page"))
+        return (None, page, page.object_list, page.has_other_pages())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        try:
-            user_account = self.group.account_set.get(owner=self.request.user)
-        except Account.DoesNotExist:
-            user_account = None
-
         context["is_admin"] = self.is_admin
         context["is_owner"] = self.is_owner
         context["group"] = self.group
         context["account"] = self.account
-        context["user_account"] = user_account
 
         return context
 
@@ -143,15 +181,72 @@ class TransactionDetails(DetailView):
         return context
 
 
-class APIAccountDetails(SingleObjectMixin, View):
+class APIAccountDetails(View):
+    """Lists the accounts of a group with their balances as JSON.
+
+    The fields parameter selects a comma separated subset of the fields,
+    and page and per_page control pagination. Responses carry an ETag and
+    Last-Modified that only change with the group, its accounts and their
+    transactions, so polling clients get a 304 while nothing has happened.
+    """
+
+    FIELDS = {
+        "id": "id",
+        "name": "name",
+        "short_name": "short_name",
+        "slug": "slug",
+        "group": "group",
+        "type": "type",
+        "owner": "owner",
+        "active": "active",
+        "ignore_block_limit": "ignore_block_limit",
+        "blocked": "blocked",
+        "group_account": "group_account",
+        "balance": "stored_normal_balance",
+        "is_blocked": "is_blocked_sql",
+    }
+    PER_PAGE = 100
+    MAX_PER_PAGE = 500
 
     @method_decorator(login_required)
     @method_decorator(limit_to_group)
+    @method_decorator(ledger_condition)
     def get(self, request, *args, **kwargs):
-        accounts = Account.objects.filter(group=kwargs["group"])
-        data = {}
-        for a in accounts:
-            temp = model_to_dict(a)
-            temp['balance'] = a.normal_balance()
-            data[a.id] = temp
-        return JsonResponse(data)
+        try:
+            fields = self.get_fields(request.GET.get("fields"))
+            per_page = int(request.GET.get("per_page", self.PER_PAGE))
+            per_page = min(max(per_page, 1), self.MAX_PER_PAGE)
+            accounts = (
+                Account.objects.filter(group=kwargs["group"])
+                .with_blocked()
+                .order_by("name", "id")
+                .values(*[self.FIELDS[f] for f in fields])
+            )
+            page = Paginator(accounts, per_page).page(
+                request.GET.get("page", 1)
+            )
+        except (ValueError, InvalidPage) as e:
+            return HttpResponseBadRequest(str(e))
+
+        results = []
+        for values in page.object_list:
+            results.append({f: values[self.FIELDS[f]] for f in fields})
+
+        return JsonResponse(
+            {
+                "count": page.paginator.count,
+                "page": page.number,
+                "pages": page.paginator.num_pages,
+                "results": results,
+            }
+        )
+
+    def get_fields(self, fields):
+        if not fields:
+            return list(self.FIELDS)
+
+        fields = fields.split(",")
+        for field in fields:
+            if field not in self.FIELDS:
+                raise ValueError(_("Unknown field: %s") % field)
+        return fields
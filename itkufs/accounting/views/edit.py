@@ -1,5 +1,8 @@
+import re
+
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
 from django.db import transaction as db_transaction
 from django.http import (
     HttpRequest,
@@ -29,11 +32,17 @@ from itkufs.accounting.forms import (
     RejectTransactionForm,
     SettlementForm,
     TransactionSettlementForm,
+    TransactionFilterForm,
     TransferForm,
 )
 
 from typing import Optional
 
+APPROVE_TRANSACTIONS_PER_PAGE = 50
+
+# The change_to field of a ChangeTransactionForm with a transaction prefix
+CHANGE_TRANSACTION_FIELD_RE = re.compile(r"^transaction(\d+)-change_to$")
+
 
 @login_required
 @limit_to_admin
@@ -124,31 +133,38 @@ def transfer(
             role=RoleAccount.BANK_ACCOUNT
         ).account
 
-        transaction = Transaction(group=group)
-        # FIXME: save() shouldn't be need if we figure out a reasonable hack
-        transaction.save()
-
         if transfer_type == "deposit":
             # Deposit to user account
-            transaction.entry_set.create(account=account, credit=amount)
-            transaction.entry_set.create(account=bank_account, debit=amount)
-            transaction.set_pending(user=request.user, message=details)
+            entries = [
+                TransactionEntry(account=account, credit=amount),
+                TransactionEntry(account=bank_account, debit=amount),
+            ]
 
         elif transfer_type == "withdraw":
             # Withdraw from user account
-            transaction.entry_set.create(account=account, debit=amount)
-            transaction.entry_set.create(account=bank_account, credit=amount)
-            transaction.set_pending(user=request.user, message=details)
+            entries = [
+                TransactionEntry(account=account, debit=amount),
+                TransactionEntry(account=bank_account, credit=amount),
+            ]
 
         elif transfer_type == "transfer":
             # Transfer from user account to other user account
             credit_account = Account.objects.get(
                 id=form.cleaned_data["credit_account"]
             )
-            transaction.entry_set.create(account=account, debit=amount)
-            transaction.entry_set.create(account=credit_account, credit=amount)
-            transaction.set_pending(user=request.user, message=details)
+            entries = [
+                TransactionEntry(account=account, debit=amount),
+                TransactionEntry(account=credit_account, credit=amount),
+            ]
+
+        else:
+            return HttpResponseForbidden(_("Forbidden if not group admin."))
+
+        transaction = Transaction.objects.create_with_entries(
+            group=group, entries=entries, user=request.user, message=details
+        )
 
+        if transfer_type == "transfer":
             if amount <= account.normal_balance() - (group.block_limit or 0):
                 transaction.set_committed(user=request.user)
             else:
@@ -160,9 +176,6 @@ def transfer(
                     ),
                 )
 
-        else:
-            return HttpResponseForbidden(_("Forbidden if not group admin."))
-
         messages.success(request, _("Added transaction: %s") % transaction)
 
         return HttpResponseRedirect(
@@ -191,64 +204,85 @@ def approve_transactions(
 ):
     """Approve transactions from members and other groups"""
 
+    filter_form = TransactionFilterForm(request.GET or None, group=group)
+    pending = group.pending_transaction_set
+    if filter_form.is_valid():
+        pending = filter_form.filter(pending)
+
+    if request.method == "POST":
+        # The queue may have changed since the page was shown, so judge the
+        # transactions that were on it rather than those on it now
+        submitted_ids = set()
+        for key in request.POST:
+            match = CHANGE_TRANSACTION_FIELD_RE.match(key)
+            if match:
+                submitted_ids.add(int(match.group(1)))
+        submitted = list(
+            group.pending_transaction_set.filter(id__in=submitted_ids)
+            .select_related("group")
+            .prefetch_related("entry_set__account__group", "log_set__user")
+        )
+        if len(submitted) < len(submitted_ids):
+            messages.warning(
+                request,
+                _(
+                    "%d of the transactions are no longer pending and "
+                    "were left unchanged."
+                )
+                % (len(submitted_ids) - len(submitted)),
+            )
+
+    paginator = Paginator(
+        pending.select_related("group").prefetch_related(
+            "entry_set__account__group", "log_set__user"
+        ),
+        APPROVE_TRANSACTIONS_PER_PAGE,
+    )
+    if not paginator.count and not filter_form.is_bound:
+        messages.info(request, _("No pending transactions found."))
+        return HttpResponseRedirect(reverse("group-summary", args=[group.slug]))
+
+    page = paginator.page(max(1, min(int(page), paginator.num_pages)))
+
     transactions = []
+    to_be_committed = []
     to_be_rejected = []
 
-    for t in group.pending_transaction_set:
-        choices = t.get_valid_logtype_choices()
+    for t in submitted if request.method == "POST" else page.object_list:
+        form = ChangeTransactionForm(
+            request.POST if request.method == "POST" else None,
+            prefix="transaction%d" % t.id,
+            choices=t.get_valid_logtype_choices(),
+            label=False,
+        )
+        transactions.append((t, form))
 
-        if request.method == "POST":
-            form = ChangeTransactionForm(
-                request.POST,
-                prefix="transaction%d" % t.id,
-                choices=choices,
-                label=False,
-            )
+        if form.is_valid():
+            change_to = form.cleaned_data["change_to"]
 
-            if form.is_valid():
-                change_to = form.cleaned_data["change_to"]
-
-                if change_to == t.COMMITTED_STATE:
-                    t.set_committed(user=request.user)
-                elif change_to == t.REJECTED_STATE:
-                    to_be_rejected.append(t)
-
-                if change_to not in (t.REJECTED_STATE, t.COMMITTED_STATE):
-                    transactions.append(
-                        (
-                            t,
-                            ChangeTransactionForm(
-                                prefix="transaction%d" % t.id,
-                                choices=t.get_valid_logtype_choices(),
-                                label=False,
-                            ),
-                        )
-                    )
-            else:
-                transactions.append((t, form))
+            if change_to == t.COMMITTED_STATE:
+                to_be_committed.append(t.id)
+            elif change_to == t.REJECTED_STATE:
+                to_be_rejected.append(t)
 
-        else:
-            form = ChangeTransactionForm(
-                choices=choices, prefix="transaction%d" % t.id, label=False
+    if request.method == "POST":
+        Transaction.objects.commit_pending(to_be_committed, request.user)
+
+        if to_be_rejected:
+            form = RejectTransactionForm()
+            return render(
+                request,
+                "accounting/reject_transactions.html",
+                {
+                    "is_admin": is_admin,
+                    "group": group,
+                    "transactions": to_be_rejected,
+                    "form": form,
+                },
             )
-            transactions.append((t, form))
-
-    if to_be_rejected:
-        form = RejectTransactionForm()
-        return render(
-            request,
-            "accounting/reject_transactions.html",
-            {
-                "is_admin": is_admin,
-                "group": group,
-                "transactions": to_be_rejected,
-                "form": form,
-            },
-        )
 
-    if not transactions:
-        messages.info(request, _("No pending transactions found."))
-        return HttpResponseRedirect(reverse("group-summary", args=[group.slug]))
+        if all(f.is_valid() for t, f in transactions):
+            return HttpResponseRedirect(request.get_full_path())
 
     return render(
         request,
@@ -258,6 +292,13 @@ def approve_transactions(
             "group": group,
             "approve": True,
             "transaction_list": transactions,
+            "filter_form": filter_form,
+            "query": request.GET.urlencode(),
+            "paginator": paginator,
+            "page_obj": page,
+            "is_paginated": page.has_other_pages(),
+            "page": page.number,
+            "pages": paginator.num_pages,
         },
     )
 
@@ -310,10 +351,11 @@ def reject_transactions(
             },
         )
 
-    for transaction in to_be_rejected:
-        transaction.set_rejected(
-            user=request.user, message=request.POST["reason"]
-        )
+    Transaction.objects.reject_pending(
+        [t.id for t in to_be_rejected],
+        user=request.user,
+        message=request.POST["reason"],
+    )
 
     if transaction is not None:
         try:
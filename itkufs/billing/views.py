@@ -6,9 +6,14 @@ from django.urls import reverse
 from django.utils.translation import ugettext as _
 
 from itkufs.common.decorators import limit_to_admin
-from itkufs.accounting.models import Account, Transaction, Group
+from itkufs.common.renderers import get_renderer
+from itkufs.accounting.models import (
+    Account,
+    Group,
+    Transaction,
+    TransactionEntry,
+)
 from itkufs.billing.models import Bill
-from itkufs.billing.pdf import pdf
 from itkufs.billing.forms import (
     BillingLineFormSet,
     NewBillingLineFormSet,
@@ -109,15 +114,16 @@ def bill_create_transaction(
             for line in bill.billingline_set.all():
                 sum += line.amount
 
-            transaction = Transaction(group=group, settlement=settlement)
-            transaction.save()
-
-            transaction.entry_set.create(account=charge_to, credit=sum)
-            transaction.entry_set.create(account=pay_to, debit=sum)
-            transaction.set_pending(
+            transaction = Transaction.objects.create_with_entries(
+                group=group,
+                entries=[
+                    TransactionEntry(account=charge_to, credit=sum),
+                    TransactionEntry(account=pay_to, debit=sum),
+                ],
                 user=request.user,
                 message=_("Bill #%(id)s: %(description)s")
                 % {"id": bill.pk, "description": bill.description},
+                settlement=settlement,
             )
 
             bill.transaction = transaction
@@ -177,4 +183,4 @@ def bill_delete(request: HttpRequest, group: Group, bill: Bill, is_admin=False):
 @login_required
 @limit_to_admin
 def bill_pdf(request: HttpRequest, group: Group, bill: Bill, is_admin=False):
-    return pdf(group, bill)
+    return get_renderer("bill")(group, bill)
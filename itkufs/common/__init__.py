@@ -0,0 +1 @@
+default_app_config = "itkufs.common.apps.CommonConfig"
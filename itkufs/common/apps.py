@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class CommonConfig(AppConfig):
+    name = "itkufs.common"
+
+    def ready(self):
+        # Connect the signals that keep the group cache up to date
+        from itkufs.common import cache  # noqa: F401
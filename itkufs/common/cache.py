@@ -0,0 +1,204 @@
+"""
+Cache of groups and the users' relation to them, used for authorization.
+
+Every request to a group page needs the group, its admins and which account
+each user owns. These change rarely, so they are kept in a per-process LRU
+cache keyed by group slug. Changes to groups, accounts and admins invalidate
+the cache through signals.
+
+If UFS_GROUP_CACHE_ALIAS names a cache from CACHES, entries are also shared
+through it, and a version stored there lets every process see invalidations
+made by the others. Without it, other processes never hear of the
+invalidations, so a removed admin would keep access there until the entry
+expires. Entries are then kept at most GroupCache.LOCAL_TIMEOUT seconds,
+whatever UFS_GROUP_CACHE_TIMEOUT says.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction as db_transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from itkufs.accounting.models import Account, Group
+
+
+class GroupCacheEntry:
+    def __init__(self, field_names, values, admin_ids, account_ids, version):
+        self.field_names = field_names
+        self.values = values
+        self.admin_ids = admin_ids
+        self.account_ids = account_ids
+        self.version = version
+        self.loaded = time.monotonic()
+
+    def get_group(self) -> Group:
+        """Returns a new group instance, so that changes made by one request
+        never leak into the cache"""
+        return Group.from_db("default", self.field_names, self.values)
+
+    def is_admin(self, user) -> bool:
+        return user.id in self.admin_ids
+
+    def get_account_id(self, user):
+        """Returns the id of the user's account in the group, if any"""
+        return self.account_ids.get(user.id)
+
+
+class GroupCache:
+    # Seconds an entry is trusted without a shared cache to invalidate it
+    LOCAL_TIMEOUT = 5
+
+    def __init__(self, size=256, timeout=300, alias=None):
+        self.size = size
+        self.shared = caches[alias] if alias else None
+        if self.shared is None:
+            timeout = min(timeout, self.LOCAL_TIMEOUT)
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, slug: str) -> GroupCacheEntry:
+        """Returns the cache entry for the group, loading it if needed.
+        Raises Group.DoesNotExist for unknown groups."""
+
+        version = self._get_version(slug)
+
+        with self.lock:
+            entry = self.entries.get(slug)
+            if entry is not None and self._is_valid(entry, version):
+                self.entries.move_to_end(slug)
+                return entry
+
+        entry = None
+        if self.shared is not None:
+            entry = self.shared.get(self._entry_key(slug))
+            if entry is not None and entry.version != version:
+                entry = None
+        if entry is None:
+            entry = self._load(slug, version)
+            if self.shared is not None:
+                self.shared.set(self._entry_key(slug), entry, self.timeout)
+
+        entry.loaded = time.monotonic()
+        with self.lock:
+            self.entries[slug] = entry
+            self.entries.move_to_end(slug)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, slug: str):
+        with self.lock:
+            self.entries.pop(slug, None)
+        if self.shared is not None:
+            self.shared.set(self._version_key(slug), uuid.uuid4().hex, None)
+            self.shared.delete(self._entry_key(slug))
+
+    def invalidate_on_commit(self, slug: str):
+        # Invalidate now for this process, and again after commit so that
+        # nobody keeps data read before the change was committed
+        self.invalidate(slug)
+        db_transaction.on_commit(lambda: self.invalidate(slug))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _is_valid(self, entry: GroupCacheEntry, version) -> bool:
+        if entry.version != version:
+            return False
+        return time.monotonic() - entry.loaded < self.timeout
+
+    def _get_version(self, slug: str):
+        if self.shared is None:
+            return None
+        version = self.shared.get(self._version_key(slug))
+        if version is None:
+            self.shared.add(self._version_key(slug), uuid.uuid4().hex, None)
+            version = self.shared.get(self._version_key(slug))
+        return version
+
+    def _load(self, slug: str, version) -> GroupCacheEntry:
+        field_names = [f.attname for f in Group._meta.concrete_fields]
+        values = Group.objects.values_list(*field_names).get(slug=slug)
+        group_id = values[field_names.index("id")]
+
+        admin_ids = frozenset(
+            Group.admins.through.objects.filter(group_id=group_id).values_list(
+                "user_id", flat=True
+            )
+        )
+        account_ids = dict(
+            Account.objects.filter(group_id=group_id, owner__isnull=False)
+            .order_by()
+            .values_list("owner_id", "id")
+        )
+        return GroupCacheEntry(
+            field_names, values, admin_ids, account_ids, version
+        )
+
+    def _entry_key(self, slug: str):
+        return f"ufs-group-cache:{slug}"
+
+    def _version_key(self, slug: str):
+        return f"ufs-group-cache-version:{slug}"
+
+
+group_cache = GroupCache(
+    size=getattr(settings, "UFS_GROUP_CACHE_SIZE", 256),
+    timeout=getattr(settings, "UFS_GROUP_CACHE_TIMEOUT", 300),
+    alias=getattr(settings, "UFS_GROUP_CACHE_ALIAS", None),
+)
+
+
+@receiver(pre_save, sender=Group)
+def invalidate_renamed_group(sender, instance, raw=False, **kwargs):
+    if instance.pk is None or raw:
+        return
+    slug = (
+        Group.objects.filter(pk=instance.pk)
+        .values_list("slug", flat=True)
+        .first()
+    )
+    if slug is not None and slug != instance.slug:
+        group_cache.invalidate_on_commit(slug)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    group_cache.invalidate_on_commit(instance.slug)
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def invalidate_account_group(sender, instance, **kwargs):
+    group_cache.invalidate_on_commit(instance.group.slug)
+
+
+@receiver(m2m_changed, sender=Group.admins.through)
+def invalidate_group_admins(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        group_cache.invalidate_on_commit(instance.slug)
+    else:
+        # The admins were changed from the user side
+        groups = Group.objects.all()
+        if pk_set is not None:
+            groups = groups.filter(pk__in=pk_set)
+        for slug in groups.values_list("slug", flat=True):
+            group_cache.invalidate_on_commit(slug)
@@ -1,5 +1,8 @@
+import hashlib
+
 from django.utils.translation import ugettext as _
 from django.http import HttpResponseForbidden
+from django.views.decorators.http import condition
 
 from itkufs.accounting.models import Group
 
@@ -13,9 +16,13 @@ def limit_to_group(function):
 
         # Check if non-admin are members of the group
         assert "group" in kwargs and isinstance(kwargs["group"], Group)
-        is_member = bool(
-            kwargs["group"].account_set.filter(owner=request.user).count()
-        )
+        if hasattr(request, "group_account_id"):
+            # Already looked up by UfsMiddleware
+            is_member = request.group_account_id is not None
+        else:
+            is_member = (
+                kwargs["group"].account_set.filter(owner=request.user).exists()
+            )
         if is_member:
             return function(request, *args, **kwargs)
 
@@ -57,3 +64,30 @@ def limit_to_admin(function):
         return HttpResponseForbidden(_("Forbidden if not group admin."))
 
     return wrapped
+
+
+def _ledger_version(request, group: Group):
+    # Both the ETag and Last-Modified are derived from this, so only ask
+    # the database once per request
+    if not hasattr(request, "_ledger_version"):
+        request._ledger_version = group.ledger_version()
+    return request._ledger_version
+
+
+def _ledger_etag(request, *args, **kwargs):
+    last_modified, version = _ledger_version(request, kwargs["group"])
+    version = f"{kwargs['group'].id}:{version}"
+    return hashlib.md5(version.encode("utf-8")).hexdigest()
+
+
+def _ledger_last_modified(request, *args, **kwargs):
+    return _ledger_version(request, kwargs["group"])[0]
+
+
+# Gives views of balances an ETag and Last-Modified that change with the
+# group's ledger version, which is bumped with every change to the group,
+# its accounts and its transactions. Clients get a 304 from a single row
+# lookup while nothing happened.
+ledger_condition = condition(
+    etag_func=_ledger_etag, last_modified_func=_ledger_last_modified
+)
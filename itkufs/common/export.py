@@ -0,0 +1,165 @@
+from django.db import transaction as db_transaction
+from django.db.models import Max, Q
+
+# This is needed for type hints in Python versions older than 3.9
+from typing import List as ListType, Optional, Tuple
+
+from itkufs.accounting.models import (
+    Group,
+    Transaction,
+    TransactionEntry,
+    TransactionLog,
+)
+
+EXPORT_TRANSACTIONS_HEADER = [
+    "Entry ID",
+    "Account ID",
+    "Transaction ID",
+    "Date",
+    "Debit",
+    "Credit",
+    "Account name",
+    "Short name",
+    "Owner",
+    "Is group account",
+]
+EXPORT_TRANSACTIONS_FIELDS = [
+    "id",
+    "account_id",
+    "transaction_id",
+    "transaction__date",
+    "debit",
+    "credit",
+    "account__name",
+    "account__short_name",
+    "account__slug",
+    "account__group_account",
+]
+
+INCREMENTAL_EXPORT_HEADER = EXPORT_TRANSACTIONS_HEADER + ["Commit sequence"]
+INCREMENTAL_EXPORT_LIMIT = 10000
+
+
+def export_rows(group: Group, from_date, to_date):
+    """Returns the group's committed entries between the dates, as tuples
+    of EXPORT_TRANSACTIONS_FIELDS. The rows are fetched through a
+    server-side cursor where the database supports it, so memory use is
+    independent of their number."""
+
+    return (
+        TransactionEntry.objects.filter(
+            transaction__group__id=group.id,
+            transaction__date__gte=from_date,
+            transaction__date__lte=to_date,
+            transaction__state=Transaction.COMMITTED_STATE,
+        )
+        .order_by("transaction__date", "id")
+        .values_list(*EXPORT_TRANSACTIONS_FIELDS)
+        .iterator()
+    )
+
+
+class InvalidResumeToken(ValueError):
+    pass
+
+
+def parse_resume_token(token: Optional[str]) -> Tuple[int, int]:
+    """Returns the (commit sequence, entry id) position of a resume token.
+    An empty token is the start of the ledger."""
+
+    if not token:
+        return (0, 0)
+    try:
+        sequence, entry_id = token.split("-")
+        return (int(sequence), int(entry_id))
+    except ValueError:
+        raise InvalidResumeToken(f'Invalid resume token "{token}"')
+
+
+def format_resume_token(sequence: int, entry_id: int) -> str:
+    return f"{sequence}-{entry_id}"
+
+
+def number_commits(group: Group):
+    """Gives the group's commits that have become visible since the last
+    export the next export sequence numbers.
+
+    Log ids are handed out when the row is inserted, so a database
+    transaction that commits late may make a lower id visible after a
+    higher one was exported. The export only sees committed rows, so such
+    a commit is numbered after everything already exported.
+    """
+
+    with db_transaction.atomic():
+        # Exports of the same group take turns numbering
+        list(
+            Group.objects.select_for_update()
+            .filter(pk=group.pk)
+            .values_list("id", flat=True)
+        )
+        logs = TransactionLog.objects.filter(
+            transaction__group=group, type=Transaction.COMMITTED_STATE
+        )
+        new_ids = list(
+            logs.filter(export_sequence__isnull=True)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        if not new_ids:
+            return
+
+        last = logs.aggregate(last=Max("export_sequence"))["last"] or 0
+        for sequence, id in enumerate(new_ids, last + 1):
+            TransactionLog.objects.filter(id=id).update(
+                export_sequence=sequence
+            )
+
+
+def committed_entries_since(
+    group: Group,
+    token: Optional[str] = None,
+    limit: int = INCREMENTAL_EXPORT_LIMIT,
+) -> Tuple[ListType[tuple], str, bool]:
+    """Returns entries committed after the position in the resume token.
+
+    The commit sequence of an entry is the export sequence of the log entry
+    that committed its transaction, so entries are ordered by when their
+    commit became visible and then by id. A single keyset query fetches at
+    most limit rows, so a sync costs as much as the number of new rows.
+    Returns the rows, the token to resume from and whether there are more
+    rows.
+    """
+
+    sequence, entry_id = parse_resume_token(token)
+    number_commits(group)
+
+    # All conditions on the log must be in one filter() call to use a
+    # single join.
+    rows = list(
+        TransactionEntry.objects.filter(
+            Q(
+                transaction__group=group,
+                transaction__log_set__type=Transaction.COMMITTED_STATE,
+            )
+            & (
+                Q(transaction__log_set__export_sequence__gt=sequence)
+                | Q(
+                    transaction__log_set__export_sequence=sequence,
+                    id__gt=entry_id,
+                )
+            )
+        )
+        .order_by("transaction__log_set__export_sequence", "id")
+        .values_list(
+            *EXPORT_TRANSACTIONS_FIELDS,
+            "transaction__log_set__export_sequence",
+        )[: limit + 1]
+    )
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        token = format_resume_token(rows[-1][-1], rows[-1][0])
+    else:
+        token = format_resume_token(sequence, entry_id)
+    return rows, token, has_more
@@ -203,3 +203,7 @@ class ExportTransactionsForm(forms.Form):
         required=True,
         error_messages={"required": _("Please enter a date")},
     )
+    compress = forms.BooleanField(
+        label=_("Compress with gzip"),
+        required=False,
+    )
@@ -8,6 +8,8 @@ from django.core.management.color import color_style
 from itkufs.accounting.models import (
     Group,
     Account,
+    AccountBalance,
+    AccountDailyTotal,
     Transaction,
     TransactionEntry,
 )
@@ -17,7 +19,6 @@ from itkufs.common.management.factories import (
     UserAccountFactory,
     GroupAccountFactory,
     TransactionFactory,
-    TransactionEntryFactory,
 )
 
 
@@ -180,6 +181,7 @@ class Command(BaseCommand):
         """
         total = 0
         users = random.sample(population=user_accounts, k=count - 1)
+        entries: List["TransactionEntry"] = []
 
         # Create entries for user accounts
         for user_account in users:
@@ -187,24 +189,30 @@ class Command(BaseCommand):
             debit = amount if not debit_group else 0
             credit = amount if debit_group else 0
 
-            TransactionEntryFactory(
-                transaction=transaction,
-                account=user_account,
-                debit=debit,
-                credit=credit,
+            entries.append(
+                TransactionEntry(
+                    transaction=transaction,
+                    account=user_account,
+                    debit=debit,
+                    credit=credit,
+                )
             )
             total += amount
 
         # Create the matching entry for the group account
         debit = total if debit_group else 0
         credit = total if not debit_group else 0
-        TransactionEntryFactory(
-            transaction=transaction,
-            account=group_account,
-            debit=debit,
-            credit=credit,
+        entries.append(
+            TransactionEntry(
+                transaction=transaction,
+                account=group_account,
+                debit=debit,
+                credit=credit,
+            )
         )
 
+        TransactionEntry.objects.bulk_create(entries)
+
     def handle(self, *args, **options):
         # Ratios for the number of objects to create
         GROUP_COUNT = options["groups"]
@@ -270,6 +278,11 @@ class Command(BaseCommand):
                 ENTRIES_PER_TRANSACTION,
             )
 
+        # States were set directly, so the stored balances must be rebuilt
+        self.log.info("Calculating account balances...")
+        AccountBalance.objects.refresh()
+        AccountDailyTotal.objects.refresh()
+
         group_count = Group.objects.count()
         group_account_count = Account.objects.filter(group_account=True).count()
         user_count = Account.objects.filter(group_account=False).count()
@@ -0,0 +1,124 @@
+"""
+Usage: ./manage.py exporttransactions -g GROUP [--after TOKEN]
+           [--token-file FILE] [-o OUTPUT]
+
+Writes the entries committed since the given resume token to OUTPUT, or
+standard output, as CSV. Without a token the whole ledger is exported.
+
+With --token-file, the token is read from FILE, and the token to resume
+from is written back once all rows have been written. Running the command
+nightly with the same token file only exports the new entries.
+"""
+
+import csv
+import logging
+import os
+import sys
+
+from django.core.management.base import BaseCommand
+
+from itkufs.accounting.models import Group
+from itkufs.common.export import (
+    INCREMENTAL_EXPORT_HEADER,
+    INCREMENTAL_EXPORT_LIMIT,
+    InvalidResumeToken,
+    committed_entries_since,
+)
+
+CONSOLE_LOG_FORMAT = "%(levelname)-8s %(message)s"
+
+
+class Command(BaseCommand):
+    help = "Export entries committed since the last export"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-g", "--group", dest="group_slug", help="Group to export"
+        )
+        parser.add_argument(
+            "--after", dest="after", help="Resume token to export from"
+        )
+        parser.add_argument(
+            "--token-file",
+            dest="token_file",
+            help="File to read the resume token from and save it to",
+        )
+        parser.add_argument(
+            "-o", "--output", dest="output", help="File to write CSV to"
+        )
+        parser.add_argument(
+            "--batch-size",
+            dest="batch_size",
+            type=int,
+            default=INCREMENTAL_EXPORT_LIMIT,
+            help="Number of rows to fetch per query",
+        )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.logger = self._setup_logging()
+
+    def _setup_logging(self):
+        logging.basicConfig(format=CONSOLE_LOG_FORMAT, level=logging.INFO)
+        return logging.getLogger("exporttransactions")
+
+    def handle(self, *args, **options):
+        if not options["group_slug"]:
+            sys.exit(__doc__)
+
+        group = self._get_group(options["group_slug"])
+        token = options["after"]
+        if token is None and options["token_file"]:
+            token = self._read_token(options["token_file"])
+
+        if options["output"]:
+            with open(options["output"], "w", newline="") as output:
+                token, count = self._export(
+                    group, token, options["batch_size"], output
+                )
+        else:
+            token, count = self._export(
+                group, token, options["batch_size"], self.stdout
+            )
+
+        if options["token_file"]:
+            self._write_token(options["token_file"], token)
+        self.logger.info("Exported %d entries, resume token %s", count, token)
+
+    def _export(self, group: Group, token, batch_size: int, output):
+        writer = csv.writer(output)
+        writer.writerow(INCREMENTAL_EXPORT_HEADER)
+
+        count = 0
+        has_more = True
+        while has_more:
+            try:
+                rows, token, has_more = committed_entries_since(
+                    group, token, batch_size
+                )
+            except InvalidResumeToken as e:
+                self.logger.error("%s", e)
+                sys.exit(1)
+            writer.writerows(rows)
+            count += len(rows)
+        return token, count
+
+    def _read_token(self, filename: str):
+        try:
+            with open(filename) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _write_token(self, filename: str, token: str):
+        # Replace the file in one step so a crash never leaves half a token
+        with open(filename + ".tmp", "w") as f:
+            f.write(token + "\n")
+        os.replace(filename + ".tmp", filename)
+
+    def _get_group(self, group_slug: str):
+        try:
+            return Group.objects.get(slug=group_slug)
+        except Group.DoesNotExist:
+            self.logger.error('Group "%s" does not exist', group_slug)
+            sys.exit(1)
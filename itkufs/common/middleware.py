@@ -3,6 +3,7 @@ from django.utils.deprecation import MiddlewareMixin
 
 from itkufs.accounting.models import Group, Account, Settlement, Transaction
 from itkufs.billing.models import Bill
+from itkufs.common.cache import group_cache
 from itkufs.reports.models import List
 
 
@@ -12,24 +13,28 @@ class UfsMiddleware(MiddlewareMixin):
         adds is_admin flag"""
 
         if "group" in view_kwargs:
-            # Replace group slug with group object
+            # Replace group slug with group object. The admin flag and the
+            # user's own account in the group come from the group cache,
+            # and are stored on the request for the decorators to reuse.
             try:
-                view_kwargs["group"] = Group.objects.get(
-                    slug=view_kwargs["group"]
-                )
+                entry = group_cache.get(view_kwargs["group"])
             except Group.DoesNotExist:
                 raise Http404
+            group = entry.get_group()
+            view_kwargs["group"] = group
+            request.is_group_admin = entry.is_admin(request.user)
+            request.group_account_id = entry.get_account_id(request.user)
 
             if "account" in view_kwargs:
                 # Replace account slug with account object
                 try:
-                    view_kwargs["account"] = view_kwargs[
-                        "group"
-                    ].account_set.get(slug=view_kwargs["account"])
+                    view_kwargs["account"] = group.account_set.get(
+                        slug=view_kwargs["account"]
+                    )
                 except Account.DoesNotExist:
                     raise Http404
                 # Add account owner flag
-                if view_kwargs["account"].owner == request.user:
+                if view_kwargs["account"].id == request.group_account_id:
                     view_kwargs["is_owner"] = True
 
             if "settlement" in view_kwargs:
@@ -71,7 +76,4 @@ class UfsMiddleware(MiddlewareMixin):
                     raise Http404
 
             # Add group admin flag
-            if view_kwargs["group"].admins.filter(id=request.user.id).count():
-                view_kwargs["is_admin"] = True
-            else:
-                view_kwargs["is_admin"] = False
+            view_kwargs["is_admin"] = request.is_group_admin
@@ -0,0 +1,129 @@
+"""
+Keyset pagination of transactions.
+
+Pages are ordered by (last_modified, id), newest first, and a page is found
+from the cursor of the row next to it instead of an offset. Every page
+costs the same, however deep it is, and rows added while paging do not
+shift the pages.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+# This is needed for type hints in Python versions older than 3.9
+from typing import Optional, Tuple
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def format_cursor(last_modified: datetime.datetime, id: int) -> str:
+    if last_modified.tzinfo is not None:
+        epoch = EPOCH.replace(tzinfo=datetime.timezone.utc)
+    else:
+        epoch = EPOCH
+    microseconds = (last_modified - epoch) // datetime.timedelta(microseconds=1)
+    return f"{microseconds}-{id}"
+
+
+def parse_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    """Returns the (last modified, id) position of a cursor"""
+
+    try:
+        microseconds, id = cursor.split("-")
+        last_modified = EPOCH + datetime.timedelta(
+            microseconds=int(microseconds)
+        )
+        id = int(id)
+    except (ValueError, OverflowError):
+        raise InvalidCursor(f'Invalid cursor "{cursor}"')
+
+    if settings.USE_TZ:
+        last_modified = last_modified.replace(tzinfo=datetime.timezone.utc)
+    return last_modified, id
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    def next_cursor(self) -> Optional[str]:
+        """Returns the cursor of the last row, to get the older rows"""
+        if not self.has_next_page:
+            return None
+        last = self.object_list[-1]
+        return format_cursor(last.last_modified, last.id)
+
+    def previous_cursor(self) -> Optional[str]:
+        """Returns the cursor of the first row, to get the newer rows"""
+        if not self.has_previous_page:
+            return None
+        first = self.object_list[0]
+        return format_cursor(first.last_modified, first.id)
+
+
+def keyset_page(queryset, per_page: int, after=None, before=None):
+    """Returns the page of rows older than the cursor after, or newer than
+    the cursor before, or the newest rows if neither is given. Raises
+    InvalidCursor for malformed cursors."""
+
+    if before:
+        last_modified, id = parse_cursor(before)
+        rows = queryset.filter(
+            Q(last_modified__gt=last_modified)
+            | Q(last_modified=last_modified, id__gt=id)
+        ).order_by("last_modified", "id")
+        rows, has_more = _fetch(rows, per_page)
+        if not has_more:
+            # Going back to the start gives a full first page
+            return keyset_page(queryset, per_page)
+        rows.reverse()
+        return KeysetPage(rows, has_next=True, has_previous=True)
+
+    if after:
+        last_modified, id = parse_cursor(after)
+        rows, has_more = _fetch(
+            queryset.filter(
+                Q(last_modified__lt=last_modified)
+                | Q(last_modified=last_modified, id__lt=id)
+            ).order_by("-last_modified", "-id"),
+            per_page,
+        )
+        if not rows:
+            # Past the oldest row, start over from the newest
+            return keyset_page(queryset, per_page)
+        return KeysetPage(rows, has_next=has_more, has_previous=True)
+
+    rows, has_more = _fetch(
+        queryset.order_by("-last_modified", "-id"), per_page
+    )
+    return KeysetPage(rows, has_next=has_more, has_previous=False)
+
+
+def _fetch(queryset, per_page: int):
+    # Fetch one row more than needed to know if there is another page
+    limit = per_page + 1
+    rows = list(queryset[:limit])
+    return rows[:per_page], len(rows) > per_page
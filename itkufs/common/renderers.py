@@ -0,0 +1,39 @@
+"""
+Registry of document renderers.
+
+The PDF renderers import ReportLab, which is slow to import and large in
+memory. Views and caches look renderers up by name here instead of
+importing them, so ReportLab is only loaded by processes that actually
+render a document, the first time they do.
+"""
+
+import threading
+
+from django.utils.module_loading import import_string
+
+RENDERERS = {
+    "list": "itkufs.reports.pdf.pdf",
+    "bill": "itkufs.billing.pdf.pdf",
+}
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def register_renderer(name: str, path: str):
+    """Registers the renderer at the given dotted path under name"""
+
+    with _lock:
+        RENDERERS[name] = path
+        _loaded.pop(name, None)
+
+
+def get_renderer(name: str):
+    """Returns the renderer registered under name, importing it if needed.
+    Raises KeyError for unknown renderers."""
+
+    renderer = _loaded.get(name)
+    if renderer is None:
+        with _lock:
+            renderer = _loaded[name] = import_string(RENDERERS[name])
+    return renderer
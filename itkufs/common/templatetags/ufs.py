@@ -72,7 +72,10 @@ class HideNode(Node):
 
     def render(self, context):
         transaction = self.transaction.resolve(context)
-        entry_list = transaction.entry_set.select_related("account__owner")
+        if "entry_set" in getattr(transaction, "_prefetched_objects_cache", {}):
+            entry_list = transaction.entry_set.all()
+        else:
+            entry_list = transaction.entry_set.select_related("account__owner")
 
         context[self.entry_list] = entry_list
         return ""
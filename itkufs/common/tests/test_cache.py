@@ -0,0 +1,112 @@
+import unittest
+
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+import pytest
+
+from itkufs.accounting.models import Account, Group, User
+from itkufs.common.cache import GroupCache, group_cache
+
+
+class GroupCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.admin = User(username="alice")
+        self.admin.save()
+        self.member = User(username="bob")
+        self.member.save()
+
+        self.group = Group(name="Group 1", slug="group1")
+        self.group.save()
+        self.group.admins.add(self.admin)
+
+        self.account = Account(
+            name="Bob", slug="bob", group=self.group, owner=self.member
+        )
+        self.account.save()
+
+    def tearDown(self):
+        self.group.delete()
+        self.admin.delete()
+        self.member.delete()
+        caches["default"].clear()
+
+    def testGet(self):
+        entry = group_cache.get("group1")
+        assert entry.get_group() == self.group
+        assert entry.get_group() is not entry.get_group()
+        assert entry.is_admin(self.admin) is True
+        assert entry.is_admin(self.member) is False
+        assert entry.get_account_id(self.member) == self.account.id
+        assert entry.get_account_id(self.admin) is None
+
+        with CaptureQueriesContext(connection) as context:
+            group_cache.get("group1")
+        assert len(context.captured_queries) == 0
+
+    def testMissingGroup(self):
+        with pytest.raises(Group.DoesNotExist):
+            group_cache.get("missing")
+
+    def testAdminsChanged(self):
+        assert group_cache.get("group1").is_admin(self.member) is False
+        self.group.admins.add(self.member)
+        assert group_cache.get("group1").is_admin(self.member) is True
+        self.member.group_set.remove(self.group)
+        assert group_cache.get("group1").is_admin(self.member) is False
+
+    def testAccountChanged(self):
+        assert group_cache.get("group1").get_account_id(self.admin) is None
+        self.account.owner = self.admin
+        self.account.save()
+        assert group_cache.get("group1").get_account_id(self.admin) == (
+            self.account.id
+        )
+
+    def testGroupRenamed(self):
+        group_cache.get("group1")
+        self.group.slug = "renamed"
+        self.group.save()
+        with pytest.raises(Group.DoesNotExist):
+            group_cache.get("group1")
+        assert group_cache.get("renamed").get_group().slug == "renamed"
+
+    def testLeastRecentlyUsedIsEvicted(self):
+        other = Group(name="Group 2", slug="group2")
+        other.save()
+
+        cache = GroupCache(size=1)
+        cache.get("group1")
+        cache.get("group2")
+        assert list(cache.entries) == ["group2"]
+
+        other.delete()
+
+    def testSharedInvalidation(self):
+        """Checks that an invalidation in one process is seen by another
+        through the shared cache"""
+
+        first = GroupCache(alias="default")
+        second = GroupCache(alias="default")
+        assert second.get("group1").is_admin(self.member) is False
+
+        Group.admins.through.objects.create(group=self.group, user=self.member)
+        first.invalidate("group1")
+        assert second.get("group1").is_admin(self.member) is True
+
+    def testLocalTimeout(self):
+        """Checks that without a shared cache, changes made by other
+        processes are seen after a few seconds"""
+
+        cache = GroupCache(timeout=300)
+        assert cache.timeout == GroupCache.LOCAL_TIMEOUT
+        assert GroupCache(timeout=300, alias="default").timeout == 300
+
+        assert cache.get("group1").is_admin(self.admin) is True
+        # Removed without signals, as if by another process
+        Group.admins.through.objects.filter(group=self.group).delete()
+        assert cache.get("group1").is_admin(self.admin) is True
+
+        cache.entries["group1"].loaded -= GroupCache.LOCAL_TIMEOUT
+        assert cache.get("group1").is_admin(self.admin) is False
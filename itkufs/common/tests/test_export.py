@@ -0,0 +1,116 @@
+import unittest
+
+import pytest
+
+from itkufs.accounting.models import (
+    Account,
+    Group,
+    Transaction,
+    TransactionEntry,
+    TransactionLog,
+    User,
+)
+from itkufs.common.export import (
+    InvalidResumeToken,
+    committed_entries_since,
+    parse_resume_token,
+)
+
+
+class IncrementalExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.user = User(username="alice")
+        self.user.save()
+
+        self.group = Group(name="Group 1", slug="group1")
+        self.group.save()
+
+        self.accounts = [
+            Account(name="Account 1", slug="account1", group=self.group),
+            Account(name="Account 2", slug="account2", group=self.group),
+        ]
+        for account in self.accounts:
+            account.save()
+
+    def tearDown(self):
+        self.group.delete()
+        self.user.delete()
+
+    def createTransaction(self, amount, state=Transaction.COMMITTED_STATE):
+        return Transaction.objects.create_with_entries(
+            group=self.group,
+            entries=[
+                TransactionEntry(account=self.accounts[0], debit=amount),
+                TransactionEntry(account=self.accounts[1], credit=amount),
+            ],
+            user=self.user,
+            state=state,
+        )
+
+    def testParseResumeToken(self):
+        assert parse_resume_token(None) == (0, 0)
+        assert parse_resume_token("") == (0, 0)
+        assert parse_resume_token("12-34") == (12, 34)
+        with pytest.raises(InvalidResumeToken):
+            parse_resume_token("12")
+        with pytest.raises(InvalidResumeToken):
+            parse_resume_token("a-b")
+
+    def testCommitOrder(self):
+        """Checks that entries are exported in the order they were
+        committed, not created"""
+
+        first = self.createTransaction(10, state=Transaction.PENDING_STATE)
+        second = self.createTransaction(20)
+        self.createTransaction(30, state=Transaction.PENDING_STATE)
+
+        rows, token, has_more = committed_entries_since(self.group)
+        assert [r[2] for r in rows] == [second.id, second.id]
+        assert has_more is False
+
+        first.set_committed(user=self.user)
+        rows, token, has_more = committed_entries_since(self.group, token)
+        assert [r[2] for r in rows] == [first.id, first.id]
+
+        rows, token, has_more = committed_entries_since(self.group, token)
+        assert rows == []
+
+    def testResume(self):
+        """Checks that batches can be resumed in the middle of a
+        transaction"""
+
+        for amount in (10, 20, 30):
+            self.createTransaction(amount)
+
+        all_rows, token, has_more = committed_entries_since(self.group)
+        assert len(all_rows) == 6
+
+        rows = []
+        token = None
+        has_more = True
+        while has_more:
+            batch, token, has_more = committed_entries_since(
+                self.group, token, limit=4
+            )
+            rows += batch
+        assert rows == all_rows
+
+    def testLateCommit(self):
+        """Checks that a commit that becomes visible after a later one was
+        exported is still exported, although its log id is lower"""
+
+        late = self.createTransaction(10)
+        log = late.log_set.get(type=Transaction.COMMITTED_STATE)
+        log.delete()
+        self.createTransaction(20)
+
+        rows, token, has_more = committed_entries_since(self.group)
+        assert len(rows) == 2
+        assert late.id not in [r[2] for r in rows]
+
+        # The commit of the late transaction shows up with its old id
+        log.export_sequence = None
+        TransactionLog.objects.bulk_create([log])
+
+        rows, token, has_more = committed_entries_since(self.group, token)
+        assert [r[2] for r in rows] == [late.id, late.id]
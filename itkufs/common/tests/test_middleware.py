@@ -0,0 +1,94 @@
+import unittest
+
+from django.db import connection
+from django.http import Http404
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+import pytest
+
+from itkufs.accounting.models import Account, Group, User
+from itkufs.common.decorators import limit_to_group
+from itkufs.common.middleware import UfsMiddleware
+
+
+class UfsMiddlewareTestCase(unittest.TestCase):
+    def setUp(self):
+        self.admin = User(username="alice")
+        self.admin.save()
+        self.member = User(username="bob")
+        self.member.save()
+        self.other = User(username="carol")
+        self.other.save()
+
+        self.group = Group(name="Group 1", slug="group1")
+        self.group.save()
+        self.group.admins.add(self.admin)
+
+        self.account = Account(
+            name="Bob", slug="bob", group=self.group, owner=self.member
+        )
+        self.account.save()
+
+        self.middleware = UfsMiddleware()
+
+    def tearDown(self):
+        self.group.delete()
+        self.admin.delete()
+        self.member.delete()
+        self.other.delete()
+
+    def process(self, user, **view_kwargs):
+        request = RequestFactory().get("/")
+        request.user = user
+        self.middleware.process_view(request, None, (), view_kwargs)
+        return request, view_kwargs
+
+    def testGroup(self):
+        """Checks that the group and the user's relation to it are resolved
+        without queries once cached"""
+
+        request, kwargs = self.process(self.admin, group="group1")
+        with CaptureQueriesContext(connection) as context:
+            request, kwargs = self.process(self.admin, group="group1")
+        assert len(context.captured_queries) == 0
+        assert kwargs["group"] == self.group
+        assert kwargs["is_admin"] is True
+        assert request.group_account_id is None
+
+        request, kwargs = self.process(self.member, group="group1")
+        assert kwargs["is_admin"] is False
+        assert request.group_account_id == self.account.id
+
+    def testAccount(self):
+        self.process(self.member, group="group1")
+        with CaptureQueriesContext(connection) as context:
+            request, kwargs = self.process(
+                self.member, group="group1", account="bob"
+            )
+        assert len(context.captured_queries) == 1
+        assert kwargs["account"] == self.account
+        assert kwargs["is_owner"] is True
+
+        request, kwargs = self.process(
+            self.admin, group="group1", account="bob"
+        )
+        assert "is_owner" not in kwargs
+
+    def testMissingGroup(self):
+        with pytest.raises(Http404):
+            self.process(self.admin, group="missing")
+
+    def testLimitToGroupReusesMembership(self):
+        """Checks that limit_to_group does not query the database again"""
+
+        view = limit_to_group(lambda request, **kwargs: "ok")
+
+        self.process(self.member, group="group1")
+        with CaptureQueriesContext(connection) as context:
+            request, kwargs = self.process(self.member, group="group1")
+            assert view(request, **kwargs) == "ok"
+        assert len(context.captured_queries) == 0
+
+        request, kwargs = self.process(self.other, group="group1")
+        assert view(request, **kwargs).status_code == 403
@@ -0,0 +1,22 @@
+import datetime
+import unittest
+
+import pytest
+
+from itkufs.common.pagination import (
+    InvalidCursor,
+    format_cursor,
+    parse_cursor,
+)
+
+
+class CursorTestCase(unittest.TestCase):
+    def testRoundTrip(self):
+        last_modified = datetime.datetime(2020, 5, 17, 12, 30, 15, 123456)
+        cursor = format_cursor(last_modified, 42)
+        assert parse_cursor(cursor) == (last_modified, 42)
+
+    def testInvalid(self):
+        for cursor in ["", "1", "a-1", "1-a", "1-2-3", "9" * 30 + "-1"]:
+            with pytest.raises(InvalidCursor):
+                parse_cursor(cursor)
@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import pytest
+
+from itkufs.common.renderers import (
+    RENDERERS,
+    get_renderer,
+    register_renderer,
+)
+
+
+class RenderersTestCase(unittest.TestCase):
+    def testGetRenderer(self):
+        from itkufs.reports.pdf import pdf
+
+        assert get_renderer("list") is pdf
+
+    def testRegisterRenderer(self):
+        register_renderer("test", "itkufs.common.utils.csv_stream")
+        self.addCleanup(RENDERERS.pop, "test")
+        from itkufs.common.utils import csv_stream
+
+        assert get_renderer("test") is csv_stream
+
+        with pytest.raises(KeyError):
+            get_renderer("unknown")
+
+    def testStartupDoesNotImportReportLab(self):
+        """Checks that loading the URLconf leaves the PDF renderers alone"""
+
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE="itkufs.settings")
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, django; django.setup(); import itkufs.urls; "
+                "assert 'reportlab' not in sys.modules, 'reportlab imported'",
+            ],
+            env=env,
+            check=True,
+        )
@@ -1,6 +1,11 @@
+import gzip
 import unittest
 
-from itkufs.common.utils import verify_account_number
+from itkufs.common.utils import (
+    CSV_BLOCK_SIZE,
+    csv_stream,
+    verify_account_number,
+)
 
 
 class VerifyAccountNumberTestCase(unittest.TestCase):
@@ -37,3 +42,30 @@ class VerifyAccountNumberTestCase(unittest.TestCase):
     def testInvalidStringInAccount(self):
         assert not verify_account_number("1234a5678903")
         assert not verify_account_number("1234%5678903")
+
+
+class CSVStreamTestCase(unittest.TestCase):
+    def setUp(self):
+        self.rows = [("Entry ID", "Name")] + [
+            (i, "Account %d" % i) for i in range(10000)
+        ]
+
+    def testContent(self):
+        content = b"".join(csv_stream(self.rows)).decode("utf-8")
+        lines = content.splitlines()
+        assert len(lines) == 10001
+        assert lines[0] == "Entry ID,Name"
+        assert lines[-1] == "9999,Account 9999"
+
+    def testBlocks(self):
+        blocks = list(csv_stream(self.rows))
+        assert len(blocks) > 1
+        assert all(len(b) < 2 * CSV_BLOCK_SIZE for b in blocks)
+
+    def testCompressed(self):
+        content = b"".join(csv_stream(self.rows, compress=True))
+        assert gzip.decompress(content) == b"".join(csv_stream(self.rows))
+
+    def testEmpty(self):
+        assert list(csv_stream([])) == []
+        assert gzip.decompress(b"".join(csv_stream([], compress=True))) == b""
@@ -1,5 +1,20 @@
+import datetime
 import unittest
 
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from itkufs.accounting.models import (
+    Account,
+    Group,
+    RoleAccount,
+    Transaction,
+    TransactionEntry,
+    User,
+)
+
 
 class UserViewsTestCase(unittest.TestCase):
     """Tests the views as an unprivileged user"""
@@ -27,3 +42,265 @@ class AdminViewsCase(unittest.TestCase):
     def testStaticPage(self):
         # FIXME: Implement test
         pass
+
+
+class BalanceHistoryViewTestCase(unittest.TestCase):
+    """Tests the balance history of accounts as JSON"""
+
+    def setUp(self):
+        self.users = [User(username="alice"), User(username="bob")]
+        for user in self.users:
+            user.save()
+
+        self.group = Group(name="Group 1", slug="group1")
+        self.group.save()
+
+        self.account = Account(
+            name="Account 1",
+            slug="account1",
+            group=self.group,
+            owner=self.users[0],
+        )
+        self.account.save()
+        self.other = Account(
+            name="Account 2",
+            slug="account2",
+            group=self.group,
+            type=Account.ASSET_ACCOUNT,
+        )
+        self.other.save()
+
+        start = datetime.date(2024, 5, 13)
+        for days, amount in [(0, 100), (0, 50), (3, -30), (21, 10)]:
+            Transaction.objects.create_with_entries(
+                group=self.group,
+                entries=[
+                    (
+                        TransactionEntry(account=self.account, credit=amount)
+                        if amount > 0
+                        else TransactionEntry(
+                            account=self.account, debit=-amount
+                        )
+                    ),
+                    (
+                        TransactionEntry(account=self.other, debit=amount)
+                        if amount > 0
+                        else TransactionEntry(
+                            account=self.other, credit=-amount
+                        )
+                    ),
+                ],
+                user=self.users[0],
+                state=Transaction.COMMITTED_STATE,
+                date=start + datetime.timedelta(days=days),
+            )
+
+        # Pending transactions are not part of the history
+        Transaction.objects.create_with_entries(
+            group=self.group,
+            entries=[
+                TransactionEntry(account=self.account, credit=1000),
+                TransactionEntry(account=self.other, debit=1000),
+            ],
+            user=self.users[0],
+        )
+
+        self.client = Client()
+        self.client.force_login(self.users[0])
+        self.url = reverse(
+            "account-balance-history",
+            args=[self.group.slug, self.account.slug],
+        )
+
+    def tearDown(self):
+        self.group.delete()
+        for user in self.users:
+            user.delete()
+
+    def get(self, data=None):
+        return self.client.get(self.url, data, secure=True)
+
+    def testDays(self):
+        response = self.get()
+        assert response.status_code == 200
+        assert response.json() == {
+            "bucket": "day",
+            "points": [
+                ["2024-05-13", 150.0],
+                ["2024-05-16", 120.0],
+                ["2024-06-03", 130.0],
+            ],
+        }
+
+    def testBuckets(self):
+        assert self.get({"bucket": "week"}).json()["points"] == [
+            ["2024-05-13", 120.0],
+            ["2024-06-03", 130.0],
+        ]
+        assert self.get({"bucket": "month"}).json()["points"] == [
+            ["2024-05-01", 120.0],
+            ["2024-06-01", 130.0],
+        ]
+        assert self.get({"bucket": "year"}).status_code == 400
+
+    def testPoints(self):
+        assert len(self.get({"points": 3}).json()["points"]) == 3
+        assert len(self.get({"points": 1}).json()["points"]) == 3
+        assert self.get({"points": "many"}).status_code == 400
+
+    def testNormalBalance(self):
+        """Checks that asset accounts get their debits as positive"""
+
+        url = reverse(
+            "account-balance-history", args=[self.group.slug, self.other.slug]
+        )
+        self.group.admins.add(self.users[0])
+        points = self.client.get(url, secure=True).json()["points"]
+        assert points[-1] == ["2024-06-03", 130.0]
+
+    def testForbidden(self):
+        self.client.force_login(self.users[1])
+        assert self.get().status_code == 403
+
+    def testAccountSummary(self):
+        response = self.client.get(
+            reverse(
+                "account-summary", args=[self.group.slug, self.account.slug]
+            ),
+            secure=True,
+        )
+        assert response.status_code == 200
+        assert self.url.encode() in response.content
+
+
+class GroupBalanceGraphTestCase(unittest.TestCase):
+    """Tests the balances of the group members as JSON"""
+
+    def setUp(self):
+        self.user = User(username="alice")
+        self.user.save()
+
+        self.group = Group(name="Group 1", slug="group1")
+        self.group.save()
+        self.group.admins.add(self.user)
+
+        self.bank = self.group.roleaccount_set.get(
+            role=RoleAccount.BANK_ACCOUNT
+        ).account
+
+        self.accounts = []
+        for name, amount in [("Carol", -20), ("Alice", 50), ("Bob", 0)]:
+            account = Account(
+                name=name, slug=name.lower(), short_name=name, group=self.group
+            )
+            account.save()
+            self.accounts.append(account)
+            self.deposit(account, amount)
+        Account(name="Dave", slug="dave", group=self.group, active=False).save()
+
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.url = reverse("group-balance-graph-data", args=[self.group.slug])
+
+    def tearDown(self):
+        self.group.delete()
+        self.user.delete()
+
+    def deposit(self, account, amount):
+        if not amount:
+            return
+        entries = [
+            TransactionEntry(account=account, credit=amount),
+            TransactionEntry(account=self.bank, debit=amount),
+        ]
+        if amount < 0:
+            entries = [
+                TransactionEntry(account=account, debit=-amount),
+                TransactionEntry(account=self.bank, credit=-amount),
+            ]
+        Transaction.objects.create_with_entries(
+            group=self.group,
+            entries=entries,
+            user=self.user,
+            state=Transaction.COMMITTED_STATE,
+        )
+
+    def get(self, **headers):
+        return self.client.get(self.url, secure=True, **headers)
+
+    def testBalances(self):
+        """Checks that only active members are included"""
+
+        assert self.get().json() == {
+            "balances": [["Alice", 50.0], ["Bob", 0.0], ["Carol", -20.0]],
+            "sorted": [["Alice", 50.0], ["Bob", 0.0], ["Carol", -20.0]],
+            "positive": [["Alice", 50.0], ["Bob", 0.0]],
+            "negative": [["Carol", 20.0]],
+        }
+
+    def testQueryCount(self):
+        """Checks that the number of queries does not grow with the number
+        of accounts"""
+
+        with CaptureQueriesContext(connection) as few:
+            assert self.get().status_code == 200
+        for i in range(10):
+            Account(
+                name="Account %d" % i, slug="account%d" % i, group=self.group
+            ).save()
+        with CaptureQueriesContext(connection) as many:
+            response = self.get()
+        assert len(response.json()["balances"]) == 13
+        assert len(many) == len(few)
+
+    def testNotModified(self):
+        """Checks that polls get a 304 until a transaction changes"""
+
+        etag = self.get()["ETag"]
+        assert self.get(HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        self.deposit(self.accounts[2], 10)
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert ["Bob", 10.0] in response.json()["positive"]
+
+    def testNotModifiedUntilAccountsChange(self):
+        """Checks that renamed, deactivated or added accounts give a new
+        response"""
+
+        etag = self.get()["ETag"]
+        self.accounts[0].short_name = "Caroline"
+        self.accounts[0].save()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert ["Caroline", -20.0] in response.json()["balances"]
+
+        etag = response["ETag"]
+        self.accounts[1].active = False
+        self.accounts[1].save()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert len(response.json()["balances"]) == 2
+
+        etag = response["ETag"]
+        Account(name="Erin", slug="erin", group=self.group).save()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert len(response.json()["balances"]) == 3
+
+    def testNotModifiedIsCheap(self):
+        """Checks that a 304 does not look at the transactions or accounts"""
+
+        etag = self.get()["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            assert self.get(HTTP_IF_NONE_MATCH=etag).status_code == 304
+        tables = [
+            "accounting_transaction",
+            "accounting_account ",
+            'accounting_account"',
+        ]
+        assert not [
+            q["sql"]
+            for q in queries
+            if any(table in q["sql"] for table in tables)
+        ]
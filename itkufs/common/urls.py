@@ -2,10 +2,13 @@ from django.conf.urls import url
 
 from itkufs.common.views import login_user, switch_group
 from itkufs.common.views.display import (
+    account_balance_history,
     account_summary,
     group_summary,
     group_balance_graph,
+    group_balance_graph_data,
     export_transactions,
+    export_transactions_incremental,
 )
 from itkufs.common.views.edit import (
     activate_account,
@@ -26,6 +29,11 @@ urlpatterns = [
         export_transactions,
         name="export-transactions",
     ),
+    url(
+        r"^(?P<group>[0-9a-z_-]+)/export/incremental$",
+        export_transactions_incremental,
+        name="export-transactions-incremental",
+    ),
     url(r"^(?P<group>[0-9a-z_-]+)/edit/$", edit_group, name="edit-group"),
     url(
         r"^(?P<group>[0-9a-z_-]+)/assign-role-accounts/$",
@@ -59,4 +67,15 @@ urlpatterns = [
         group_balance_graph,
         name="group-balance-graph",
     ),
+    url(
+        r"^(?P<group>[0-9a-z_-]+)/graphs/group-balance/data/$",
+        group_balance_graph_data,
+        name="group-balance-graph-data",
+    ),
+    url(
+        r"^(?P<group>[0-9a-z_-]+)/account/(?P<account>[0-9a-z_-]+)/"
+        r"graphs/balance-history/$",
+        account_balance_history,
+        name="account-balance-history",
+    ),
 ]
@@ -1,12 +1,17 @@
+import csv
 import re
+import zlib
 
 # This is needed for type hints in Python versions older than 3.9
-from typing import List as ListType
+from typing import Iterable, List as ListType
 
 from itkufs.accounting.models import Account
 
 CALLSIGN_RE = re.compile(r"^[A-Z]+[0-9][A-Z0-9]*[A-Z]$")
 
+# Rows are yielded to the client in blocks of roughly this many bytes
+CSV_BLOCK_SIZE = 64 * 1024
+
 
 def verify_account_number(num):
     """Check that account is has correct check digit.
@@ -53,3 +58,46 @@ def callsign_key(account: Account):
         index = 4
 
     return (index, account.short_name if is_callsign else account.name)
+
+
+class _Echo:
+    """File-like object that hands back whatever the csv writer writes"""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows: Iterable, compress=False):
+    """Yields the given rows as CSV in blocks suitable for a
+    StreamingHttpResponse, optionally gzip compressed on the fly.
+
+    Only one block is kept in memory at a time, so memory use does not
+    depend on the number of rows.
+    """
+
+    writer = csv.writer(_Echo())
+    if compress:
+        # wbits=31 gives a gzip header and trailer
+        compressor = zlib.compressobj(wbits=31)
+
+    block = []
+    size = 0
+    for row in rows:
+        line = writer.writerow(row)
+        block.append(line)
+        size += len(line)
+
+        if size >= CSV_BLOCK_SIZE:
+            data = "".join(block).encode("utf-8")
+            block = []
+            size = 0
+            if compress:
+                data = compressor.compress(data)
+            if data:
+                yield data
+
+    data = "".join(block).encode("utf-8")
+    if compress:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
@@ -1,25 +1,40 @@
 from operator import itemgetter
-import csv
 import datetime
+import itertools
 
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.shortcuts import render
-from django.http import HttpResponse, HttpRequest
+from django.http import (
+    HttpRequest,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 
 from itkufs.common.decorators import (
+    ledger_condition,
     limit_to_group,
     limit_to_owner,
     limit_to_admin,
 )
 
+from itkufs.common.export import (
+    EXPORT_TRANSACTIONS_HEADER,
+    INCREMENTAL_EXPORT_HEADER,
+    INCREMENTAL_EXPORT_LIMIT,
+    committed_entries_since,
+    export_rows,
+)
 from itkufs.common.forms import ExportTransactionsForm
-from itkufs.accounting.models import (
-    Account,
-    Group,
-    Transaction,
-    TransactionEntry,
+from itkufs.common.utils import csv_stream
+from itkufs.accounting.history import (
+    BUCKETS,
+    MAX_POINTS,
+    bucket_history,
+    lttb,
 )
+from itkufs.accounting.models import Account, Group
 
 
 @login_required
@@ -41,57 +56,28 @@ def export_transactions(request: HttpRequest, group: Group, is_admin=False):
         )
 
     if form.is_valid():
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
-
         # Get dates from form
         from_date = form.cleaned_data["from_date"]
         to_date = form.cleaned_data["to_date"]
+        compress = form.cleaned_data["compress"]
 
         # Generate CSV with headers
-        writer = csv.writer(response)
-        writer.writerow(
-            [
-                "Entry ID",
-                "Account ID",
-                "Transaction ID",
-                "Date",
-                "Debit",
-                "Credit",
-                "Account name",
-                "Short name",
-                "Owner",
-                "Is group account",
-            ]
+        rows = itertools.chain(
+            [EXPORT_TRANSACTIONS_HEADER],
+            export_rows(group, from_date, to_date),
         )
 
-        # Find all entries for this group in the given time period
-        entries = (
-            TransactionEntry.objects.filter(transaction__group__id=group.id)
-            .select_related()
-            .filter(
-                transaction__date__gte=from_date,
-                transaction__date__lte=to_date,
-                transaction__state=Transaction.COMMITTED_STATE,
+        if compress:
+            response = StreamingHttpResponse(
+                csv_stream(rows, compress=True),
+                content_type="application/gzip",
             )
-            .order_by("transaction__date")
-        )
-
-        for e in entries:
-            writer.writerow(
-                [
-                    e.id,
-                    e.account.id,
-                    e.transaction.id,
-                    e.transaction.date,
-                    e.debit,
-                    e.credit,
-                    e.account.name,
-                    e.account.short_name,
-                    e.account.slug,
-                    e.account.group_account,
-                ]
+            filename += ".gz"
+        else:
+            response = StreamingHttpResponse(
+                csv_stream(rows), content_type="text/csv"
             )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
         return response
     else:
         return render(
@@ -106,6 +92,36 @@ def export_transactions(request: HttpRequest, group: Group, is_admin=False):
         )
 
 
+@login_required
+@limit_to_admin
+def export_transactions_incremental(
+    request: HttpRequest, group: Group, is_admin=False
+):
+    """Export entries committed since the given resume token.
+
+    The token to continue from is returned in the X-Resume-Token header,
+    and X-Has-More tells if another request is needed to catch up.
+    """
+
+    try:
+        limit = int(request.GET.get("limit", INCREMENTAL_EXPORT_LIMIT))
+        rows, token, has_more = committed_entries_since(
+            group,
+            request.GET.get("after"),
+            min(max(limit, 1), INCREMENTAL_EXPORT_LIMIT),
+        )
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    response = StreamingHttpResponse(
+        csv_stream(itertools.chain([INCREMENTAL_EXPORT_HEADER], rows)),
+        content_type="text/csv",
+    )
+    response["X-Resume-Token"] = token
+    response["X-Has-More"] = "true" if has_more else "false"
+    return response
+
+
 @login_required
 @limit_to_group
 def group_summary(request: HttpRequest, group: Group, is_admin=False):
@@ -161,63 +177,85 @@ def account_summary(
             "is_owner": is_owner,
             "group": group,
             "account": Account.objects.select_related().get(id=account.id),
-            "balance_data": _generate_gchart_data(
-                account.get_balance_history_set()
-            ),
         },
     )
 
 
 @login_required
-@limit_to_group
-def group_balance_graph(request: HttpRequest, group: Group, is_admin=False):
-    accounts = (
-        Account.objects.all()
-        .filter(group_id=group.id, active=True, group_account=False)
-        .order_by("name")
-    )
-
-    data = []
-
-    for a in accounts:
-        data.append([a.short_name, a.normal_balance()])
+@limit_to_owner
+def account_balance_history(
+    request: HttpRequest,
+    group: Group,
+    account: Account,
+    is_admin=False,
+    is_owner=False,
+):
+    """Returns the balance history of the account as JSON.
 
-    graph_data = ['[ "%s", %d ]' % (a[0], a[1]) for a in data]
+    bucket groups the days into weeks or months, and points downsamples the
+    history to at most that many points.
+    """
 
-    data = sorted(data, key=itemgetter(1), reverse=True)
+    bucket = request.GET.get("bucket", "day")
+    if bucket not in BUCKETS:
+        return HttpResponseBadRequest(f'Unknown bucket "{bucket}"')
 
-    graph_data_sorted = ['[ "%s", %d ]' % (a[0], a[1]) for a in data]
+    try:
+        threshold = int(request.GET.get("points", MAX_POINTS))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    threshold = min(max(threshold, 3), MAX_POINTS)
 
-    graph_data_positive = []
-    graph_data_negative = []
+    points = bucket_history(account.get_balance_history_set(), bucket)
+    points = lttb(points, threshold)
+    return JsonResponse(
+        {
+            "bucket": bucket,
+            "points": [[date.isoformat(), balance] for date, balance in points],
+        }
+    )
 
-    for a in data:
-        if a[1] >= 0:
-            graph_data_positive.append('[ "%s", %d ]' % (a[0], a[1]))
-        else:
-            graph_data_negative.append('[ "%s", %d ]' % (a[0], -a[1]))
 
+@login_required
+@limit_to_group
+def group_balance_graph(request: HttpRequest, group: Group, is_admin=False):
     return render(
         request,
         "common/group_balance_graph.html",
-        {
-            "group": Group.objects.select_related().get(id=group.id),
-            "graph_data": ",\n".join(graph_data),
-            "graph_data_sorted": ",\n".join(graph_data_sorted),
-            "graph_data_positive": ",\n".join(graph_data_positive),
-            "graph_data_negative": ",\n".join(graph_data_negative),
-        },
+        {"group": Group.objects.select_related().get(id=group.id)},
     )
 
 
-def _generate_gchart_data(dataset):
-    # aggregate data
-    agg = 0.0
-    history = []
-    for i in range(len(dataset)):
-        saldo = float(dataset[i].saldo)
-        history.append((dataset[i].date, saldo + agg))
-        agg += saldo
+@login_required
+@limit_to_group
+@ledger_condition
+def group_balance_graph_data(
+    request: HttpRequest, group: Group, is_admin=False
+):
+    """Returns the balances of the group's active members as JSON, by name
+    and by balance, and split into positive and negative balances."""
+
+    balances = [
+        (short_name, float(balance))
+        for short_name, balance in Account.objects.filter(
+            group_id=group.id, active=True, group_account=False
+        )
+        .with_normal_balance()
+        .order_by("name")
+        .values_list("short_name", "stored_normal_balance")
+    ]
+
+    by_balance = sorted(balances, key=itemgetter(1), reverse=True)
+    split = next(
+        (i for i, (name, balance) in enumerate(by_balance) if balance < 0),
+        len(by_balance),
+    )
 
-    items = [f"[ new Date({date}), {balance:.2f}]" for date, balance in history]
-    return ",\n".join(items)
+    return JsonResponse(
+        {
+            "balances": balances,
+            "sorted": by_balance,
+            "positive": by_balance[:split],
+            "negative": [(n, -balance) for n, balance in by_balance[split:]],
+        }
+    )
@@ -0,0 +1,118 @@
+"""
+Printing of many lists at once.
+
+The accounts of all lists in a group are fetched in one query, and each
+list picks its accounts from them. The lists are then rendered in parallel
+by a pool of worker processes. The workers get everything they need with
+the list, so they never touch the database.
+"""
+
+import datetime
+import io
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from typing import List as ListType, Tuple
+
+from django.db.models import QuerySet
+
+from itkufs.accounting.models import Group
+from itkufs.common.renderers import get_renderer
+from itkufs.reports.models import List
+from itkufs.reports.preview import ghostscript
+
+PRINT_FORMATS = ("pdf", "zip")
+
+_list = list
+
+
+def list_filename(group: Group, list: List) -> str:
+    # Slugs are unique, so lists never share a name in a zip file
+    return "{}-{}-{}.pdf".format(datetime.date.today(), group.slug, list.slug)
+
+
+def _render(task) -> Tuple[str, bytes]:
+    group, username, list, accounts = task
+    pdf = get_renderer("list")
+    content = pdf(group, username, list, accounts=accounts).getvalue()
+    return list_filename(group, list), content
+
+
+def render_lists(
+    lists: QuerySet, username: str, workers=1
+) -> ListType[Tuple[str, bytes]]:
+    """Renders the given lists, returning the filename and content of each.
+    With more than one worker the lists are rendered in a process pool."""
+
+    lists = (
+        lists.select_related("group")
+        .prefetch_related("column_set")
+        .order_by("group__name", "group_id", "name")
+    )
+
+    tasks = []
+    for _, group_lists in groupby(lists, key=lambda list: list.group_id):
+        group_lists = _list(group_lists)
+        group = group_lists[0].group
+        accounts, extra_account_ids = List.objects.group_accounts(
+            group, group_lists
+        )
+        for list in group_lists:
+            tasks.append(
+                (
+                    group,
+                    username,
+                    list,
+                    list.select_accounts(accounts, extra_account_ids[list.id]),
+                )
+            )
+
+    if workers <= 1 or len(tasks) <= 1:
+        return [_render(task) for task in tasks]
+
+    # Forked workers inherit the configured Django project, and use nothing
+    # but the data they are given
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(tasks)), mp_context=context
+    ) as pool:
+        return _list(pool.map(_render, tasks))
+
+
+def merge_pdfs(rendered: ListType[Tuple[str, bytes]]) -> bytes:
+    """Returns the rendered lists as one PDF"""
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i, (filename, content) in enumerate(rendered):
+            paths.append(os.path.join(directory, "%04d-%s" % (i, filename)))
+            with open(paths[-1], "wb") as f:
+                f.write(content)
+
+        return ghostscript(
+            ["-sDEVICE=pdfwrite", "-sOutputFile=-"] + paths,
+            timeout=60 + 10 * len(paths),
+        )
+
+
+def zip_pdfs(rendered: ListType[Tuple[str, bytes]]) -> bytes:
+    """Returns the rendered lists as a zip file with one PDF per list"""
+
+    content = io.BytesIO()
+    with zipfile.ZipFile(content, "w", zipfile.ZIP_DEFLATED) as f:
+        for filename, pdf_content in rendered:
+            f.writestr(filename, pdf_content)
+    return content.getvalue()
+
+
+def print_lists(lists: QuerySet, username: str, format="pdf", workers=1):
+    """Renders the given lists as one merged PDF or as a zip of PDFs"""
+
+    assert format in PRINT_FORMATS
+    rendered = render_lists(lists, username, workers)
+    if format == "zip":
+        return zip_pdfs(rendered)
+    return merge_pdfs(rendered)
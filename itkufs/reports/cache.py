@@ -0,0 +1,234 @@
+"""
+Cache of rendered lists.
+
+A rendered list only changes when the list, its columns, the group, the
+accounts or their balances change, so PDFs are stored under a hash of all
+of these. Any such change gives a new key, and entries that are no longer
+used are evicted. Entries are kept in memory up to UFS_PDF_CACHE_SIZE
+bytes, and on disk in UFS_PDF_CACHE_DIR if that is set.
+"""
+
+import datetime
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from itkufs.accounting.models import Account, Group
+from itkufs.common.renderers import get_renderer
+from itkufs.reports.models import List
+
+
+class RenderCache:
+    def __init__(
+        self, size=32 * 2**20, directory=None, max_files=1000, suffix=".pdf"
+    ):
+        self.size = size
+        self.directory = directory
+        self.max_files = max_files
+        self.suffix = suffix
+        self.entries = OrderedDict()
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            content = self.entries.get(key)
+            if content is not None:
+                self.entries.move_to_end(key)
+                return content
+
+        content = self._read(key)
+        if content is not None:
+            self._store(key, content)
+        return content
+
+    def open(self, key: str):
+        """Returns a file object with the cached content for key, or None.
+        Content on disk is read from the file, not loaded into memory."""
+
+        with self.lock:
+            content = self.entries.get(key)
+            if content is not None:
+                self.entries.move_to_end(key)
+                return io.BytesIO(content)
+
+        if not self.directory:
+            return None
+        try:
+            return open(self._path(key), "rb")
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, content: bytes):
+        self._store(key, content)
+        self._write(key, content)
+
+    def get_or_render(self, key: str, render) -> bytes:
+        """Returns the cached content for key, calling render() to create
+        it if it is not cached"""
+
+        content = self.get(key)
+        if content is None:
+            content = render()
+            self.set(key, content)
+        return content
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.used = 0
+
+    def _store(self, key: str, content: bytes):
+        if len(content) > self.size:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.used -= len(self.entries.pop(key))
+            self.entries[key] = content
+            self.used += len(content)
+            while self.used > self.size:
+                self.used -= len(self.entries.popitem(last=False)[1])
+
+    def _path(self, key: str):
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def _read(self, key: str):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, content: bytes):
+        if not self.directory:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see half a PDF
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+        self._prune()
+
+    def _prune(self):
+        files = []
+        for root, dirs, names in os.walk(self.directory):
+            files.extend(os.path.join(root, n) for n in names)
+        if len(files) <= self.max_files:
+            return
+
+        files.sort(key=os.path.getmtime)
+        for path in files[: len(files) - self.max_files]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+# Uncached PDFs larger than this are rendered to disk
+PDF_SPOOL_SIZE = 2**20
+
+pdf_cache = RenderCache(
+    size=getattr(settings, "UFS_PDF_CACHE_SIZE", 32 * 2**20),
+    directory=getattr(settings, "UFS_PDF_CACHE_DIR", None),
+    max_files=getattr(settings, "UFS_PDF_CACHE_DIR_MAX_FILES", 1000),
+)
+
+
+def list_pdf_key(group: Group, username: str, list: List, *options):
+    """Returns the cache key for a rendered list, or None if the list may
+    not be cached. Random lists are shuffled on every print."""
+
+    if list.sort_order == List.RANDOM_SORT_ORDER:
+        return None
+
+    key = hashlib.sha256()
+
+    def add(*values):
+        key.update(repr(values).encode("utf-8"))
+
+    # The header shows who printed the list and when
+    add(username, datetime.date.today(), options)
+
+    add([getattr(list, f.attname) for f in List._meta.concrete_fields])
+    add(tuple(list.column_set.values_list("id", "name", "width")))
+    add(tuple(list.extra_accounts.values_list("id", flat=True)))
+
+    add([getattr(group, f.attname) for f in Group._meta.concrete_fields])
+    if group.logo and group.logo.storage.exists(group.logo.path):
+        add(os.path.getmtime(group.logo.path))
+
+    add(group.ledger_version())
+    add(
+        tuple(
+            Account.objects.filter(group=group)
+            .order_by("id")
+            .values_list(
+                "id",
+                "name",
+                "short_name",
+                "owner__username",
+                "type",
+                "active",
+                "blocked",
+                "ignore_block_limit",
+                "group_account",
+                "stored_balance__confirmed",
+            )
+        )
+    )
+    return key.hexdigest()
+
+
+def render_list_pdf(
+    group: Group, username: str, list: List, show_header=True, show_footer=True
+) -> bytes:
+    pdf = get_renderer("list")
+    return pdf(group, username, list, show_header, show_footer).getvalue()
+
+
+def list_pdf_file(
+    group: Group, username: str, list: List, show_header=True, show_footer=True
+):
+    """Returns a file object with the PDF for a list, for streaming to a
+    response. Lists that are not cached are rendered to a temporary file."""
+
+    key = list_pdf_key(group, username, list, show_header, show_footer)
+    if key is None:
+        output = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_SIZE)
+        pdf = get_renderer("list")
+        pdf(group, username, list, show_header, show_footer, output=output)
+        output.seek(0)
+        return output
+
+    output = pdf_cache.open(key)
+    if output is None:
+        content = render_list_pdf(
+            group, username, list, show_header, show_footer
+        )
+        pdf_cache.set(key, content)
+        output = io.BytesIO(content)
+    return output
+
+
+def list_pdf(
+    group: Group, username: str, list: List, show_header=True, show_footer=True
+) -> bytes:
+    """Returns the rendered PDF for a list, from the cache if possible"""
+
+    def render():
+        return render_list_pdf(group, username, list, show_header, show_footer)
+
+    key = list_pdf_key(group, username, list, show_header, show_footer)
+    if key is None:
+        return render()
+    return pdf_cache.get_or_render(key, render)
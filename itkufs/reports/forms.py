@@ -4,6 +4,12 @@ from django.utils.translation import ugettext_lazy as _
 from django.template.defaultfilters import slugify
 
 from itkufs.reports.models import List, ListColumn
+from itkufs.reports.periods import (
+    MAX_PERIODS,
+    PERIODS,
+    parse_periods,
+    split_periods,
+)
 from itkufs.accounting.models import Account, TransactionEntry, Group
 
 from typing import Optional
@@ -195,3 +201,42 @@ class IncomeStatementForm(forms.Form):
         label=_("Hide empty inactive accounts"),
         required=False,
     )
+    period = forms.ChoiceField(
+        label=_("Compare"),
+        choices=(("", _("Whole period")),) + PERIODS,
+        required=False,
+    )
+    periods = forms.CharField(
+        label=_("Periods"),
+        required=False,
+        help_text=_(
+            "Compare your own periods, "
+            "like 2024-01-01/2024-06-30, 2024-07-01/2024-12-31"
+        ),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        from_date = cleaned_data.get("from_date")
+        to_date = cleaned_data.get("to_date")
+
+        try:
+            if cleaned_data.get("periods"):
+                periods = parse_periods(cleaned_data["periods"])
+            elif from_date is not None and to_date is not None:
+                if from_date > to_date:
+                    raise ValueError(_("The period ends before it starts"))
+                periods = split_periods(
+                    from_date, to_date, cleaned_data.get("period")
+                )
+            else:
+                return cleaned_data
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+
+        if len(periods) > MAX_PERIODS:
+            raise forms.ValidationError(
+                _("Compare at most %d periods") % MAX_PERIODS
+            )
+        cleaned_data["period_list"] = periods
+        return cleaned_data
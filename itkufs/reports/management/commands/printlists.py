@@ -0,0 +1,102 @@
+"""
+Usage: ./manage.py printlists (-g GROUP [-g GROUP ...] | --public)
+           -o OUTPUT [-u USERNAME] [-j WORKERS]
+
+Renders all lists of the given groups, or all public lists, and writes them
+to OUTPUT as one merged PDF, or as a zip file with one PDF per list if
+OUTPUT ends with .zip. The lists are rendered by WORKERS processes.
+"""
+
+import logging
+import os
+import sys
+
+from django.core.management.base import BaseCommand
+
+from itkufs.accounting.models import Group
+from itkufs.reports.batch import print_lists
+from itkufs.reports.models import List
+
+CONSOLE_LOG_FORMAT = "%(levelname)-8s %(message)s"
+
+
+class Command(BaseCommand):
+    help = "Print all lists of groups to one PDF or a zip of PDFs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-g",
+            "--group",
+            dest="group_slugs",
+            action="append",
+            default=[],
+            help="Group to print lists for, may be repeated",
+        )
+        parser.add_argument(
+            "--public",
+            dest="public",
+            action="store_true",
+            help="Print all public lists",
+        )
+        parser.add_argument(
+            "-o", "--output", dest="output", help="PDF or zip file to write"
+        )
+        parser.add_argument(
+            "-u",
+            "--username",
+            dest="username",
+            default="",
+            help="Name shown as printed by in the list headers",
+        )
+        parser.add_argument(
+            "-j",
+            "--workers",
+            dest="workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of processes rendering lists",
+        )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.logger = self._setup_logging()
+
+    def _setup_logging(self):
+        logging.basicConfig(format=CONSOLE_LOG_FORMAT, level=logging.INFO)
+        return logging.getLogger("printlists")
+
+    def handle(self, *args, **options):
+        if not options["output"]:
+            sys.exit(__doc__)
+        if bool(options["group_slugs"]) == options["public"]:
+            sys.exit(__doc__)
+
+        if options["public"]:
+            lists = List.objects.filter(public=True)
+        else:
+            groups = [self._get_group(slug) for slug in options["group_slugs"]]
+            lists = List.objects.filter(group__in=groups)
+
+        count = lists.count()
+        if not count:
+            self.logger.error("No lists to print")
+            sys.exit(1)
+
+        if options["output"].endswith(".zip"):
+            format = "zip"
+        else:
+            format = "pdf"
+
+        content = print_lists(
+            lists, options["username"], format, options["workers"]
+        )
+        with open(options["output"], "wb") as f:
+            f.write(content)
+        self.logger.info("Printed %d lists to %s", count, options["output"])
+
+    def _get_group(self, group_slug: str):
+        try:
+            return Group.objects.get(slug=group_slug)
+        except Group.DoesNotExist:
+            self.logger.error('Group "%s" does not exist', group_slug)
+            sys.exit(1)
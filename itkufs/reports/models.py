@@ -1,4 +1,5 @@
 import random
+from collections import defaultdict
 
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
@@ -28,6 +29,30 @@ class ListManager(models.Manager):
             )
         )
 
+    def group_accounts(self, group, lists):
+        """Returns the active accounts of the group, annotated as needed by
+        the given lists, and the ids of the extra accounts of each list"""
+
+        sort_orders = {list.sort_order for list in lists}
+
+        accounts = (
+            Account.objects.filter(active=True, group=group)
+            .select_related("group", "owner")
+            .with_blocked()
+        )
+        if List.CONSUMPTION_SORT_ORDER in sort_orders:
+            accounts = accounts.with_total_used()
+        if List.LAST_30_DAYS_USAGE_SORT_ORDER in sort_orders:
+            accounts = accounts.with_last_30_days_usage()
+
+        extra_account_ids = defaultdict(set)
+        for list_id, account_id in List.extra_accounts.through.objects.filter(
+            list__in=[list.id for list in lists]
+        ).values_list("list_id", "account_id"):
+            extra_account_ids[list_id].add(account_id)
+
+        return list(accounts), extra_account_ids
+
 
 class List(models.Model):
     objects = ListManager()
@@ -129,32 +154,38 @@ class List(models.Model):
         return int(count)
 
     def accounts(self):
-        all_accounts = Account.objects.filter(active=True, group=self.group_id)
-        extra_accounts = self.extra_accounts.values_list("id", flat=True)
+        accounts, extra_account_ids = List.objects.group_accounts(
+            self.group_id, [self]
+        )
+        return self.select_accounts(accounts, extra_account_ids[self.id])
+
+    def select_accounts(self, accounts, extra_account_ids):
+        """Picks the accounts of the list from the active accounts of the
+        group, as returned by List.objects.group_accounts(). This lets many
+        lists share one query."""
 
-        accounts = []
-        for a in all_accounts:
-            if a.is_blocked() and not self.ignore_blocked:
-                continue
+        accounts = [
+            a
+            for a in accounts
+            if a.id in extra_account_ids
+            or (self.add_active_accounts and not a.group_account)
+        ]
 
-            if self.add_active_accounts and a.is_user_account():
-                accounts.append(a)
-            elif a.id in extra_accounts:
-                accounts.append(a)
+        if not self.ignore_blocked:
+            accounts = [a for a in accounts if not a.is_blocked_sql]
 
         if self.sort_order == self.CALLSIGN_SORT_ORDER:
             return callsign_sorted(accounts)
         elif self.sort_order == self.RANDOM_SORT_ORDER:
             random.shuffle(accounts)
-            return accounts
         elif self.sort_order == self.CONSUMPTION_SORT_ORDER:
-            return sorted(accounts, key=lambda a: a.total_used(), reverse=True)
+            accounts.sort(key=lambda a: (-a.total_used_sql, a.name))
         elif self.sort_order == self.LAST_30_DAYS_USAGE_SORT_ORDER:
-            return sorted(
-                accounts, key=lambda a: a.last_30_days_usage(), reverse=True
-            )
+            accounts.sort(key=lambda a: (-a.last_30_days_usage_sql, a.name))
         else:
-            return sorted(accounts, key=lambda a: a.name.lower())
+            accounts.sort(key=lambda a: a.name.lower())
+
+        return accounts
 
 
 class ListColumn(models.Model):
@@ -1,4 +1,5 @@
 from datetime import date
+from functools import lru_cache
 from io import BytesIO
 
 from reportlab.pdfgen import canvas
@@ -7,6 +8,7 @@ from reportlab.platypus.flowables import Image
 from reportlab.lib.units import cm
 from reportlab.lib.colors import HexColor
 from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
 
 from django.utils.translation import ugettext as _
 
@@ -20,18 +22,56 @@ BLACKLISTED_TEXT_COLOR = HexColor("#A40000")
 WARN_TEXT_COLOR = HexColor("#F57900")
 FAINT_COLOR = HexColor("#BABABA")
 
+_list = list
+
 ALTERNATE_COLORS = [HexColor("#FFFFFF"), HexColor("#F5F5F5")]
 
+CELL_PADDING = 12  # pt
+
+
+@lru_cache(maxsize=16384)
+def string_width(text: str, font_name: str, font_size: int) -> float:
+    return stringWidth(text, font_name, font_size)
+
+
+def fit_font_size(
+    texts, width: float, font_name: str, font_size: int, min_font_size: int
+) -> int:
+    """Returns the largest font size, from font_size down to min_font_size,
+    at which all texts fit in a column of the given width"""
+
+    if not texts:
+        return font_size
+
+    # Widths scale with the font size, so the widest text is the same at
+    # every size and the only one that needs to be measured again
+    widest = max(set(texts), key=lambda t: string_width(t, font_name, 1000))
+    while (
+        font_size > min_font_size
+        and string_width(widest, font_name, font_size) + CELL_PADDING > width
+    ):
+        font_size -= 1
+    return font_size
+
 
 def pdf(
-    group: Group, username: str, list: List, show_header=True, show_footer=True
+    group: Group,
+    username: str,
+    list: List,
+    show_header=True,
+    show_footer=True,
+    accounts=None,
+    output=None,
 ):
-    """PDF version of list"""
+    """PDF version of list. The accounts on the list are looked up unless
+    given. The PDF is written to output, or a new BytesIO, which is
+    returned."""
 
-    content = BytesIO()
+    content = output if output is not None else BytesIO()
 
     columns = list.column_set.all()
-    accounts = list.accounts()
+    if accounts is None:
+        accounts = list.accounts()
 
     margin = 0.5 * cm
 
@@ -45,17 +85,11 @@ def pdf(
     foot_height = 15  # pt
     logo_height = 25  # pt
 
-    font_size_name = font_size_small
-    font_size_short_name = font_size_small
-    font_size_balance = font_size_small
-
     if list.orientation == list.LANDSCAPE:
         height, width = A4
     else:
         width, height = A4
 
-    grid_style = TableStyle(parent=GRID_STYLE)
-
     # Create canvas for page and set fonts
     p = canvas.Canvas(content, (width, height))
 
@@ -148,6 +182,7 @@ def pdf(
     # Store col widths
     col_width = []
     header = [_("Name")]
+    header_commands = []
 
     if list.account_width:
         col_width.append(list.account_width)
@@ -163,7 +198,7 @@ def pdf(
         col_width.append(list.balance_width)
 
     if list.short_name_width > 0 and list.account_width > 0:
-        grid_style.add("SPAN", (0, 0), (1, 0))
+        header_commands.append(("SPAN", (0, 0), (1, 0)))
 
     base_x = len(header)
 
@@ -184,35 +219,15 @@ def pdf(
             * (width - 2 * margin)
         )
 
-    # Intialise table with header
-    data = [header]
-
-    for i, a in enumerate(accounts):
-        color = ALTERNATE_COLORS[(i + 1) % len(ALTERNATE_COLORS)]
-
-        if list.double:
-            i *= 2
-            extra_row_height = 1
-        else:
-            extra_row_height = 0
-
-        i += 1
-
-        grid_style.add("BACKGROUND", (0, i), (-1, i + extra_row_height), color)
-
+    # Lay out the account cells first, so that the font size of each
+    # column can be picked from its widest text
+    rows = []
+    for a in accounts:
         row = []
 
         if list.account_width:
             row.append(a.name)
 
-            # Check if we need to reduce col font size
-            while (
-                col_width[len(row) - 1]
-                < p.stringWidth(row[-1], font_name, font_size_name) + 12
-                and font_size_name > font_size_min
-            ):
-                font_size_name -= 1
-
         if list.short_name_width:
             short_name = a.short_name
 
@@ -221,125 +236,162 @@ def pdf(
 
             row.append(short_name or a.name)
 
-            # Check if we need to reduce col font size
-            while (
-                col_width[len(row) - 1]
-                < p.stringWidth(row[-1], font_name, font_size_name) + 12
-                and font_size_short_name > font_size_min
-            ):
-                font_size_short_name -= 1
-
         if list.balance_width:
             row.append("%d" % a.normal_balance())
 
-            # XXX: currently warnings are only shown if balance is shown, this
-            # if needs to be moved if you want to change that
-            if a.needs_warning():
-                grid_style.add(
-                    "FONTNAME", (0, i), (base_x - 1, i), font_name_bold
+        # XXX: currently warnings are only shown if balance is shown, this
+        # needs to be changed if you want to change that
+        warn = bool(list.balance_width) and a.needs_warning()
+
+        rows.append((row, warn, a.is_blocked()))
+
+    font_sizes = [
+        fit_font_size(
+            [row[x] for row, _warn, _blocked in rows],
+            col_width[x],
+            font_name,
+            font_size_small,
+            font_size_min,
+        )
+        for x in range(len(rows[0][0]))
+    ]
+
+    columns_header = header[base_x:]
+
+    def page_table(page_rows, first):
+        """Returns the table for the rows of one page, where the first row
+        is the given account number on the list"""
+
+        data = [header]
+        commands = _list(header_commands)
+
+        for i, (row, warn, blocked) in enumerate(page_rows):
+            color = ALTERNATE_COLORS[(first + i + 1) % len(ALTERNATE_COLORS)]
+
+            if list.double:
+                i *= 2
+                extra_row_height = 1
+            else:
+                extra_row_height = 0
+
+            i += 1
+
+            commands.append(
+                ("BACKGROUND", (0, i), (-1, i + extra_row_height), color)
+            )
+
+            if warn:
+                commands.append(
+                    ("FONTNAME", (0, i), (base_x - 1, i), font_name_bold)
                 )
-                grid_style.add(
-                    "TEXTCOLOR",
-                    (base_x - 1, i),
-                    (base_x - 1, i),
-                    WARN_TEXT_COLOR,
+                commands.append(
+                    (
+                        "TEXTCOLOR",
+                        (base_x - 1, i),
+                        (base_x - 1, i),
+                        WARN_TEXT_COLOR,
+                    )
                 )
 
-            # Check if we need to reduce col font size
-            while (
-                col_width[len(row) - 1]
-                < p.stringWidth(str(row[-1]), font_name, font_size_balance) + 12
-                and font_size_balance > font_size_min
-            ):
-                font_size_balance -= 1
-
-        if a.is_blocked():
-            if list.balance_width:
-                grid_style.add(
-                    "TEXTCOLOR",
-                    (base_x - 1, i),
-                    (base_x - 1, i),
-                    BLACKLISTED_TEXT_COLOR,
-                )
-                grid_style.add(
-                    "FONTNAME", (0, i), (base_x - 1, i), font_name_bold
+            if blocked:
+                if list.balance_width:
+                    commands.append(
+                        (
+                            "TEXTCOLOR",
+                            (base_x - 1, i),
+                            (base_x - 1, i),
+                            BLACKLISTED_TEXT_COLOR,
+                        )
+                    )
+                    commands.append(
+                        ("FONTNAME", (0, i), (base_x - 1, i), font_name_bold)
+                    )
+                commands.append(
+                    (
+                        "BACKGROUND",
+                        (base_x, i),
+                        (-1, i + extra_row_height),
+                        BLACKLISTED_COLOR,
+                    )
                 )
-            grid_style.add(
-                "BACKGROUND",
-                (base_x, i),
-                (-1, i + extra_row_height),
-                BLACKLISTED_COLOR,
-            )
 
-            row.extend([""] * len(header[base_x:]))
+                data.append(row + [""] * len(columns_header))
 
-        else:
-            row.extend(header[base_x:])
+            else:
+                data.append(row + columns_header)
 
-        data.append(row)
+            if list.double:
+                data.append([""] * len(header))
 
-        if list.double:
-            data.append([""] * len(row))
+                commands.append(("SPAN", (0, i), (0, i + extra_row_height)))
 
-            grid_style.add("SPAN", (0, i), (0, i + extra_row_height))
+                if list.balance_width:
+                    commands.append(("SPAN", (1, i), (1, i + extra_row_height)))
 
-            if list.balance_width:
-                grid_style.add("SPAN", (1, i), (1, i + extra_row_height))
+        commands.append(("FONTSIZE", (0, 0), (-1, -1), font_size_small))
 
-    grid_style.add("FONTSIZE", (0, 0), (-1, -1), font_size_small)
+        # Set font size for names, short names and balance
+        for x, size in enumerate(font_sizes):
+            commands.append(("FONTSIZE", (x, 1), (x, -1), size))
 
-    # Set font size for names
-    grid_style.add("FONTSIZE", (0, 1), (0, -1), font_size_name)
-    grid_style.add("ALIGN", (0, 0), (-1, -1), "LEFT")
-    grid_style.add("ALIGN", (base_x, 0), (-1, -1), "RIGHT")
+        commands.append(("ALIGN", (0, 0), (-1, -1), "LEFT"))
+        commands.append(("ALIGN", (base_x, 0), (-1, -1), "RIGHT"))
 
-    grid_style.add("FONTNAME", (0, 0), (-1, 0), font_name_bold)
+        commands.append(("FONTNAME", (0, 0), (-1, 0), font_name_bold))
 
-    # Set font size for balance
-    if list.balance_width:
-        grid_style.add(
-            "FONTSIZE", (base_x - 1, 1), (base_x - 1, -1), font_size_balance
-        )
-        grid_style.add("ALIGN", (base_x - 1, 1), (base_x - 1, -1), "RIGHT")
+        if list.balance_width:
+            commands.append(
+                ("ALIGN", (base_x - 1, 1), (base_x - 1, -1), "RIGHT")
+            )
 
-    grid_style.add("TEXTCOLOR", (base_x, 1), (-1, -1), FAINT_COLOR)
+        commands.append(("TEXTCOLOR", (base_x, 1), (-1, -1), FAINT_COLOR))
 
-    if list.double:
-        grid_style.add("TOPPADDING", (base_x, 1), (-1, -1), 2)
-        grid_style.add("BOTTOMPADDING", (base_x, 1), (-1, -1), 2)
+        if list.double:
+            commands.append(("TOPPADDING", (base_x, 1), (-1, -1), 2))
+            commands.append(("BOTTOMPADDING", (base_x, 1), (-1, -1), 2))
 
-    grid_style.add("VALIGN", (0, 1), (-1, -1), "TOP")
-    grid_style.add("GRID", (0, 0), (-1, -1), 0.25, BORDER_COLOR)
+        commands.append(("VALIGN", (0, 1), (-1, -1), "TOP"))
+        commands.append(("GRID", (0, 0), (-1, -1), 0.25, BORDER_COLOR))
 
-    # Create table
-    t = Table(data, colWidths=col_width, style=grid_style, repeatRows=1)
+        return Table(
+            data,
+            colWidths=col_width,
+            style=TableStyle(commands, parent=GRID_STYLE),
+        )
 
-    rest = None
     avail_w = width - 2 * margin
     avail_h = height - 2 * margin - head_height - foot_height
 
-    while t:
-        # Figure out how big table will be
-        t_width, t_height = t.wrapOn(p, avail_w, avail_h)
-
-        if not rest and t_height > height - 2 * margin - head_height:
-            t, rest = t.split(avail_w, avail_h)
-            continue
+    # All account rows have the same height, so the number of accounts
+    # per page can be found from a table with a single account
+    header_height = page_table([], 0).wrapOn(p, avail_w, avail_h)[1]
+    row_height = (
+        page_table(rows[:1], 0).wrapOn(p, avail_w, avail_h)[1] - header_height
+    )
+    per_page = max(1, int((avail_h - header_height) // row_height))
+
+    # Build and draw one page at a time, so that only the rows and style
+    # commands of that page are held in memory
+    first = 0
+    while first < len(rows):
+        count = per_page
+        while True:
+            last = first + count
+            t = page_table(rows[first:last], first)
+            t_width, t_height = t.wrapOn(p, avail_w, avail_h)
+            if t_height <= avail_h or count == 1:
+                break
+            count -= 1
 
         # Draw on canvas
         draw_header()
         t.drawOn(p, margin, height - t_height - margin - head_height)
         draw_footer()
 
-        if rest:
-            # set t to the second table and reset rest
-            t, rest = (rest, None)
-
+        first += count
+        if first < len(rows):
             # Show new page
             p.showPage()
-        else:
-            # Leave loop
-            break
 
     p.save()
 
@@ -0,0 +1,85 @@
+"""
+Reporting periods for comparative statements.
+
+A date range is split into calendar months, quarters or years, clipped to
+the range, or periods are given as a list of date ranges. Every period is
+a (first day, last day, label) tuple.
+"""
+
+import datetime
+
+from django.utils.translation import ugettext as _, ugettext_lazy
+
+# This is needed for type hints in Python versions older than 3.9
+from typing import List, Tuple
+
+PERIODS = (
+    ("month", ugettext_lazy("Monthly")),
+    ("quarter", ugettext_lazy("Quarterly")),
+    ("year", ugettext_lazy("Yearly")),
+)
+
+# The most columns a statement is split into
+MAX_PERIODS = 60
+
+Period = Tuple[datetime.date, datetime.date, str]
+
+
+def _next_start(date: datetime.date, months: int) -> datetime.date:
+    """Returns the first day of the period after the one the date is in"""
+    month = (date.month - 1) // months * months + months
+    return datetime.date(date.year + month // 12, month % 12 + 1, 1)
+
+
+def _label(date: datetime.date, period: str) -> str:
+    if period == "month":
+        return date.strftime("%Y-%m")
+    elif period == "quarter":
+        return "%d Q%d" % (date.year, (date.month - 1) // 3 + 1)
+    return str(date.year)
+
+
+def split_periods(
+    from_date: datetime.date, to_date: datetime.date, period: str
+) -> List[Period]:
+    """Returns the calendar months, quarters or years from from_date to
+    to_date. Without a period, the whole range is one period."""
+
+    if not period:
+        label = "%s/%s" % (from_date.isoformat(), to_date.isoformat())
+        return [(from_date, to_date, label)]
+
+    months = {"month": 1, "quarter": 3, "year": 12}[period]
+    periods = []
+    start = from_date
+    while start <= to_date:
+        end = _next_start(start, months) - datetime.timedelta(days=1)
+        periods.append((start, min(end, to_date), _label(start, period)))
+        if len(periods) > MAX_PERIODS:
+            break
+        start = end + datetime.timedelta(days=1)
+    return periods
+
+
+def parse_periods(text: str) -> List[Period]:
+    """Returns the periods of a comma separated list of date ranges, like
+    "2024-01-01/2024-06-30, 2024-07-01/2024-12-31". Raises ValueError if a
+    range is malformed, or if the ranges are out of order or overlap."""
+
+    periods = []
+    for item in text.split(","):
+        try:
+            start, end = [
+                datetime.datetime.strptime(d.strip(), "%Y-%m-%d").date()
+                for d in item.split("/")
+            ]
+        except ValueError:
+            raise ValueError(_('Invalid period "%s"') % item.strip())
+        if start > end:
+            raise ValueError(
+                _('Period "%s" ends before it starts') % item.strip()
+            )
+        if periods and start <= periods[-1][1]:
+            raise ValueError(_("Periods must be in order without overlap"))
+        periods.append((start, end, "%s/%s" % (start, end)))
+    return periods
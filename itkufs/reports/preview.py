@@ -0,0 +1,148 @@
+"""
+Rendering of list previews.
+
+Previews are PNGs rasterized from the list PDF by Ghostscript. They are
+cached under the same key as the PDF, so a preview is only rendered again
+when the list or its accounts change. Ghostscript runs in a pool of at most
+UFS_PREVIEW_WORKERS threads, which caps the number of concurrent gs
+processes, and identical requests arriving while a preview is being
+rendered wait for that render instead of starting their own.
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from subprocess import PIPE, Popen, TimeoutExpired
+
+from django.conf import settings
+
+from itkufs.accounting.models import Group
+from itkufs.reports.cache import (
+    RenderCache,
+    list_pdf_key,
+    pdf_cache,
+    render_list_pdf,
+)
+from itkufs.reports.models import List
+
+
+class GhostscriptError(Exception):
+    pass
+
+
+def ghostscript(args, content=None, timeout=60) -> bytes:
+    """Runs gs with the given arguments, feeding it content on standard
+    input, and returns its output"""
+
+    p = Popen(
+        ["gs", "-q", "-dSAFER", "-dBATCH", "-dNOPAUSE"] + args,
+        stdin=PIPE,
+        stdout=PIPE,
+        stderr=PIPE,
+    )
+
+    try:
+        stdout, stderr = p.communicate(content, timeout=timeout)
+    except TimeoutExpired:
+        p.kill()
+        p.communicate()
+        raise GhostscriptError("gs timed out after %d seconds" % timeout)
+
+    if p.returncode != 0:
+        raise GhostscriptError(stderr.decode("utf-8", "replace"))
+
+    return stdout
+
+
+def rasterize(content: bytes, resolution=40) -> bytes:
+    """Returns the first page of a PDF as a PNG"""
+
+    return ghostscript(
+        [
+            "-r%d" % resolution,
+            "-dGraphicsAlphaBits=4",
+            "-dTextAlphaBits=4",
+            "-sDEVICE=png16m",
+            "-sOutputFile=-",
+            "-",
+        ],
+        content,
+    )
+
+
+class PreviewRenderer:
+    def __init__(self, cache: RenderCache, workers=2, resolution=40):
+        self.cache = cache
+        self.resolution = resolution
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="ufs-preview"
+        )
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def render(self, key, render_pdf) -> bytes:
+        """Returns the preview for key, rasterizing the PDF returned by
+        render_pdf() if it is not cached. A key of None is never cached.
+
+        The PDF is rendered in the calling thread, as it reads from the
+        database, and only Ghostscript runs in the pool."""
+
+        if key is None:
+            return self._rasterize(render_pdf())
+
+        content = self.cache.get(key)
+        if content is not None:
+            return content
+
+        with self.lock:
+            future = self.pending.get(key)
+            leader = future is None
+            if leader:
+                future = self.pending[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            content = self._rasterize(render_pdf())
+            self.cache.set(key, content)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(content)
+        finally:
+            with self.lock:
+                del self.pending[key]
+        return content
+
+    def _rasterize(self, content: bytes) -> bytes:
+        return self.executor.submit(
+            rasterize, content, self.resolution
+        ).result()
+
+
+preview_cache = RenderCache(
+    size=getattr(settings, "UFS_PREVIEW_CACHE_SIZE", 8 * 2**20),
+    directory=getattr(settings, "UFS_PREVIEW_CACHE_DIR", None),
+    max_files=getattr(settings, "UFS_PREVIEW_CACHE_DIR_MAX_FILES", 1000),
+    suffix=".png",
+)
+
+preview_renderer = PreviewRenderer(
+    preview_cache, workers=getattr(settings, "UFS_PREVIEW_WORKERS", 2)
+)
+
+
+def list_preview(group: Group, username: str, list: List) -> bytes:
+    """Returns the preview PNG for a list, from the cache if possible"""
+
+    key = list_pdf_key(group, username, list, True, True)
+
+    def render_pdf():
+        if key is None:
+            return render_list_pdf(group, username, list)
+        return pdf_cache.get_or_render(
+            key, lambda: render_list_pdf(group, username, list)
+        )
+
+    return preview_renderer.render(key, render_pdf)
@@ -0,0 +1,104 @@
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+
+from itkufs.accounting.models import Account, Group, User
+from itkufs.reports.batch import merge_pdfs, render_lists
+from itkufs.reports.models import List
+
+
+class PrintListsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.user = User(username="alice")
+        self.user.save()
+
+        self.groups = [
+            Group(name="Group %d" % i, slug="group%d" % i) for i in range(2)
+        ]
+        for group in self.groups:
+            group.save()
+            Account(name="Alpha", slug="alpha", group=group).save()
+            for i in range(3):
+                group.list_set.create(
+                    name="List %d" % i,
+                    slug="list%d" % i,
+                    account_width=10,
+                    short_name_width=0,
+                    balance_width=5,
+                    public=i == 0,
+                ).column_set.create(name="10", width=5)
+        self.groups[0].admins.add(self.user)
+
+    def tearDown(self):
+        for group in self.groups:
+            group.delete()
+        self.user.delete()
+
+    def lists(self):
+        return List.objects.filter(group__in=self.groups)
+
+    def testRenderLists(self):
+        rendered = render_lists(self.lists(), "alice")
+
+        assert len(rendered) == 6
+        assert rendered[0][0].endswith("-group0-list0.pdf")
+        assert all(content.startswith(b"%PDF") for _, content in rendered)
+
+    def testRenderListsInProcessPool(self):
+        """Checks that workers render the same lists without the database"""
+
+        rendered = render_lists(self.lists(), "alice", workers=3)
+        assert [filename for filename, _ in rendered] == [
+            filename for filename, _ in render_lists(self.lists(), "alice")
+        ]
+        assert all(content.startswith(b"%PDF") for _, content in rendered)
+
+    def testMergePDFs(self):
+        with mock.patch("itkufs.reports.batch.ghostscript") as ghostscript:
+            ghostscript.return_value = b"%PDF merged"
+            content = merge_pdfs([("a.pdf", b"%PDF a"), ("b.pdf", b"%PDF b")])
+
+        assert content == b"%PDF merged"
+        args = ghostscript.call_args[0][0]
+        assert "-sDEVICE=pdfwrite" in args
+        assert [os.path.basename(a) for a in args[-2:]] == [
+            "0000-a.pdf",
+            "0001-b.pdf",
+        ]
+
+    def testCommand(self):
+        # Lists of groups with the same name get their own files
+        for group in self.groups:
+            group.name = "Group"
+            group.save()
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "lists.zip")
+            call_command("printlists", public=True, output=output, workers=1)
+
+            with zipfile.ZipFile(output) as f:
+                names = f.namelist()
+        assert len(set(names)) == 2
+        assert all(name.endswith("-list0.pdf") for name in names)
+
+    def testView(self):
+        client = Client()
+        client.force_login(self.user)
+
+        url = reverse("print-group-lists", args=[self.groups[0].slug])
+        response = client.get(url, {"format": "zip"}, secure=True)
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/zip"
+        with zipfile.ZipFile(io.BytesIO(response.content)) as f:
+            assert len(f.namelist()) == 3
+
+        # Only group admins may print all lists
+        url = reverse("print-group-lists", args=[self.groups[1].slug])
+        assert client.get(url, secure=True).status_code == 403
@@ -0,0 +1,168 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from itkufs.accounting.models import (
+    Account,
+    Group,
+    Transaction,
+    TransactionEntry,
+    User,
+)
+from itkufs.reports.cache import (
+    RenderCache,
+    list_pdf,
+    list_pdf_file,
+    pdf_cache,
+)
+from itkufs.reports.models import List
+
+
+class RenderCacheTestCase(unittest.TestCase):
+    def testEvictsLeastRecentlyUsed(self):
+        cache = RenderCache(size=10)
+        cache.set("a", b"aaaa")
+        cache.set("b", b"bbbb")
+        cache.get("a")
+        cache.set("c", b"cccc")
+
+        assert cache.get("a") == b"aaaa"
+        assert cache.get("b") is None
+        assert cache.get("c") == b"cccc"
+        assert cache.used == 8
+
+    def testTooLarge(self):
+        cache = RenderCache(size=2)
+        cache.set("a", b"aaaa")
+        assert cache.get("a") is None
+
+    def testDirectory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = RenderCache(directory=directory, max_files=2)
+            cache.set("abc", b"content")
+
+            # A new process finds the content on disk
+            assert RenderCache(directory=directory).get("abc") == b"content"
+
+            cache.set("def", b"content")
+            cache.set("ghi", b"content")
+            files = sum(len(names) for _, _, names in os.walk(directory))
+            assert files == 2
+
+    def testOpen(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = RenderCache(size=2, directory=directory)
+            cache.set("abc", b"content")
+
+            # Content too large for memory is read from the file
+            with cache.open("abc") as f:
+                assert f.read() == b"content"
+                assert f.name.endswith("abc.pdf")
+
+        cache = RenderCache()
+        cache.set("abc", b"content")
+        assert cache.open("abc").read() == b"content"
+        assert cache.open("def") is None
+
+
+class ListPDFTestCase(unittest.TestCase):
+    def setUp(self):
+        self.user = User(username="alice")
+        self.user.save()
+
+        self.group = Group(name="Group 1", slug="group1")
+        self.group.save()
+        self.bank = self.group.account_set.get(slug="bank")
+
+        self.account = Account(name="Bravo", slug="bravo", group=self.group)
+        self.account.save()
+
+        self.list = List(
+            name="List 1",
+            slug="list1",
+            group=self.group,
+            account_width=10,
+            short_name_width=0,
+            balance_width=5,
+        )
+        self.list.save()
+        self.list.column_set.create(name="10", width=5)
+
+        pdf_cache.clear()
+        patcher = mock.patch("itkufs.reports.cache.get_renderer")
+        self.pdf = patcher.start().return_value
+        self.pdf.return_value.getvalue.return_value = b"%PDF"
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        pdf_cache.clear()
+        self.group.delete()
+        self.user.delete()
+
+    def render(self, username="alice"):
+        return list_pdf(self.group, username, self.list)
+
+    def testRenderedOnce(self):
+        """Checks that printing the same list twice only renders once"""
+
+        assert self.render() == b"%PDF"
+        assert self.render() == b"%PDF"
+        assert self.pdf.call_count == 1
+
+        # The name of the user printing the list is part of the header
+        self.render(username="bob")
+        assert self.pdf.call_count == 2
+
+    def testCommitRendersAgain(self):
+        self.render()
+        Transaction.objects.create_with_entries(
+            group=self.group,
+            entries=[
+                TransactionEntry(account=self.account, debit=20),
+                TransactionEntry(account=self.bank, credit=20),
+            ],
+            user=self.user,
+            state=Transaction.COMMITTED_STATE,
+        )
+        self.render()
+        assert self.pdf.call_count == 2
+
+    def testListChangeRendersAgain(self):
+        self.render()
+        self.list.column_set.create(name="20", width=5)
+        self.render()
+        self.list.comment = "New comment"
+        self.render()
+        assert self.pdf.call_count == 3
+
+    def testAccountChangeRendersAgain(self):
+        self.render()
+        self.account.name = "Charlie"
+        self.account.save()
+        self.render()
+        assert self.pdf.call_count == 2
+
+    def testRandomOrderNotCached(self):
+        self.list.sort_order = List.RANDOM_SORT_ORDER
+        self.render()
+        self.render()
+        assert self.pdf.call_count == 2
+
+    def testFile(self):
+        with list_pdf_file(self.group, "alice", self.list) as f:
+            assert f.read() == b"%PDF"
+        with list_pdf_file(self.group, "alice", self.list) as f:
+            assert f.read() == b"%PDF"
+        assert self.pdf.call_count == 1
+
+    def testRandomOrderFile(self):
+        """Checks that lists which are not cached are written to a file"""
+
+        def render(*args, output):
+            output.write(b"%PDF random")
+
+        self.pdf.side_effect = render
+        self.list.sort_order = List.RANDOM_SORT_ORDER
+        with list_pdf_file(self.group, "alice", self.list) as f:
+            assert f.read() == b"%PDF random"
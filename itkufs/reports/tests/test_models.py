@@ -0,0 +1,107 @@
+import unittest
+
+from itkufs.accounting.models import Account, Group, Transaction, User
+from itkufs.reports.models import List
+
+
+class ListTestCase(unittest.TestCase):
+    def setUp(self):
+        self.user = User(username="alice")
+        self.user.save()
+
+        self.group = Group(name="Group 1", slug="group1", block_limit=-100)
+        self.group.save()
+        self.bank = self.group.account_set.get(slug="bank")
+
+        self.accounts = [
+            Account(name="Charlie", slug="charlie", group=self.group),
+            Account(name="alpha", slug="alpha", group=self.group),
+            Account(name="Bravo", slug="bravo", group=self.group),
+            # Blocked by balance
+            Account(name="Delta", slug="delta", group=self.group),
+            # Blocked manually
+            Account(name="Echo", slug="echo", group=self.group, blocked=True),
+            # Inactive
+            Account(name="Foxtrot", slug="foxtrot", group=self.group),
+        ]
+        self.accounts[5].active = False
+        for account in self.accounts:
+            account.save()
+
+        self.transaction = Transaction(group=self.group)
+        self.transaction.save()
+        for account, amount in zip(self.accounts, [20, 30, 10, 150]):
+            self.transaction.entry_set.create(account=account, debit=amount)
+        self.transaction.entry_set.create(account=self.bank, credit=210)
+        self.transaction.set_pending(user=self.user)
+        self.transaction.set_committed(user=self.user)
+
+        self.list = List(
+            name="List 1",
+            slug="list1",
+            group=self.group,
+            account_width=10,
+            short_name_width=0,
+            balance_width=0,
+        )
+        self.list.save()
+
+    def tearDown(self):
+        self.list.delete()
+        self.transaction.delete()
+        for account in self.accounts:
+            account.delete()
+        self.group.delete()
+        self.user.delete()
+
+    def names(self):
+        return [a.name for a in self.list.accounts()]
+
+    def testAlphabeticalOrder(self):
+        """Checks that active, non-blocked accounts are sorted by name"""
+
+        assert self.names() == ["alpha", "Bravo", "Charlie"]
+
+    def testAlphabeticalOrderNonAscii(self):
+        """Checks that names are sorted by their lowercase characters,
+        whatever the database collation"""
+
+        for name, slug in [("Øst", "ost"), ("åse", "ase")]:
+            self.accounts.append(
+                Account(name=name, slug=slug, group=self.group)
+            )
+            self.accounts[-1].save()
+        assert self.names() == [
+            "alpha",
+            "Bravo",
+            "Charlie",
+            "åse",
+            "Øst",
+        ]
+
+    def testIgnoreBlocked(self):
+        """Checks that blocked accounts are included when ignored"""
+
+        self.list.ignore_blocked = True
+        assert self.names() == ["alpha", "Bravo", "Charlie", "Delta", "Echo"]
+
+    def testExtraAccounts(self):
+        """Checks that extra accounts are added to the list"""
+
+        self.list.extra_accounts.add(self.bank)
+        assert self.names() == ["alpha", "Bank", "Bravo", "Charlie"]
+
+        self.list.add_active_accounts = False
+        assert self.names() == ["Bank"]
+
+    def testConsumptionOrder(self):
+        """Checks that accounts are sorted by total consumption"""
+
+        self.list.sort_order = List.CONSUMPTION_SORT_ORDER
+        assert self.names() == ["alpha", "Charlie", "Bravo"]
+
+    def testLast30DaysUsageOrder(self):
+        """Checks that accounts are sorted by usage the last 30 days"""
+
+        self.list.sort_order = List.LAST_30_DAYS_USAGE_SORT_ORDER
+        assert self.names() == ["alpha", "Charlie", "Bravo"]
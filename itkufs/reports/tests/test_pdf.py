@@ -0,0 +1,74 @@
+import re
+import unittest
+
+from itkufs.accounting.models import Account, Group
+from itkufs.reports.models import List
+from itkufs.reports.pdf import fit_font_size, pdf, string_width
+
+
+class FitFontSizeTestCase(unittest.TestCase):
+    def testFits(self):
+        width = string_width("Alpha", "Times-Roman", 10) + 12
+        assert fit_font_size(["Alpha", "A"], width, "Times-Roman", 10, 8) == 10
+
+    def testShrinksToWidestText(self):
+        width = string_width("Charlie Charlie", "Times-Roman", 9) + 12
+        assert (
+            fit_font_size(
+                ["Alpha", "Charlie Charlie", "Bravo"],
+                width,
+                "Times-Roman",
+                10,
+                8,
+            )
+            == 9
+        )
+
+    def testMinimumSize(self):
+        assert fit_font_size(["Alpha" * 20], 10, "Times-Roman", 10, 8) == 8
+        assert fit_font_size([], 10, "Times-Roman", 10, 8) == 10
+
+
+class PDFTestCase(unittest.TestCase):
+    def setUp(self):
+        self.group = Group(name="Group 1", slug="group1", block_limit=-100)
+        self.group.save()
+        for i in range(30):
+            Account(
+                name="Account with a very long name %d" % i,
+                slug="account%d" % i,
+                short_name="SHORTNAME%d" % i,
+                group=self.group,
+            ).save()
+
+        self.list = List(
+            name="List 1",
+            slug="list1",
+            group=self.group,
+            account_width=5,
+            short_name_width=2,
+            balance_width=2,
+        )
+        self.list.save()
+        self.list.column_set.create(name="10", width=5)
+        self.list = List.objects.get(id=self.list.id)
+
+    def tearDown(self):
+        self.group.delete()
+
+    def testLongNames(self):
+        """Checks that names wider than their columns are rendered"""
+
+        content = pdf(self.group, "alice", self.list).getvalue()
+        assert content.startswith(b"%PDF")
+
+    def testPages(self):
+        """Checks that long lists are split into pages"""
+
+        content = pdf(self.group, "alice", self.list).getvalue()
+        assert len(re.findall(rb"/Type /Page\b(?!s)", content)) == 1
+
+        # Double rows never span two pages
+        self.list.double = True
+        content = pdf(self.group, "alice", self.list).getvalue()
+        assert len(re.findall(rb"/Type /Page\b(?!s)", content)) == 2
@@ -0,0 +1,64 @@
+import datetime
+import unittest
+
+import pytest
+
+from itkufs.reports.periods import parse_periods, split_periods
+
+date = datetime.date
+
+
+class SplitPeriodsTestCase(unittest.TestCase):
+    def testWholePeriod(self):
+        assert split_periods(date(2024, 1, 5), date(2024, 3, 1), "") == [
+            (date(2024, 1, 5), date(2024, 3, 1), "2024-01-05/2024-03-01")
+        ]
+
+    def testMonths(self):
+        """Checks that the first and last months are clipped to the range"""
+
+        assert split_periods(
+            date(2023, 11, 15), date(2024, 1, 10), "month"
+        ) == [
+            (date(2023, 11, 15), date(2023, 11, 30), "2023-11"),
+            (date(2023, 12, 1), date(2023, 12, 31), "2023-12"),
+            (date(2024, 1, 1), date(2024, 1, 10), "2024-01"),
+        ]
+
+    def testQuarters(self):
+        assert split_periods(
+            date(2024, 2, 1), date(2024, 12, 31), "quarter"
+        ) == [
+            (date(2024, 2, 1), date(2024, 3, 31), "2024 Q1"),
+            (date(2024, 4, 1), date(2024, 6, 30), "2024 Q2"),
+            (date(2024, 7, 1), date(2024, 9, 30), "2024 Q3"),
+            (date(2024, 10, 1), date(2024, 12, 31), "2024 Q4"),
+        ]
+
+    def testYears(self):
+        assert split_periods(date(2022, 6, 1), date(2024, 2, 1), "year") == [
+            (date(2022, 6, 1), date(2022, 12, 31), "2022"),
+            (date(2023, 1, 1), date(2023, 12, 31), "2023"),
+            (date(2024, 1, 1), date(2024, 2, 1), "2024"),
+        ]
+
+
+class ParsePeriodsTestCase(unittest.TestCase):
+    def testPeriods(self):
+        assert parse_periods(
+            "2024-01-01/2024-06-30, 2024-09-01/2024-12-31"
+        ) == [
+            (date(2024, 1, 1), date(2024, 6, 30), "2024-01-01/2024-06-30"),
+            (date(2024, 9, 1), date(2024, 12, 31), "2024-09-01/2024-12-31"),
+        ]
+
+    def testInvalid(self):
+        for text in [
+            "2024-01-01",
+            "2024-01-01/2024-13-01",
+            "2024-02-01/2024-01-01",
+            "2024-01-01/2024-06-30, 2024-06-30/2024-12-31",
+            "2024-07-01/2024-12-31, 2024-01-01/2024-06-30",
+        ]:
+            with pytest.raises(ValueError):
+                parse_periods(text)
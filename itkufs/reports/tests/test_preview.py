@@ -0,0 +1,91 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+import pytest
+
+from itkufs.reports.cache import RenderCache
+from itkufs.reports.preview import GhostscriptError, PreviewRenderer
+
+
+class PreviewRendererTestCase(unittest.TestCase):
+    def setUp(self):
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+        self.lock = threading.Lock()
+
+        patcher = mock.patch(
+            "itkufs.reports.preview.rasterize", side_effect=self.rasterize
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.renderer = PreviewRenderer(RenderCache(), workers=2)
+        self.addCleanup(self.renderer.executor.shutdown)
+
+    def rasterize(self, content, resolution):
+        with self.lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.1)
+        with self.lock:
+            self.active -= 1
+        if content == b"broken":
+            raise GhostscriptError("broken")
+        return b"PNG " + content
+
+    def render_concurrently(self, keys, content=b"%PDF"):
+        barrier = threading.Barrier(len(keys))
+        results = [None] * len(keys)
+
+        def run(i):
+            barrier.wait()
+            try:
+                results[i] = self.renderer.render(keys[i], lambda: content)
+            except GhostscriptError as e:
+                results[i] = e
+
+        threads = [
+            threading.Thread(target=run, args=(i,)) for i in range(len(keys))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def testCached(self):
+        assert self.renderer.render("a", lambda: b"%PDF") == b"PNG %PDF"
+        assert self.renderer.render("a", lambda: b"%PDF") == b"PNG %PDF"
+        assert self.calls == 1
+
+    def testNotCachedWithoutKey(self):
+        self.renderer.render(None, lambda: b"%PDF")
+        self.renderer.render(None, lambda: b"%PDF")
+        assert self.calls == 2
+
+    def testConcurrentRequestsShareRender(self):
+        results = self.render_concurrently(["a"] * 5)
+        assert results == [b"PNG %PDF"] * 5
+        assert self.calls == 1
+
+    def testWorkersLimitConcurrency(self):
+        results = self.render_concurrently(["a", "b", "c", "d", "e", "f"])
+        assert results == [b"PNG %PDF"] * 6
+        assert self.calls == 6
+        assert self.max_active == 2
+
+    def testFailureIsShared(self):
+        results = self.render_concurrently(["a"] * 3, content=b"broken")
+        assert all(isinstance(r, GhostscriptError) for r in results)
+
+        # Failures are not cached
+        assert self.renderer.render("a", lambda: b"%PDF") == b"PNG %PDF"
+        assert not self.renderer.pending
+
+    def testFailureRaised(self):
+        with pytest.raises(GhostscriptError):
+            self.renderer.render("a", lambda: b"broken")
@@ -0,0 +1,332 @@
+import datetime
+import random
+import time
+import unittest
+from decimal import Decimal
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from itkufs.accounting.models import (
+    Account,
+    AccountBalance,
+    AccountDailyTotal,
+    BalanceCheckpoint,
+    Group,
+    RoleAccount,
+    Transaction,
+    TransactionEntry,
+    User,
+)
+
+
+class BalanceStatementTestCase(unittest.TestCase):
+    """Tests the balance statement against a large generated ledger"""
+
+    MEMBERS = 500
+    TRANSACTIONS = 3000
+
+    def setUp(self):
+        self.user = User(username="alice")
+        self.user.save()
+
+        self.group = Group(name="Group 1", slug="group1")
+        self.group.save()
+        self.group.admins.add(self.user)
+
+        self.bank = self.group.roleaccount_set.get(
+            role=RoleAccount.BANK_ACCOUNT
+        ).account
+        self.equity = Account(
+            name="Equity",
+            slug="equity",
+            group=self.group,
+            type=Account.EQUITY_ACCOUNT,
+            group_account=True,
+        )
+        self.equity.save()
+        Account(
+            name="Closed",
+            slug="closed",
+            group=self.group,
+            type=Account.ASSET_ACCOUNT,
+            group_account=True,
+            active=False,
+        ).save()
+        Account(
+            name="Income",
+            slug="income",
+            group=self.group,
+            type=Account.INCOME_ACCOUNT,
+            group_account=True,
+        ).save()
+        Account.objects.bulk_create(
+            [
+                Account(
+                    name="Member %d" % i, slug="member%d" % i, group=self.group
+                )
+                for i in range(self.MEMBERS)
+            ]
+        )
+        members = list(self.group.account_set.filter(group_account=False))
+        others = [self.bank, self.equity]
+
+        # The ledger is generated in bulk, with the stored balances and
+        # daily totals rebuilt afterwards like createfakedata does
+        rng = random.Random(0)
+        self.today = datetime.date.today()
+        transactions = Transaction.objects.bulk_create(
+            [
+                Transaction(
+                    group=self.group,
+                    state=Transaction.COMMITTED_STATE,
+                    date=self.today
+                    - datetime.timedelta(days=rng.randint(0, 99)),
+                )
+                for i in range(self.TRANSACTIONS)
+            ]
+        )
+        transactions = list(
+            Transaction.objects.filter(group=self.group).order_by("id")
+        )
+        entries = []
+        for transaction in transactions:
+            amount = Decimal(rng.randint(1, 500))
+            member = rng.choice(members)
+            other = rng.choice(others)
+            if rng.random() < 0.5:
+                member, other = other, member
+            entries.append(
+                TransactionEntry(
+                    transaction=transaction, account=member, debit=amount
+                )
+            )
+            entries.append(
+                TransactionEntry(
+                    transaction=transaction, account=other, credit=amount
+                )
+            )
+        TransactionEntry.objects.bulk_create(entries)
+
+        account_ids = list(self.group.account_set.values_list("id", flat=True))
+        AccountBalance.objects.refresh(account_ids)
+        AccountDailyTotal.objects.refresh(account_ids)
+
+    def tearDown(self):
+        self.group.delete()
+        self.user.delete()
+
+    def expected(self, date):
+        """Returns the balance sheet from the historical balances of every
+        account, looked up one account at a time"""
+
+        accounts = {}
+        positive = negative = Decimal(0)
+        for account in (
+            Account.historical_objects.with_balance(date)
+            .filter(group=self.group)
+            .exclude(type__in=[Account.INCOME_ACCOUNT, Account.EXPENSE_ACCOUNT])
+        ):
+            balance = Decimal(account.normal_balance)
+            if account.group_account:
+                accounts[account.slug] = balance
+            elif balance > 0:
+                positive += balance
+            else:
+                negative += balance
+        return accounts, positive, negative
+
+    def testBalanceStatement(self):
+        """Checks that one query gives the same balance sheet as the
+        historical balances"""
+
+        for date in [self.today, self.today - datetime.timedelta(days=50)]:
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                (
+                    accounts,
+                    positive,
+                    negative,
+                ) = Account.historical_objects.balance_statement(
+                    self.group, date
+                )
+            assert len(queries) == 1
+            assert time.perf_counter() - start < 2
+
+            expected = self.expected(date)
+            assert {a.slug: b for a, b in accounts} == expected[0]
+            assert (positive, negative) == expected[1:]
+            names = [a.name for a, b in accounts]
+            assert names == sorted(names)
+
+    def testCheckpoints(self):
+        """Checks that the balance sheet starts at the balance checkpoints
+        rather than at the first day of the ledger"""
+
+        checkpoint = self.today - datetime.timedelta(days=60)
+        BalanceCheckpoint.objects.create_for_group(self.group, checkpoint)
+        AccountDailyTotal.objects.filter(
+            account__group=self.group, date__lte=checkpoint
+        ).delete()
+
+        for date in [self.today, checkpoint + datetime.timedelta(days=1)]:
+            (
+                accounts,
+                positive,
+                negative,
+            ) = Account.historical_objects.balance_statement(self.group, date)
+            expected = self.expected(date)
+            assert {a.slug: b for a, b in accounts} == expected[0]
+            assert (positive, negative) == expected[1:]
+
+    def testView(self):
+        client = Client()
+        client.force_login(self.user)
+        url = reverse("balance", args=[self.group.slug])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(
+                url,
+                {"date": self.today, "hide_empty_inactive": "on"},
+                secure=True,
+            )
+        assert response.status_code == 200
+
+        # Only the balance statement itself reads the ledger
+        ledger = [
+            q["sql"]
+            for q in queries
+            if "accounting_accountdailytotal" in q["sql"]
+            or "accounting_transactionentry" in q["sql"]
+        ]
+        assert len(ledger) == 1
+
+        sums = response.context["account_sums"]
+        accounts, positive, negative = self.expected(self.today)
+        assert sums["as"] == accounts["bank"]
+        assert sums["li"] == positive + negative
+        assert sums["li_eq"] == sums["as"]
+
+        # The inactive account without transactions is hidden
+        names = [a["name"] for a in response.context["accounts"]["as"]]
+        assert names == ["Bank", "Cash"]
+
+
+class IncomeStatementTestCase(unittest.TestCase):
+    def setUp(self):
+        self.user = User(username="alice")
+        self.user.save()
+
+        self.group = Group(name="Group 1", slug="group1")
+        self.group.save()
+        self.group.admins.add(self.user)
+
+        self.bank = self.group.roleaccount_set.get(
+            role=RoleAccount.BANK_ACCOUNT
+        ).account
+        self.sales = Account(
+            name="Sales",
+            slug="sales",
+            group=self.group,
+            type=Account.INCOME_ACCOUNT,
+            group_account=True,
+        )
+        self.sales.save()
+        self.beer = Account(
+            name="Beer",
+            slug="beer",
+            group=self.group,
+            type=Account.EXPENSE_ACCOUNT,
+            group_account=True,
+        )
+        self.beer.save()
+
+        for day, sales, beer in [
+            (datetime.date(2024, 1, 10), 100, 40),
+            (datetime.date(2024, 1, 20), 50, 0),
+            (datetime.date(2024, 3, 5), 30, 80),
+        ]:
+            self.create(self.bank, self.sales, sales, day)
+            if beer:
+                self.create(self.beer, self.bank, beer, day)
+
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.url = reverse("income", args=[self.group.slug])
+
+    def tearDown(self):
+        self.group.delete()
+        self.user.delete()
+
+    def create(self, debit, credit, amount, date):
+        Transaction.objects.create_with_entries(
+            group=self.group,
+            entries=[
+                TransactionEntry(account=debit, debit=amount),
+                TransactionEntry(account=credit, credit=amount),
+            ],
+            user=self.user,
+            state=Transaction.COMMITTED_STATE,
+            date=date,
+        )
+
+    def get(self, **data):
+        data.setdefault("from_date", "2024-01-01")
+        data.setdefault("to_date", "2024-03-31")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, data, secure=True)
+        assert response.status_code == 200
+
+        # All periods are summed up in a single query
+        ledger = [
+            q
+            for q in queries
+            if "accounting_accountdailytotal" in q["sql"]
+            or "accounting_transactionentry" in q["sql"]
+        ]
+        assert len(ledger) == 1
+        return response.context
+
+    def rows(self, context, type):
+        return [
+            (a["name"], a["balance_changes"]) for a in context["accounts"][type]
+        ]
+
+    def testWholePeriod(self):
+        context = self.get()
+        assert context["columns"] == ["2024-01-01/2024-03-31"]
+        assert self.rows(context, "in") == [("Sales", [180])]
+        assert self.rows(context, "ex") == [("Beer", [120])]
+        assert context["account_sums"]["in_ex_diff"] == [60]
+
+    def testMonthly(self):
+        context = self.get(period="month")
+        assert context["columns"] == ["2024-01", "2024-02", "2024-03", "Total"]
+        assert self.rows(context, "in") == [("Sales", [150, 0, 30, 180])]
+        assert self.rows(context, "ex") == [("Beer", [40, 0, 80, 120])]
+        assert context["account_sums"]["in_ex_diff"] == [110, 0, -50, 60]
+
+    def testPeriods(self):
+        """Checks that days between the given periods are left out"""
+
+        context = self.get(
+            periods="2024-01-15/2024-01-31, 2024-03-01/2024-03-31"
+        )
+        assert self.rows(context, "in") == [("Sales", [50, 30, 80])]
+        assert self.rows(context, "ex") == [("Beer", [0, 80, 80])]
+
+    def testInvalid(self):
+        response = self.client.get(
+            self.url,
+            {
+                "from_date": "2024-01-01",
+                "to_date": "2024-03-31",
+                "periods": "2024-03-01/2024-01-01",
+            },
+            secure=True,
+        )
+        assert response.status_code == 200
+        assert response.context["form"].errors
+        assert "columns" not in response.context
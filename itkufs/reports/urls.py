@@ -5,6 +5,7 @@ from itkufs.reports.views import (
     delete_list,
     income,
     new_edit_list,
+    print_group_lists,
     transaction_from_list,
     view_list,
     view_list_preview,
@@ -13,6 +14,11 @@ from itkufs.reports.views import (
 urlpatterns = [
     # --- Lists
     url(r"^(?P<group>[0-9a-z_-]+)/list/new/$", new_edit_list, name="new-list"),
+    url(
+        r"^(?P<group>[0-9a-z_-]+)/lists/print/$",
+        print_group_lists,
+        name="print-group-lists",
+    ),
     url(
         r"^(?P<group>[0-9a-z_-]+)/list/(?P<list>[0-9a-z_-]+)/$",
         view_list,
@@ -1,14 +1,19 @@
 from datetime import date
-from subprocess import Popen, PIPE
 import datetime
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db import transaction as db_transaction
-from django.db.models import Q, Sum, Case, When, DecimalField
-from django.db.models.functions import Coalesce
-from django.forms.models import inlineformset_factory, model_to_dict
-from django.http import Http404, HttpResponseRedirect, HttpResponse, HttpRequest
+from django.db.models import Q
+from django.forms.models import inlineformset_factory
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponseRedirect,
+    HttpResponse,
+    HttpRequest,
+)
 from django.shortcuts import render
 from django.template.defaultfilters import slugify
 from django.urls import reverse
@@ -28,7 +33,9 @@ from itkufs.reports.forms import (
     BalanceStatementForm,
     IncomeStatementForm,
 )
-from itkufs.reports.pdf import pdf
+from itkufs.reports.batch import PRINT_FORMATS, print_lists
+from itkufs.reports.cache import list_pdf_file
+from itkufs.reports.preview import list_preview
 
 from typing import Optional
 
@@ -52,11 +59,11 @@ def public_lists(request: HttpRequest):
 @login_required
 @limit_to_group
 def view_list(request: HttpRequest, group: Group, list: List, is_admin=False):
-    content = pdf(group, request.user.username, list)
+    content = list_pdf_file(group, request.user.username, list)
 
     filename = "{}-{}-{}".format(date.today(), group, list)
 
-    response = HttpResponse(content.getvalue(), content_type="application/pdf")
+    response = FileResponse(content, content_type="application/pdf")
     response["Content-Disposition"] = "attachment; filename=%s.pdf" % (
         slugify(filename)
     )
@@ -69,35 +76,38 @@ def view_list(request: HttpRequest, group: Group, list: List, is_admin=False):
 def view_list_preview(
     request: HttpRequest, group: Group, list: List, is_admin=False
 ):
-    content = pdf(
-        group, request.user.username, list, show_header=True, show_footer=True
-    )
+    content = list_preview(group, request.user.username, list)
+
+    return HttpResponse(content, content_type="image/png")
+
+
+@login_required
+@limit_to_admin
+def print_group_lists(request: HttpRequest, group: Group, is_admin=False):
+    format = request.GET.get("format", "pdf")
+    if format not in PRINT_FORMATS or not group.list_set.exists():
+        raise Http404
 
-    p = Popen(
-        [
-            "gs",
-            "-q",
-            "-dSAFER",
-            "-dBATCH",
-            "-dNOPAUSE",
-            "-r40",
-            "-dGraphicsAlphaBits=4",
-            "-dTextAlphaBits=4",
-            "-sDEVICE=png16m",
-            "-sOutputFile=-",
-            "-",
-        ],
-        stdin=PIPE,
-        stdout=PIPE,
-        stderr=PIPE,
+    content = print_lists(
+        group.list_set.all(),
+        request.user.username,
+        format,
+        getattr(settings, "UFS_LIST_PRINT_WORKERS", 1),
     )
 
-    stdout, stderr = p.communicate(content.getvalue())
+    filename = "{}-{}-lists".format(date.today(), group)
 
-    if p.returncode != 0:
-        raise Exception(stdout)
+    if format == "zip":
+        content_type = "application/zip"
+    else:
+        content_type = "application/pdf"
+    response = HttpResponse(content, content_type=content_type)
+    response["Content-Disposition"] = "attachment; filename=%s.%s" % (
+        slugify(filename),
+        format,
+    )
 
-    return HttpResponse(stdout, content_type="image/png")
+    return response
 
 
 def view_public_list(
@@ -106,11 +116,11 @@ def view_public_list(
     if not list.public:
         raise Http404
 
-    content = pdf(group, request.user.username, list)
+    content = list_pdf_file(group, request.user.username, list)
 
     filename = "{}-{}-{}".format(date.today(), group, list)
 
-    response = HttpResponse(content.getvalue(), content_type="application/pdf")
+    response = FileResponse(content, content_type="application/pdf")
     response["Content-Disposition"] = "attachment; filename=%s.pdf" % (
         slugify(filename)
     )
@@ -216,16 +226,11 @@ def transaction_from_list(
     form = ListTransactionForm(list, request.POST or None)
 
     if form.is_valid():
-        transaction = Transaction(group=list.group)
-        transaction.save()
-
-        for entry in form.transaction_entries():
-            entry.transaction = transaction
-            entry.save()
-
-        transaction.save()
-        transaction.set_pending(
-            user=request.user, message=_("Created from list: %s") % list.slug
+        transaction = Transaction.objects.create_with_entries(
+            group=list.group,
+            entries=form.transaction_entries(),
+            user=request.user,
+            message=_("Created from list: %s") % list.slug,
         )
 
         return HttpResponseRedirect(
@@ -263,37 +268,13 @@ def balance(request: HttpRequest, group: Group, is_admin=False):
     else:
         raise ValueError("Invalid form data.")
 
-    # Common filters for all queries in this view
-    filters = (
-        Q(group=group)
-        & ~Q(type=Account.EXPENSE_ACCOUNT)
-        & ~Q(type=Account.INCOME_ACCOUNT)
-    )
-
-    # Get all group accounts
-    group_accounts = (
-        Account.objects.filter(filters)
-        .filter(group_account=True)
-        .select_related("group")
-    )
-
-    # Get group account balances at the given date
-    balances = (
-        Account.historical_objects.with_balance_change(
-            from_date="1929-10-01", to_date=date
-        )
-        .filter(filters)
-        .select_related("group")
-    )
-
-    if hide_empty_active:
-        balances = balances.exclude(Q(active=True) & Q(normal_balance=0))
-
-    if hide_empty_inactive:
-        balances = balances.exclude(Q(active=False) & Q(normal_balance=0))
-
-    # Convert to dict (id -> account with balance change) for easy lookup
-    balances = {b["id"]: b for b in balances.values()}
+    # Get group account balances and the member account sums at the given
+    # date, all in one query
+    (
+        group_accounts,
+        positive_sum,
+        negative_sum,
+    ) = Account.historical_objects.balance_statement(group, date)
 
     # Balance sheet data structs
     accounts = {
@@ -310,69 +291,30 @@ def balance(request: HttpRequest, group: Group, is_admin=False):
     }
 
     # Aggregate group account assets and liabilities
-    for account in group_accounts:
-        balance = 0
-        if account.id in balances:
-            balance = balances[account.id]["normal_balance"]
-
+    for account, balance in group_accounts:
         if balance == 0 and hide_empty_active and account.active:
             continue
         if balance == 0 and hide_empty_inactive and not account.active:
             continue
 
-        url = account.get_absolute_url()
-        account = model_to_dict(account)
-        account["normal_balance"] = balance
-        account["url"] = url
-        accounts[account["type"].lower()].append(account)
-        account_sums[account["type"].lower()] += balance
-
-    # Aggregate member account liabilities
-    members = (
-        Account.historical_objects.with_balance_change(
-            from_date="1929-10-01", to_date=date
-        )
-        .filter(filters)
-        .filter(group_account=False)
-        .aggregate(
-            positive_sum=Coalesce(
-                Sum(
-                    Case(
-                        When(normal_balance__gt=0, then="normal_balance"),
-                        output_field=DecimalField() 
-                    )
-                ),
-                0,
-                output_field=DecimalField()
-            ),
-            negative_sum=Coalesce(
-                Sum(
-                    Case(
-                        When(normal_balance__lt=0, then="normal_balance"),
-                        output_field=DecimalField() 
-                    )
-                ),
-                0,
-                output_field=DecimalField()
-            ),
+        accounts[account.type.lower()].append(
+            {
+                "name": account.name,
+                "normal_balance": balance,
+                "url": account.get_absolute_url(),
+            }
         )
-    )
+        account_sums[account.type.lower()] += balance
 
     # Accumulated member accounts liabilities
     accounts["li"].append(
-        {
-            "name": _("Positive member accounts"),
-            "balance": members["positive_sum"],
-        }
+        {"name": _("Positive member accounts"), "balance": positive_sum}
     )
     accounts["li"].append(
-        {
-            "name": _("Negative member accounts"),
-            "balance": members["negative_sum"],
-        }
+        {"name": _("Negative member accounts"), "balance": negative_sum}
     )
-    account_sums["li"] += members["positive_sum"]
-    account_sums["li"] += members["negative_sum"]
+    account_sums["li"] += positive_sum
+    account_sums["li"] += negative_sum
 
     # Total liabilities and equities
     account_sums["li_eq"] = account_sums["li"] + account_sums["eq"]
@@ -417,69 +359,69 @@ def income(request: HttpRequest, group: Group, is_admin=False):
 
     form = IncomeStatementForm(data)
 
-    if form.is_valid():
-        from_date = form.cleaned_data["from_date"]
-        to_date = form.cleaned_data["to_date"]
-        hide_empty_active = form.cleaned_data["hide_empty_active"]
-        hide_empty_inactive = form.cleaned_data["hide_empty_inactive"]
-    else:
-        raise ValueError("Invalid form data.")
+    if not form.is_valid():
+        return render(
+            request,
+            "reports/income.html",
+            {"is_admin": is_admin, "group": group, "form": form},
+        )
 
-    # Common filters for all queries in this view
-    filters = Q(group=group) & (
-        Q(type=Account.EXPENSE_ACCOUNT) | Q(type=Account.INCOME_ACCOUNT)
-    )
+    periods = form.cleaned_data["period_list"]
+    hide_empty_active = form.cleaned_data["hide_empty_active"]
+    hide_empty_inactive = form.cleaned_data["hide_empty_inactive"]
 
     # Get all income and expense accounts
-    all_accounts = Account.objects.filter(filters).select_related("group")
+    all_accounts = Account.objects.filter(
+        Q(group=group)
+        & (Q(type=Account.EXPENSE_ACCOUNT) | Q(type=Account.INCOME_ACCOUNT))
+    ).select_related("group")
 
-    # Get group account balance changes in the given range
-    balances = (
-        Account.historical_objects.with_balance_change(
-            from_date=from_date, to_date=to_date
-        )
-        .filter(filters)
-        .select_related("group")
+    # Get the balance changes of every account in every period at once
+    changes = Account.historical_objects.balance_changes_by_period(
+        all_accounts, periods
     )
 
-    if hide_empty_active:
-        balances = balances.exclude(Q(active=True) & Q(normal_balance=0))
+    # Income statement data structs, with a column per period and a total
+    # column when comparing periods
+    columns = [label for start, end, label in periods]
+    if len(periods) > 1:
+        columns.append(_("Total"))
 
-    if hide_empty_inactive:
-        balances = balances.exclude(Q(active=False) & Q(normal_balance=0))
-
-    # Convert to dict (id -> account with balance change) for easy lookup
-    balances = {b["id"]: b for b in balances.values()}
-
-    # Balance sheet data struct
     accounts = {"in": [], "ex": []}
 
     account_sums = {
-        "in": 0,
-        "ex": 0,
-        "in_ex_diff": 0,
+        "in": [0] * len(columns),
+        "ex": [0] * len(columns),
+        "in_ex_diff": [0] * len(columns),
     }
 
     # Aggregate incomes and expenses
     for account in all_accounts:
-        balance = 0
-        if account.id in balances:
-            balance = balances[account.id]["normal_balance"]
+        row = changes.get(account.id, [0] * len(periods))
+        empty = not any(row)
 
-        if balance == 0 and hide_empty_active and account.active:
+        if empty and hide_empty_active and account.active:
             continue
-        if balance == 0 and hide_empty_inactive and not account.active:
+        if empty and hide_empty_inactive and not account.active:
             continue
 
-        url = account.get_absolute_url()
-        account = model_to_dict(account)
-        account["balance_change"] = balance
-        account["url"] = url
-        accounts[account["type"].lower()].append(account)
-        account_sums[account["type"].lower()] += balance
+        if len(periods) > 1:
+            row = row + [sum(row)]
+
+        key = account.type.lower()
+        accounts[key].append(
+            {
+                "name": account.name,
+                "balance_changes": row,
+                "url": account.get_absolute_url(),
+            }
+        )
+        account_sums[key] = [a + b for a, b in zip(account_sums[key], row)]
 
     # Net income
-    account_sums["in_ex_diff"] = account_sums["in"] - account_sums["ex"]
+    account_sums["in_ex_diff"] = [
+        a - b for a, b in zip(account_sums["in"], account_sums["ex"])
+    ]
 
     return render(
         request,
@@ -488,8 +430,9 @@ def income(request: HttpRequest, group: Group, is_admin=False):
             "is_admin": is_admin,
             "group": group,
             "form": form,
-            "from_date": from_date,
-            "to_date": to_date,
+            "from_date": periods[0][0],
+            "to_date": periods[-1][1],
+            "columns": columns,
             "accounts": accounts,
             "account_sums": account_sums,
         },
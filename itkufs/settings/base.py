@@ -118,3 +118,28 @@ def ugettext(s):
 
 LANGUAGES = (("en", ugettext("English")), ("no", ugettext("Norwegian")))
 LOCALE_PATHS = (PROJECT_BASE + "itkufs/locale/",)
+
+# Group cache used for authorization, see itkufs/common/cache.py. Set the
+# alias to a cache in CACHES shared by all processes, e.g. memcached, to
+# share entries and invalidations between them. Without it, entries are
+# kept for at most a few seconds, whatever the timeout.
+UFS_GROUP_CACHE_SIZE = 256
+UFS_GROUP_CACHE_TIMEOUT = 300
+UFS_GROUP_CACHE_ALIAS = None
+
+# Cache of rendered list PDFs, see itkufs/reports/cache.py. Set the
+# directory to also keep them on disk, shared by all processes.
+UFS_PDF_CACHE_SIZE = 32 * 2**20
+UFS_PDF_CACHE_DIR = None
+UFS_PDF_CACHE_DIR_MAX_FILES = 1000
+
+# Cache of list previews and the number of concurrent Ghostscript processes
+# rendering them, see itkufs/reports/preview.py.
+UFS_PREVIEW_CACHE_SIZE = 8 * 2**20
+UFS_PREVIEW_CACHE_DIR = None
+UFS_PREVIEW_CACHE_DIR_MAX_FILES = 1000
+UFS_PREVIEW_WORKERS = 2
+
+# Number of processes rendering lists when a group admin prints all lists,
+# see itkufs/reports/batch.py. The printlists command takes --workers.
+UFS_LIST_PRINT_WORKERS = 1
@@ -12,3 +12,6 @@ MIDDLEWARE += ["debug_toolbar.middleware.DebugToolbarMiddleware"]
 
 # Do not require HTTPS
 SESSION_COOKIE_SECURE = False
+
+# Print mail sent by sendqueuedmail instead of delivering it
+EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"